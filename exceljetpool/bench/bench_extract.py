@@ -0,0 +1,56 @@
+"""Сравнение движков извлечения данных на сохраненных страницах товаров
+
+Запуск:  python bench/bench_extract.py [--repeat 200] [файлы.html ...]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exceljetpool.extract import ENGINES  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def measure(func, content, repeat):
+    """Лучшее время одного вызова из repeat попыток, в миллисекундах"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(content)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('files', nargs='*', help='HTML-страницы (по умолчанию bench/fixtures/*.html)')
+    parser.add_argument('--repeat', type=int, default=200, help='число повторов на страницу')
+    args = parser.parse_args(argv)
+
+    files = args.files or sorted(glob.glob(os.path.join(FIXTURES, '*.html')))
+    names = list(ENGINES)
+
+    print(f"{'страница':<24}{'КБ':>7}" + ''.join(f'{name + ", мс":>12}' for name in names) + f"{'soup/stream':>13}")
+    for path in files:
+        with open(path, 'rb') as f:
+            content = f.read()
+
+        expected = ENGINES['soup'](content)
+        timings = {}
+        for name in names:
+            result = ENGINES[name](content)
+            if result != expected:
+                print(f"{os.path.basename(path)}: {name} вернул {result}, ожидалось {expected}")
+            timings[name] = measure(ENGINES[name], content, args.repeat)
+
+        print(f"{os.path.basename(path):<24}{len(content) / 1024:>7.0f}"
+              + ''.join(f'{timings[name]:>12.3f}' for name in names)
+              + f"{timings['soup'] / timings['stream']:>12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
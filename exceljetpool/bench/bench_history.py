@@ -0,0 +1,59 @@
+"""История цен на миллионах наблюдений: запись, "изменилось за неделю", выгрузка prices.xlsx
+
+Запуск:  python bench/bench_history.py [--products 100000] [--days 10]
+
+Каждый из --days дней (в прошлом) наблюдаются все --products товаров; у
+каждого десятого цена меняется. Итого products * days наблюдений.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_site import product_price  # noqa: E402
+from exceljetpool.history import PriceHistory  # noqa: E402
+
+DAY = 24 * 3600
+
+
+def timed(label, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    print(f"{label:<40}{(time.perf_counter() - start) * 1000:>12.1f} мс")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--days', type=int, default=10)
+    parser.add_argument('--pivot-days', type=int, default=7)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='exceljetpool-history-') as directory:
+        history = PriceHistory(os.path.join(directory, 'history.sqlite'))
+        now = time.time()
+        start = time.perf_counter()
+        for day in range(args.days):
+            observed_at = now - (args.days - 1 - day) * DAY
+            records = [(f'Товар {n}', str(product_price(n, day if n % 10 == 0 else 0)), f'http://shop/product/{n}')
+                       for n in range(1, args.products + 1)]
+            history.record_many(records, observed_at=observed_at)
+        elapsed = time.perf_counter() - start
+        total = args.products * args.days
+        print(f"Наблюдений: {total}, запись {elapsed:.1f} с ({total / elapsed:.0f} в секунду)")
+
+        changes = timed("изменилось за неделю", history.changed_this_week)
+        print(f"{'':<40}{len(changes):>12} товаров")
+        timed("изменилось за сутки", history.changed_since, now - DAY)
+        timed("выгрузка последних цен", history.export_xlsx, os.path.join(directory, 'prices.xlsx'))
+        timed(f"выгрузка с ценами за {args.pivot_days} дат", history.export_xlsx,
+              os.path.join(directory, 'prices_pivot.xlsx'), args.pivot_days)
+        history.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Масштабирование разбора страниц: потоки против пула процессов
+
+Запуск:  python bench/bench_parse_pool.py [--pages 400] [--engine soup] [--workers 1 2 4 8]
+
+Страницы из bench/fixtures повторяются до --pages штук и разбираются
+одновременно: в пуле из 4 потоков (как в конвейере) и в ParsePool с разным
+числом процессов. Ускорение считается относительно первого значения --workers.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exceljetpool.extract import ENGINES, extract_product  # noqa: E402
+from exceljetpool.parsepool import ParsePool  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def run(parse, pages, threads):
+    """Время разбора всех страниц parse из threads потоков, в секундах"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        results = list(executor.map(parse, pages))
+    elapsed = time.perf_counter() - start
+    assert all(result[0] for result in results), "не все страницы разобраны"
+    return elapsed
+
+
+def main(argv=None):
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=400, help='сколько страниц разобрать')
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='soup', help='движок извлечения данных')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, 4, cpus} - {n for n in (2, 4) if n > cpus}),
+                        help='число процессов ParsePool')
+    args = parser.parse_args(argv)
+
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES, '*.html'))):
+        with open(path, 'rb') as f:
+            fixtures.append(f.read())
+    pages = [fixtures[i % len(fixtures)] for i in range(args.pages)]
+    print(f"Страниц: {len(pages)}, движок: {args.engine}, ядер: {cpus}")
+
+    elapsed = run(lambda content: extract_product(content, args.engine), pages, 4)
+    print(f"{'потоки (4)':<16}{len(pages) / elapsed:>10.1f} стр/с")
+
+    first_rate = None
+    for workers in args.workers:
+        with ParsePool(workers, args.engine) as pool:
+            # Прогрев: запуск процессов и импорт bs4 в них не входит в замер
+            run(pool.extract, pages[:workers * 2], len(pool.slots))
+            elapsed = run(pool.extract, pages, len(pool.slots))
+        rate = len(pages) / elapsed
+        first_rate = first_rate or rate
+        print(f"{f'процессы ({workers})':<16}{rate:>10.1f} стр/с {rate / first_rate:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
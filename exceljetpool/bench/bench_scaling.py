@@ -0,0 +1,94 @@
+"""Проверка линейного роста записи: ProductIndex и upsert_many на 12,5/25/50 тыс. товаров
+
+Запуск:  python bench/bench_scaling.py [--sizes 12500 25000 50000] [--max-ratio 2.0]
+
+Для каждого размера пачки замеряется время на один товар (лучшее из
+--repeat): построение индекса по листу, upsert в индекс и upsert_many в
+таблицу с сохранением. При линейном росте время на товар почти не зависит
+от размера; при поиске перебором (как до индекса) оно растет вместе с
+размером, и на 50 тыс. товаров было бы в 4 раза больше, чем на 12,5 тыс.
+
+Код возврата 1, если время на товар на самой большой пачке больше, чем на
+самой маленькой, в --max-ratio раз, - так проверку можно запускать в CI.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_site import product_price  # noqa: E402
+from exceljetpool.workbook import PriceWorkbook, ProductIndex  # noqa: E402
+
+
+def best_of(repeat, func, *args):
+    """Лучшее время func(*args) из repeat запусков, с"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def index_upsert(records):
+    index = ProductIndex()
+    for product_name, price in records:
+        index.upsert(product_name, price)
+    # Повторный проход: все товары уже есть в индексе
+    for product_name, price in records:
+        index.upsert(product_name, price + 1)
+
+
+def index_build(rows):
+    ProductIndex.from_rows(rows)
+
+
+def workbook_upsert(directory, records):
+    path = os.path.join(directory, f'prices_{len(records)}.xlsx')
+    if os.path.exists(path):
+        os.remove(path)
+    store = PriceWorkbook(path, streaming=False)
+    store.create_if_not_exists()
+    store.upsert_many(records)
+    # Вторая пачка: половина цен изменена, остальные без изменений
+    store.upsert_many([(product_name, price + n % 2) for n, (product_name, price) in enumerate(records)])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[12500, 25000, 50000], help='размеры пачек')
+    parser.add_argument('--repeat', type=int, default=3, help='число запусков, берется лучший')
+    parser.add_argument('--max-ratio', type=float, default=2.0,
+                        help='предел роста времени на товар от меньшей пачки к большей')
+    args = parser.parse_args(argv)
+    sizes = sorted(args.sizes)
+
+    failed = []
+    with tempfile.TemporaryDirectory(prefix='exceljetpool-scaling-') as directory:
+        checks = {
+            'индекс: построение': lambda records: best_of(args.repeat, index_build, records),
+            'индекс: upsert': lambda records: best_of(args.repeat, index_upsert, records),
+            'upsert_many + сохранение': lambda records: best_of(args.repeat, workbook_upsert, directory, records),
+        }
+        print(f"{'':<28}" + "".join(f"{size:>12}" for size in sizes) + f"{'рост':>8}   (мкс на товар)")
+        for title, check in checks.items():
+            per_row = []
+            for size in sizes:
+                records = [(f'Товар {n}', product_price(n)) for n in range(1, size + 1)]
+                per_row.append(check(records) / size * 1e6)
+            ratio = per_row[-1] / per_row[0]
+            print(f"{title:<28}" + "".join(f"{value:>12.2f}" for value in per_row) + f"{ratio:>8.2f}")
+            if ratio > args.max_ratio:
+                failed.append(title)
+
+    if failed:
+        print(f"Рост нелинейный (больше {args.max_ratio:g} раз): {', '.join(failed)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""Холодный старт: что импортируется при запуске и сколько длится запуск
+
+Запуск:  python bench/bench_startup.py [--repeat 10] [--top 15] [--exe dist/exceljetpool/exceljetpool_cli.exe]
+
+Отчет -X importtime: самые долгие модули (с учетом вложенных импортов) при
+"import exceljetpool.gui" и "import exceljetpool.cli" в чистом интерпретаторе. Затем медиана времени
+запуска "exceljetpool.py --help" (интерпретатор, импорты, разбор аргументов)
+и, если указан --exe, собранной программы с тем же аргументом (консольный
+exceljetpool_cli.exe: оконный EXE ничего не выводит).
+
+С --budget код возврата 1, если медиана запуска превысила бюджет (мс) -
+так проверку можно поставить после сборки.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Модули, которых не должно быть в импортах запуска (загружаются по требованию)
+LAZY_MODULES = ('openpyxl', 'bs4', 'soupsieve', 'requests', 'aiohttp', 'lxml')
+
+
+def import_times(module):
+    """{модуль: накопленное время импорта, мс} для import module в отдельном процессе"""
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=APP_DIR,
+                               capture_output=True, text=True, check=True)
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative) / 1000
+    return times
+
+
+def launch_time(command, repeat):
+    """Медиана времени работы command из repeat запусков, мс"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=APP_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10, help='число запусков для медианы')
+    parser.add_argument('--top', type=int, default=15, help='сколько самых долгих модулей показать')
+    parser.add_argument('--exe', help='собранная программа (PyInstaller) для замера запуска')
+    parser.add_argument('--budget', type=float, help='предел медианы запуска, мс')
+    args = parser.parse_args(argv)
+
+    eager = []
+    for module in ('exceljetpool.gui', 'exceljetpool.cli'):
+        times = import_times(module)
+        print(f"import {module}: {times.get(module, 0):.0f} мс")
+        top = sorted(times.items(), key=lambda item: item[1], reverse=True)[:args.top]
+        for name, milliseconds in top:
+            print(f"    {name:<40}{milliseconds:>9.1f}")
+        eager.extend(f"{module}: {name}" for name in times if name.split('.')[0] in LAZY_MODULES)
+    if eager:
+        print("Импортируются при запуске, хотя должны по требованию:\n    " + "\n    ".join(sorted(set(eager))))
+
+    launches = {'exceljetpool.py --help': [sys.executable, os.path.join(APP_DIR, 'exceljetpool.py'), '--help']}
+    if args.exe:
+        launches[f'{os.path.basename(args.exe)} --help'] = [os.path.abspath(args.exe), '--help']
+    slowest = 0
+    for title, command in launches.items():
+        median = launch_time(command, args.repeat)
+        slowest = max(slowest, median)
+        print(f"{title:<44}{median:>9.1f} мс (медиана из {args.repeat})")
+
+    if args.budget is not None and slowest > args.budget:
+        print(f"Запуск дольше бюджета {args.budget:.0f} мс", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
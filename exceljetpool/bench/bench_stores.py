@@ -0,0 +1,87 @@
+"""Сравнение хранилищ цен: скорость записи и размер файла
+
+Запуск:  python bench/bench_stores.py [--rows 1000000] [--update 10000] [--formats xlsx csv sqlite parquet]
+
+Для каждого формата во временной папке:
+    запись   - upsert_many всех rows товаров в пустое хранилище;
+    пачка    - upsert_many update товаров с новыми ценами в заполненное
+               хранилище (так пишет обычное обновление);
+    открытие - чтение хранилища новым объектом (индекс) перед записью.
+XLSX пишется потоково (streaming=True), как большие таблицы в программе.
+Parquet пропускается, если не установлен pyarrow.
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from fake_site import product_price  # noqa: E402
+from exceljetpool.shards import open_store  # noqa: E402
+from exceljetpool.workbook import PriceWorkbook  # noqa: E402
+
+FORMATS = ('xlsx', 'csv', 'sqlite', 'parquet')
+
+
+def open_format(path, store_format):
+    if store_format == 'xlsx':
+        return PriceWorkbook(path, streaming=True)
+    return open_store(path)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def bench_format(directory, store_format, rows, update):
+    path = os.path.join(directory, f'prices.{store_format}')
+    records = [(f'Товар {n}', product_price(n)) for n in range(1, rows + 1)]
+    changed = [(f'Товар {n}', product_price(n, seed=1)) for n in range(1, rows + 1, max(rows // update, 1))][:update]
+
+    store = open_format(path, store_format)
+    store.create_if_not_exists()
+    bulk, result = timed(store.upsert_many, records)
+    assert len(result.added) == rows, result
+    size = os.path.getsize(path)
+    if hasattr(store, 'close'):
+        store.close()
+
+    # Новый объект: как следующий запуск программы
+    store = open_format(path, store_format)
+    if store_format == 'xlsx':
+        load = 0.0
+    else:
+        load, _ = timed(store.load)
+    batch, result = timed(store.upsert_many, changed)
+    assert len(result.changed) == len(changed), result
+    if hasattr(store, 'close'):
+        store.close()
+    return bulk, size, load, batch
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000, help='товаров в хранилище')
+    parser.add_argument('--update', type=int, default=10000, help='размер пачки изменений')
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=list(FORMATS))
+    args = parser.parse_args(argv)
+
+    print(f"{'формат':<9}{'запись, с':>11}{'строк/с':>12}{'размер, МБ':>12}{'открытие, с':>13}{'пачка, с':>10}")
+    with tempfile.TemporaryDirectory(prefix='exceljetpool-stores-') as directory:
+        for store_format in args.formats:
+            if store_format == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+                print(f"{store_format:<9}пропущен: нет pyarrow")
+                continue
+            bulk, size, load, batch = bench_format(directory, store_format, args.rows, args.update)
+            print(f"{store_format:<9}{bulk:>11.2f}{args.rows / bulk:>12.0f}{size / 1024 / 1024:>12.1f}"
+                  f"{load:>13.2f}{batch:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
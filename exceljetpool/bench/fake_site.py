@@ -0,0 +1,117 @@
+"""Локальный сайт с генерируемыми страницами товаров для бенчмарков
+
+    python bench/fake_site.py --port 8000 --latency 0.05 --size 64
+
+Страница /product/<n> содержит товар "Товар <n>" с ценой, зависящей от n
+и --price-seed. Размер страницы (КБ) и задержка ответа (с) настраиваются;
+поддерживаются ETag и ответ 304 на If-None-Match.
+"""
+import argparse
+import http.server
+import threading
+import time
+import zlib
+
+PAGE_HEAD = ('<!DOCTYPE html>\n<html lang="ru">\n<head>\n<meta charset="utf-8">\n'
+             '<title>Товар {n}</title>\n'
+             '<meta property="product:price:amount" content="{price}">\n'
+             '<meta property="product:price:currency" content="RUB">\n</head>\n<body>\n')
+PAGE_NAV = '<li class="menu__item"><a href="/catalog/section-{i}/">Раздел каталога {i}</a></li>\n'
+PAGE_PRODUCT = '<div class="product" data-product-name="Товар {n}"><h1>Товар {n}</h1></div>\n'
+PAGE_TAIL = '</body>\n</html>\n'
+
+
+def product_price(n, seed=0):
+    """Цена товара n (меняется вместе с seed)"""
+    return 100 + (n * 7919 + seed * 104729) % 100000
+
+
+def render_page(n, size_kb=64, seed=0):
+    """HTML страницы товара n размером примерно size_kb КБ"""
+    head = PAGE_HEAD.format(n=n, price=product_price(n, seed))
+    product = PAGE_PRODUCT.format(n=n)
+    body = []
+    budget = size_kb * 1024 - len(head) - len(product) - len(PAGE_TAIL)
+    # Товар стоит в середине страницы, как на настоящем сайте
+    i = 0
+    while budget > 0:
+        line = PAGE_NAV.format(i=i)
+        body.append(line)
+        budget -= len(line.encode('utf-8'))
+        i += 1
+    middle = len(body) // 2
+    return (head + ''.join(body[:middle]) + product + ''.join(body[middle:]) + PAGE_TAIL).encode('utf-8')
+
+
+class FakeSiteHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+    size_kb = 64
+    seed = 0
+    requests_served = 0
+
+    def do_GET(self):
+        type(self).requests_served += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        parts = self.path.strip('/').split('/')
+        if len(parts) != 2 or parts[0] != 'product' or not parts[1].isdigit():
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        n = int(parts[1])
+        etag = '"%x"' % zlib.crc32(f'{n}:{self.seed}:{self.size_kb}'.encode())
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        body = render_page(n, self.size_kb, self.seed)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=0, latency=0.0, size_kb=64, seed=0):
+    """Запускает сайт в фоновом потоке; возвращает (базовый адрес, сервер)"""
+    handler = type('Handler', (FakeSiteHandler,), {'latency': latency, 'size_kb': size_kb, 'seed': seed})
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return f'http://127.0.0.1:{server.server_address[1]}', server
+
+
+def product_urls(base_url, count, start=1):
+    """Ссылки на товары start..start+count-1"""
+    return [f'{base_url}/product/{n}' for n in range(start, start + count)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help="задержка ответа, с")
+    parser.add_argument('--size', type=int, default=64, help="размер страницы, КБ")
+    parser.add_argument('--price-seed', type=int, default=0, help="смена seed меняет все цены")
+    args = parser.parse_args(argv)
+
+    base_url, server = start_server(args.port, args.latency, args.size, args.price_seed)
+    print(f"Сайт: {base_url}/product/<n>  (Ctrl+C - остановить)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Генератор синтетических prices.xlsx для бенчмарков
+
+Запуск:  python bench/make_workbook.py --rows 100000 [--out файл.xlsx]
+
+Товары называются "Товар <n>" (n = 1..rows) и имеют ту же цену, что отдает
+bench/fake_site.py с тем же --price-seed, поэтому обновление таблицы с
+сайта дает только неизменные строки, а смена seed - только измененные.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openpyxl  # noqa: E402
+
+from fake_site import product_price  # noqa: E402
+from exceljetpool.workbook import DATA_FONT, HEADER_FONT, HEADERS, PriceWorkbook  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def workbook_path(rows, seed=0):
+    """Путь к сгенерированной таблице в bench/data"""
+    return os.path.join(DATA_DIR, f'prices_{rows}_s{seed}.xlsx')
+
+
+def make_workbook(path, rows, seed=0):
+    """Пишет таблицу из rows товаров потоково (write_only), как stream_upsert_many"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet('Sheet')
+    ws.append(PriceWorkbook._styled_row(ws, HEADERS, HEADER_FONT))
+    for n in range(1, rows + 1):
+        ws.append(PriceWorkbook._styled_row(ws, (f'Товар {n}', product_price(n, seed)), DATA_FONT))
+    wb.save(path)
+    return path
+
+
+def ensure_workbook(rows, seed=0):
+    """Путь к таблице на rows товаров; генерирует ее при первом обращении"""
+    path = workbook_path(rows, seed)
+    if not os.path.exists(path):
+        make_workbook(path, rows, seed)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100000, 1000000], help='число товаров')
+    parser.add_argument('--price-seed', type=int, default=0)
+    parser.add_argument('--out', help='файл таблицы (только для одного --rows)')
+    args = parser.parse_args(argv)
+
+    if args.out and len(args.rows) > 1:
+        parser.error('--out можно указать только для одного --rows')
+
+    for rows in args.rows:
+        path = args.out or workbook_path(rows, args.price_seed)
+        start = time.perf_counter()
+        make_workbook(path, rows, args.price_seed)
+        print(f"{path}: {rows} строк, {os.path.getsize(path) / 1024 / 1024:.1f} МБ "
+              f"за {time.perf_counter() - start:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""Сценарии производительности: запись в таблицу, полное обновление, холодный старт
+
+Запуск:  python bench/run_bench.py [--rows 1000 100000] [--scenario single batch refresh cold]
+
+Сценарии (каждый выполняется в отдельном процессе, чтобы пиковая память
+не смешивалась):
+    single  - repeat записей по одному товару в таблицу из rows строк
+    batch   - одна пачка из batch товаров: половина изменена, половина новых
+    refresh - core.refresh по urls ссылкам на bench/fake_site.py
+    cold    - запуск "exceljetpool.py refresh" с нуля (интерпретатор, импорты, запись)
+
+Таблицы генерируются bench/make_workbook.py в bench/data при первом запуске.
+Результаты печатаются таблицей и дописываются JSON-строками в --results,
+чтобы сравнивать версии между собой.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, APP_DIR)
+
+from fake_site import product_price, product_urls, start_server  # noqa: E402
+from make_workbook import ensure_workbook  # noqa: E402
+
+SCENARIOS = ('single', 'batch', 'refresh', 'cold')
+
+# Цены сайта и новых записей отличаются от цен сгенерированной таблицы
+CHANGED_SEED = 1
+
+
+def peak_rss_mb(children=False):
+    """Пиковый объем памяти процесса (или завершенных дочерних процессов), МБ; None - неизвестно"""
+    try:
+        import resource
+    except ImportError:  # Windows: только через psutil и только для себя
+        if children:
+            return None
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    usage = resource.getrusage(who).ru_maxrss
+    # Linux отдает КБ, macOS - байты
+    return usage / 1024 / 1024 if sys.platform == 'darwin' else usage / 1024
+
+
+def revision():
+    """Короткий хэш текущего коммита, если программа лежит в git"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def bench_single(path, rows, args):
+    from exceljetpool.workbook import PriceWorkbook
+
+    store = PriceWorkbook(path)
+    start = time.perf_counter()
+    for i in range(args.repeat):
+        n = 1 + (i * 7919) % rows
+        store.upsert_many([(f'Товар {n}', product_price(n, CHANGED_SEED + i))])
+    return time.perf_counter() - start, args.repeat, 'записей'
+
+
+def bench_batch(path, rows, args):
+    from exceljetpool.workbook import PriceWorkbook
+
+    half = args.batch // 2
+    records = [(f'Товар {n}', product_price(n, CHANGED_SEED)) for n in range(1, min(half, rows) + 1)]
+    records += [(f'Товар {n}', product_price(n)) for n in range(rows + 1, rows + 1 + args.batch - len(records))]
+    start = time.perf_counter()
+    result = PriceWorkbook(path).upsert_many(records)
+    elapsed = time.perf_counter() - start
+    assert len(result) == len(records), result
+    return elapsed, len(records), 'записей'
+
+
+def bench_refresh(path, rows, args):
+    from exceljetpool.core import refresh
+
+    urls = product_urls(args.site, args.urls)
+    start = time.perf_counter()
+    summary = refresh(urls, path, workers=args.workers, per_host=args.per_host)
+    elapsed = time.perf_counter() - start
+    assert not summary.failed, summary.failed[:5]
+    return elapsed, len(urls), 'ссылок'
+
+
+def bench_cold(path, rows, args):
+    urls_path = os.path.join(os.path.dirname(path), 'urls.txt')
+    with open(urls_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(product_urls(args.site, args.cold_urls)))
+    command = [sys.executable, os.path.join(APP_DIR, 'exceljetpool.py'), 'refresh', urls_path,
+               '--out', path, '--no-cache', '-q']
+    start = time.perf_counter()
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start, 1, 'запусков'
+
+
+BENCHMARKS = {
+    'single': bench_single,
+    'batch': bench_batch,
+    'refresh': bench_refresh,
+    'cold': bench_cold,
+}
+
+
+def run_child(args):
+    """Выполняет один сценарий на копии таблицы и печатает результат JSON-строкой"""
+    with tempfile.TemporaryDirectory(prefix='exceljetpool-bench-') as directory:
+        path = os.path.join(directory, 'prices.xlsx')
+        shutil.copyfile(ensure_workbook(args.child_rows), path)
+        elapsed, count, unit = BENCHMARKS[args.child](path, args.child_rows, args)
+    print(json.dumps({
+        'seconds': elapsed,
+        'count': count,
+        'unit': unit,
+        'peak_rss_mb': peak_rss_mb(children=args.child == 'cold'),
+    }))
+
+
+def run_scenario(scenario, rows, args):
+    command = [sys.executable, os.path.abspath(__file__), '--child', scenario, '--child-rows', str(rows),
+               '--site', args.site, '--repeat', str(args.repeat), '--batch', str(args.batch),
+               '--urls', str(args.urls), '--cold-urls', str(args.cold_urls),
+               '--workers', str(args.workers), '--per-host', str(args.per_host)]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{scenario}/{rows}: {completed.stderr.strip()}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenario', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100000], help='размеры таблиц (1000000 - около минуты на генерацию)')
+    parser.add_argument('--repeat', type=int, default=5, help='single: число записей')
+    parser.add_argument('--batch', type=int, default=10000, help='batch: размер пачки')
+    parser.add_argument('--urls', type=int, default=500, help='refresh: число ссылок')
+    parser.add_argument('--cold-urls', type=int, default=10, help='cold: число ссылок')
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--per-host', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.02, help='задержка ответа сайта, с')
+    parser.add_argument('--page-size', type=int, default=64, help='размер страницы, КБ')
+    parser.add_argument('--results', default=os.path.join(BENCH_DIR, 'results.jsonl'), help='куда дописывать результаты')
+    parser.add_argument('--site', help=argparse.SUPPRESS)
+    parser.add_argument('--child', choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument('--child-rows', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(args)
+        return
+
+    for rows in args.rows:
+        ensure_workbook(rows)
+
+    # Сайт работает в этом процессе и не влияет на память сценариев
+    args.site, server = start_server(latency=args.latency, size_kb=args.page_size, seed=CHANGED_SEED)
+    common = {'revision': revision(), 'python': sys.version.split()[0], 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    print(f"{'сценарий':<10}{'строк':>10}{'время, с':>11}{'в секунду':>22}{'пик RSS, МБ':>13}")
+    try:
+        with open(args.results, 'a', encoding='utf-8') as results:
+            for rows in args.rows:
+                for scenario in args.scenario:
+                    result = run_scenario(scenario, rows, args)
+                    throughput = result['count'] / result['seconds']
+                    rss = result['peak_rss_mb']
+                    print(f"{scenario:<10}{rows:>10}{result['seconds']:>11.3f}"
+                          f"{throughput:>12.1f} {result['unit']:<9}"
+                          f"{'-' if rss is None else round(rss):>13}")
+                    results.write(json.dumps(dict(common, scenario=scenario, rows=rows,
+                                                  throughput=throughput, **result), ensure_ascii=False) + "\n")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
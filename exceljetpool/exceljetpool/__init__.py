@@ -0,0 +1,4 @@
+"""Парсер цен exceljetpool: ядро, консольная утилита (cli) и окно Tk (gui)
+
+Запускается через exceljetpool.py рядом с пакетом.
+"""
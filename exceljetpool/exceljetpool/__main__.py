@@ -0,0 +1,7 @@
+"""Консольный режим как модуль: python -m exceljetpool refresh urls.txt --out prices.xlsx"""
+import sys
+
+from .cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
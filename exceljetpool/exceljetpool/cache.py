@@ -0,0 +1,176 @@
+"""Постоянный кэш страниц товаров в SQLite
+
+Для каждой ссылки хранятся валидаторы ответа (ETag, Last-Modified) и
+результат разбора (название, цена в копейках, валюта) - цена не разбирается
+заново при каждом чтении. Запись моложе ttl секунд считается
+свежей: такая ссылка не загружается и не разбирается вовсе. Более старые
+записи используются для условных запросов (304). Размер кэша ограничен
+max_entries, лишнее вытесняется по давности последнего обращения (LRU).
+"""
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    product_name TEXT,
+    price INTEGER,
+    currency TEXT,
+    checked_at REAL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at);
+"""
+
+# Как часто (в записях) проверять превышение размера кэша
+EVICT_EVERY = 500
+
+DEFAULT_TTL = 3600
+DEFAULT_MAX_ENTRIES = 100000
+
+
+class _ValidatorsView:
+    """Словарь ссылка -> (ETag, Last-Modified) поверх кэша, для PageFetcher"""
+
+    def __init__(self, cache):
+        self._cache = cache
+
+    def get(self, url, default=None):
+        row = self._cache._select(url, 'etag, last_modified')
+        if row is None or (row[0] is None and row[1] is None):
+            return default
+        return row
+
+    def __setitem__(self, url, validators):
+        self._cache._upsert(url, etag=validators[0], last_modified=validators[1])
+
+    def pop(self, url, default=None):
+        value = self.get(url, default)
+        self._cache._upsert(url, etag=None, last_modified=None)
+        return value
+
+
+class _ResultsView:
+    """Словарь ссылка -> (название, копейки, валюта) поверх кэша, для ответов 304"""
+
+    def __init__(self, cache):
+        self._cache = cache
+
+    def __contains__(self, url):
+        return self.get(url) is not None
+
+    def __getitem__(self, url):
+        result = self.get(url)
+        if result is None:
+            raise KeyError(url)
+        return result
+
+    def get(self, url, default=None):
+        row = self._cache._select(url, 'product_name, price, currency')
+        if row is None or row[0] is None:
+            return default
+        return row
+
+    def __setitem__(self, url, result):
+        # Успешная загрузка или подтверждение 304 продлевает свежесть записи
+        self._cache._upsert(url, product_name=result[0], price=result[1], currency=result[2],
+                            checked_at=time.time())
+
+
+class PageCache:
+    """Кэш страниц с TTL и LRU-вытеснением; безопасен для нескольких потоков"""
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(pages)")]
+        if columns and 'currency' not in columns:
+            # Кэш прежней версии хранил цену текстом - он просто заполняется заново
+            self._db.execute("DROP TABLE pages")
+        self._db.executescript(SCHEMA)
+        self.validators = _ValidatorsView(self)
+        self.results = _ResultsView(self)
+
+    def _select(self, url, columns):
+        with self._lock:
+            return self._db.execute(f"SELECT {columns} FROM pages WHERE url = ?", (url,)).fetchone()
+
+    def _upsert(self, url, **values):
+        now = time.time()
+        values['accessed_at'] = now
+        columns = ', '.join(values)
+        placeholders = ', '.join('?' for _ in values)
+        updates = ', '.join(f'{column} = excluded.{column}' for column in values)
+        with self._lock:
+            self._db.execute(
+                f"INSERT INTO pages (url, {columns}) VALUES (?, {placeholders}) "
+                f"ON CONFLICT(url) DO UPDATE SET {updates}",
+                (url, *values.values()))
+            self._db.commit()
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 0:
+                self._evict()
+
+    def _evict(self):
+        excess = self._db.execute("SELECT COUNT(*) FROM pages").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM pages WHERE url IN "
+                "(SELECT url FROM pages ORDER BY accessed_at LIMIT ?)", (excess,))
+            self._db.commit()
+
+    def fresh(self, url):
+        """(название, копейки, валюта) свежей записи или None; учитывается в статистике попаданий"""
+        with self._lock:
+            row = None
+            if self.ttl > 0:
+                row = self._db.execute(
+                    "SELECT product_name, price, currency FROM pages "
+                    "WHERE url = ? AND product_name IS NOT NULL AND checked_at >= ?",
+                    (url, time.time() - self.ttl)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (time.time(), url))
+            self._db.commit()
+            return row
+
+    def products(self):
+        """Пары (ссылка, название) разобранных товаров (в порядке добавления)"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT url, product_name FROM pages WHERE product_name IS NOT NULL ORDER BY rowid").fetchall()
+
+    @property
+    def hit_rate(self):
+        """Доля попаданий среди проверок fresh()"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def clear(self):
+        """Удаляет все записи"""
+        with self._lock:
+            self._db.execute("DELETE FROM pages")
+            self._db.commit()
+
+    def close(self):
+        """Вытесняет лишние записи и закрывает базу"""
+        with self._lock:
+            self._evict()
+            self._db.close()
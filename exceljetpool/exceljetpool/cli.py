@@ -0,0 +1,241 @@
+"""Консольный режим без окна
+
+    python exceljetpool.py refresh urls.txt --out prices.xlsx --workers 32
+    python exceljetpool.py watch --urls urls.txt --history
+    python exceljetpool.py changes --days 7
+    python exceljetpool.py shard prices.xlsx --by hash --shards 16
+    python exceljetpool.py export prices.csv --out prices.xlsx
+
+exceljetpool.py с аргументами работает как консольная утилита, без них
+открывает окно. Из папки программы то же самое запускается командой
+"python -m exceljetpool refresh ..." (см. __main__.py).
+
+Ссылки читаются из TXT/CSV файлов (или из stdin, если указан "-").
+Код возврата: 0 - таблица обновлена, 1 - ничего не записано.
+"""
+import argparse
+import contextlib
+import os
+import sys
+import time
+
+from .cache import DEFAULT_MAX_ENTRIES, DEFAULT_TTL, PageCache
+from .core import (default_cache_path, default_excel_path, default_history_path, default_journal_path,
+                  default_schedule_path, default_sites_path, extract_urls, refresh, watch)
+from .extract import ENGINES
+from .history import PriceHistory
+from .locking import DEFAULT_TIMEOUT as LOCK_TIMEOUT
+from .scheduler import DEFAULT_RATE, INITIAL_INTERVAL, MAX_INTERVAL, MIN_INTERVAL, RepriceSchedule
+from .shards import SCHEMES, ShardedWorkbook, manifest_path
+from .stores import export
+from .metrics import METRICS, profile
+
+
+def read_urls(paths):
+    """Собирает ссылки из файлов в порядке появления, без повторов"""
+    chunks = []
+    for path in paths:
+        if path == '-':
+            chunks.append(sys.stdin.read())
+        else:
+            with open(path, encoding='utf-8-sig', errors='replace') as f:
+                chunks.append(f.read())
+    return extract_urls("\n".join(chunks))
+
+
+def cmd_refresh(args):
+    urls = read_urls(args.urls)
+    if not urls:
+        print("Не найдено ни одной ссылки", file=sys.stderr)
+        return 1
+
+    done = 0
+
+    def on_event(kind, data):
+        nonlocal done
+        if kind == 'resumed':
+            done = data[0]
+            print(f"Продолжение прерванного задания: обработано {done} из {len(urls)}", file=sys.stderr)
+        if kind == 'failed':
+            url, error = data
+            print(f"Ошибка: {url}: {error or 'название не найдено'}", file=sys.stderr)
+        if kind in ('parsed', 'failed'):
+            done += 1
+            if not args.quiet and (done % 100 == 0 or done == len(urls)):
+                print(f"Обработано {done} из {len(urls)}", file=sys.stderr)
+
+    # Правила сайтов: указанный файл или sites.json рядом с программой, если он есть
+    sites = args.sites or (default_sites_path() if os.path.exists(default_sites_path()) else None)
+    cache = None if args.no_cache else PageCache(args.cache, ttl=args.ttl, max_entries=args.cache_size)
+    profiler = profile(args.profile) if args.profile else contextlib.nullcontext()
+    try:
+        with profiler:
+            summary = refresh(urls, args.out, workers=args.workers, per_host=args.per_host,
+                              engine=args.engine, commit_every=args.commit_every, on_event=on_event,
+                              cache=cache, force=args.force, parse_processes=args.parse_processes,
+                              history=args.history, pivot_days=args.pivot_days,
+                              journal=None if args.no_journal else args.journal, sites=sites,
+                              lock_timeout=args.lock_timeout, merge_on_conflict=args.merge_on_conflict)
+    finally:
+        if cache is not None:
+            cache.close()
+        if args.metrics:
+            METRICS.write(args.metrics)
+
+    print(f"Ссылок: {summary.total}; получено товаров: {len(summary.records)}; "
+          f"без изменений (304): {summary.not_modified}; ошибок: {len(summary.failed)}")
+    print(f"Таблица: {summary.diff}")
+    if cache is not None and not args.force:
+        print(f"Кэш: {summary.cached} из {summary.total} ссылок без загрузки ({cache.hit_rate:.0%})")
+    return 0 if summary.saved else 1
+
+
+def cmd_watch(args):
+    urls = read_urls(args.urls) if args.urls else []
+    sites = args.sites or (default_sites_path() if os.path.exists(default_sites_path()) else None)
+
+    def on_event(kind, data):
+        if kind == 'failed' and not args.quiet:
+            url, error = data
+            print(f"Ошибка: {url}: {error or 'название не найдено'}", file=sys.stderr)
+        if kind == 'commit_failed':
+            print(f"Ошибка записи таблицы: {data}", file=sys.stderr)
+
+    def on_round(summary, counts):
+        if not args.quiet:
+            print(f"{time.strftime('%H:%M:%S')} проверено: {summary.total}; изменилось: {counts['changed']}; "
+                  f"без изменений: {counts['unchanged']}; ошибок: {counts['failed']}; "
+                  f"отслеживается: {len(schedule)}", file=sys.stderr)
+
+    schedule = RepriceSchedule(args.schedule or default_schedule_path(args.out), min_interval=args.min_interval,
+                               max_interval=args.max_interval, initial_interval=args.interval, rate=args.rate)
+    cache = PageCache(args.cache, max_entries=args.cache_size)
+    try:
+        if urls:
+            print(f"Новых ссылок в расписании: {schedule.track(urls)}", file=sys.stderr)
+        watch(args.out, schedule, workers=args.workers, per_host=args.per_host, engine=args.engine,
+              on_round=on_round, on_event=on_event, cache=cache, history=args.history, sites=sites,
+              lock_timeout=args.lock_timeout, merge_on_conflict=args.merge_on_conflict)
+    finally:
+        schedule.close()
+        cache.close()
+        if args.metrics:
+            METRICS.write(args.metrics)
+    return 0
+
+
+def cmd_changes(args):
+    history = PriceHistory(args.history)
+    try:
+        changes = history.changed_since(time.time() - args.days * 24 * 3600)
+    finally:
+        history.close()
+    for change in changes:
+        changed_at = time.strftime('%Y-%m-%d %H:%M', time.localtime(change.changed_at))
+        print(f"{changed_at}  {change.product_name}: {change.previous_price} -> {change.price}"
+              + (f"  {change.url}" if change.url else ""))
+    print(f"Изменилось цен за {args.days} дн.: {len(changes)}", file=sys.stderr)
+    return 0
+
+
+def cmd_shard(args):
+    if os.path.exists(manifest_path(args.workbook)):
+        print(f"Каталог уже разбит: {manifest_path(args.workbook)}", file=sys.stderr)
+        return 1
+    store = ShardedWorkbook(args.workbook, scheme=args.by, shards=args.shards)
+    result = store.split(args.workbook)
+    print(f"Товаров: {len(result.added) + len(result.changed)}; шардов: {len(store.files)} в {store.directory}")
+    print(f"Манифест: {store.manifest_file}; {os.path.basename(args.workbook)} больше не обновляется")
+    return 0
+
+
+def cmd_export(args):
+    started = time.perf_counter()
+    count = export(args.source, args.out, lock_timeout=args.lock_timeout)
+    print(f"Товаров: {count}; {os.path.basename(args.source)} -> {args.out} за {time.perf_counter() - started:.1f} с")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='exceljetpool', description="Парсер цен товаров")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    refresh_parser = commands.add_parser('refresh', help="загрузить цены по списку ссылок")
+    refresh_parser.add_argument('urls', nargs='+', help="файлы со ссылками (TXT/CSV) или - для stdin")
+    refresh_parser.add_argument('--out', default=default_excel_path(), help="файл таблицы (по умолчанию prices.xlsx рядом с программой); .csv, .sqlite или .parquet - хранилище другого формата")
+    refresh_parser.add_argument('--workers', type=int, default=32, help="сколько страниц загружать одновременно")
+    refresh_parser.add_argument('--per-host', type=int, default=4, help="предел одновременных запросов к одному сайту")
+    refresh_parser.add_argument('--engine', choices=sorted(ENGINES), default='stream', help="движок извлечения данных")
+    refresh_parser.add_argument('--sites', help="правила извлечения для разных сайтов (по умолчанию sites.json рядом с программой)")
+    refresh_parser.add_argument('--parse-processes', type=int, default=0, help="разбирать страницы в стольких процессах (0 - в потоках)")
+    refresh_parser.add_argument('--commit-every', type=int, default=None, help="записывать таблицу каждые N товаров (по умолчанию один раз в конце)")
+    refresh_parser.add_argument('--cache', default=default_cache_path(), help="файл кэша страниц (SQLite)")
+    refresh_parser.add_argument('--ttl', type=int, default=DEFAULT_TTL, help="сколько секунд запись кэша считается свежей (0 - всегда проверять сайт)")
+    refresh_parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_ENTRIES, help="предел записей кэша (лишние вытесняются по давности обращения)")
+    refresh_parser.add_argument('--no-cache', action='store_true', help="не использовать кэш")
+    refresh_parser.add_argument('--force', action='store_true', help="загрузить все страницы заново, минуя кэш")
+    refresh_parser.add_argument('--history', nargs='?', const=default_history_path(), help="вести историю цен (SQLite) вместе с таблицей")
+    refresh_parser.add_argument('--pivot-days', type=int, default=0, help="с --history: добавить столбцы цен за последние N дат")
+    refresh_parser.add_argument('--journal', default=default_journal_path(), help="журнал заданий (SQLite) для продолжения прерванного обновления")
+    refresh_parser.add_argument('--no-journal', action='store_true', help="не вести журнал заданий (прерванное обновление начнется заново)")
+    refresh_parser.add_argument('--lock-timeout', type=float, default=LOCK_TIMEOUT, help="сколько секунд ждать, пока таблицу пишет другой процесс")
+    refresh_parser.add_argument('--merge-on-conflict', action='store_true', help="если таблица занята, отложить пачку в журнал изменений (ее запишет следующий писатель)")
+    refresh_parser.add_argument('--metrics', help="выгрузить таймеры стадий и счетчики (*.prom - формат Prometheus, иначе JSON-строки)")
+    refresh_parser.add_argument('--profile', help="сохранить профиль cProfile прогона в файл")
+    refresh_parser.add_argument('-q', '--quiet', action='store_true', help="не выводить прогресс")
+    refresh_parser.set_defaults(handler=cmd_refresh)
+
+    watch_parser = commands.add_parser('watch', help="обновлять цены в фоне: каждую ссылку в свой срок (до Ctrl+C)")
+    watch_parser.add_argument('--urls', nargs='+', help="добавить ссылки из файлов (TXT/CSV) к отслеживаемым")
+    watch_parser.add_argument('--out', default=default_excel_path(), help="файл таблицы (по умолчанию prices.xlsx рядом с программой)")
+    watch_parser.add_argument('--schedule', help="файл расписания (SQLite; по умолчанию <таблица>.schedule.sqlite рядом с --out)")
+    watch_parser.add_argument('--interval', type=float, default=INITIAL_INTERVAL, help="начальный интервал проверки ссылки, с")
+    watch_parser.add_argument('--min-interval', type=float, default=MIN_INTERVAL, help="самый частый интервал (для товаров, цена которых меняется), с")
+    watch_parser.add_argument('--max-interval', type=float, default=MAX_INTERVAL, help="самый редкий интервал (для товаров с неизменной ценой), с")
+    watch_parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help="предел запросов в минуту к одному сайту (0 - без предела)")
+    watch_parser.add_argument('--workers', type=int, default=32, help="сколько страниц загружать одновременно")
+    watch_parser.add_argument('--per-host', type=int, default=4, help="предел одновременных запросов к одному сайту")
+    watch_parser.add_argument('--engine', choices=sorted(ENGINES), default='stream', help="движок извлечения данных")
+    watch_parser.add_argument('--sites', help="правила извлечения для разных сайтов (по умолчанию sites.json рядом с программой)")
+    watch_parser.add_argument('--cache', default=default_cache_path(), help="кэш страниц (SQLite): из него берутся ссылки товаров, которые есть в --out")
+    watch_parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_ENTRIES, help="предел записей кэша")
+    watch_parser.add_argument('--history', nargs='?', const=default_history_path(), help="вести историю цен (SQLite) вместе с таблицей")
+    watch_parser.add_argument('--lock-timeout', type=float, default=LOCK_TIMEOUT, help="сколько секунд ждать, пока таблицу пишет другой процесс")
+    watch_parser.add_argument('--merge-on-conflict', action='store_true', help="если таблица занята, отложить пачку в журнал изменений")
+    watch_parser.add_argument('--metrics', help="при остановке выгрузить таймеры стадий и счетчики")
+    watch_parser.add_argument('-q', '--quiet', action='store_true', help="не выводить итоги проверок")
+    watch_parser.set_defaults(handler=cmd_watch)
+
+    changes_parser = commands.add_parser('changes', help="товары, цена которых изменилась (по истории цен)")
+    changes_parser.add_argument('--history', default=default_history_path(), help="файл истории цен (SQLite)")
+    changes_parser.add_argument('--days', type=int, default=7, help="за сколько последних дней")
+    changes_parser.set_defaults(handler=cmd_changes)
+
+    shard_parser = commands.add_parser('shard', help="разбить таблицу на файлы-шарды с манифестом")
+    shard_parser.add_argument('workbook', nargs='?', default=default_excel_path(), help="таблица для разбиения")
+    shard_parser.add_argument('--by', choices=SCHEMES, default='hash', help="по хэшу названия, диапазонам названий или первому слову (категории)")
+    shard_parser.add_argument('--shards', type=int, default=16, help="число шардов для hash и range")
+    shard_parser.set_defaults(handler=cmd_shard)
+
+    export_parser = commands.add_parser('export', help="выгрузить товары хранилища в другой формат (например, CSV в XLSX)")
+    export_parser.add_argument('source', help="хранилище: .xlsx, .csv, .sqlite или .parquet")
+    export_parser.add_argument('--out', default=default_excel_path(), help="куда выгрузить (формат - по расширению; по умолчанию prices.xlsx рядом с программой)")
+    export_parser.add_argument('--lock-timeout', type=float, default=LOCK_TIMEOUT, help="сколько секунд ждать, пока файл пишет другой процесс")
+    export_parser.set_defaults(handler=cmd_export)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.handler(args)
+    except KeyboardInterrupt:
+        return 130
+    except Exception as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,333 @@
+"""Ядро парсера без интерфейса: разбор страниц и обновление prices.xlsx
+
+Модуль не зависит от Tk и win32com и может использоваться как библиотека:
+
+    from exceljetpool.core import refresh
+    summary = refresh(urls, "prices.xlsx", workers=32)
+
+Хранилища, история, журнал, конвейер (asyncio), расписание и пул процессов
+импортируются внутри refresh и watch: окну для запуска нужны только разбор
+страницы и пути по умолчанию.
+"""
+import os
+import re
+import sys
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from .fetcher import PageFetcher
+from .locking import DEFAULT_TIMEOUT as LOCK_TIMEOUT
+from .metrics import METRICS
+from .records import price_value
+from .sites import SITES, configure as configure_sites, extract_page
+
+# Значение, которое parse_my_site возвращает, если название не найдено
+NAME_NOT_FOUND = "Не удалось найти название"
+
+# Расписание фонового обновления лежит рядом с таблицей
+SCHEDULE_SUFFIX = '.schedule.sqlite'
+
+# Ссылки в произвольном тексте: по одной на строку, в CSV, через пробел
+URL_PATTERN = re.compile(r'https?://[^\s,;"\'<>]+')
+
+
+def app_dir():
+    """Папка программы: рядом с EXE (или рядом со скриптом exceljetpool.py)"""
+    if getattr(sys, 'frozen', False):
+        return Path(sys.executable).parent
+    return Path(__file__).parent.parent
+
+
+def default_excel_path():
+    """Путь к prices.xlsx рядом с программой"""
+    return str(app_dir() / "prices.xlsx")
+
+
+def default_cache_path():
+    """Путь к кэшу страниц рядом с программой"""
+    return str(app_dir() / "pages_cache.sqlite")
+
+
+def default_history_path():
+    """Путь к истории цен рядом с программой"""
+    return str(app_dir() / "prices_history.sqlite")
+
+
+def default_sites_path():
+    """Путь к правилам извлечения для разных сайтов рядом с программой"""
+    return str(app_dir() / "sites.json")
+
+
+def default_log_path():
+    """Путь к файлу лога окна рядом с программой"""
+    return str(app_dir() / "exceljetpool.log")
+
+
+def default_journal_path():
+    """Путь к журналу заданий рядом с программой"""
+    return str(app_dir() / "refresh_jobs.sqlite")
+
+
+def default_schedule_path(out=None):
+    """Путь к расписанию фонового обновления таблицы out (prices.xlsx -> prices.schedule.sqlite)
+
+    У каждой таблицы свое расписание: ссылки одной таблицы не проверяются и
+    не записываются в другую.
+    """
+    return os.path.splitext(out or default_excel_path())[0] + SCHEDULE_SUFFIX
+
+
+def extract_urls(text):
+    """Извлекает ссылки из текста (вставленный блок или содержимое TXT/CSV) без повторов"""
+    urls = []
+    seen = set()
+    for url in URL_PATTERN.findall(text):
+        if url not in seen:
+            seen.add(url)
+            urls.append(url)
+    return urls
+
+
+class HostLimiter:
+    """Ограничивает число одновременных запросов к одному хосту"""
+    def __init__(self, per_host):
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def acquire(self, url):
+        """Возвращает семафор хоста ссылки (используется через with)"""
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_host)
+                self._semaphores[host] = semaphore
+        return semaphore
+
+
+@METRICS.timer('parse_product')
+def parse_product(url, fetcher, parsed=None, engine='stream', cache=None, force=False):
+    """Загружает и разбирает страницу товара; возвращает (название, копейки, валюта), ненайденное поле - None
+
+    parsed - словарь ссылка -> (название, копейки, валюта) прошлых разборов: при ответе
+    304 результат берется из него без загрузки и разбора страницы.
+    cache - PageCache: свежая запись возвращается без запроса к сайту, а
+    parsed по умолчанию хранится в нем же. force=True обходит кэш и
+    условные запросы. Ошибки HTTP и сети пробрасываются.
+    """
+    if cache is not None:
+        if not force:
+            fresh = cache.fresh(url)
+            if fresh is not None:
+                METRICS.add('cache_hits')
+                return fresh
+        if parsed is None:
+            parsed = cache.results
+
+    page = fetcher.fetch(url, conditional=not force)
+    if page.not_modified:
+        if parsed is not None and url in parsed:
+            result = parsed[url]
+            # Сайт подтвердил, что запись актуальна
+            parsed[url] = result
+            return result
+        # Прошлый разбор не сохранился - запрашиваем страницу целиком
+        page = fetcher.fetch(url, conditional=False)
+
+    result = extract_page(page.content, url, engine)
+    if parsed is not None and result[0]:
+        parsed[url] = result
+    return result
+
+
+def seed_history(history, store, out):
+    """Переносит в пустую историю товары из существующего out (время - изменения файла)"""
+    if len(history) or not os.path.exists(out):
+        return
+    from .stores import store_format
+    if store_format(out) == 'xlsx':
+        history.import_workbook(out)
+    else:
+        history.record_many(list(store.records()), observed_at=os.path.getmtime(out))
+
+
+def refresh(urls, out, workers=32, per_host=4, engine='stream', commit_every=None,
+            on_event=None, fetcher=None, cache=None, force=False, parse_processes=0,
+            history=None, pivot_days=0, journal=None, sites=None, lock_timeout=LOCK_TIMEOUT,
+            merge_on_conflict=False):
+    """Загружает цены по списку ссылок и записывает их в out; возвращает PipelineSummary
+
+    Если рядом с out есть манифест шардов, запись идет в шарды (см. shards);
+    out с расширением .csv, .sqlite или .parquet - хранилище другого формата
+    (см. stores).
+    cache - PageCache (или путь к нему): свежие ссылки берутся из кэша без
+    загрузки и разбора; force=True загружает все ссылки заново.
+    parse_processes > 0 - разбирать страницы в стольких процессах (ParsePool).
+    history - PriceHistory (или путь к ней): цены пишутся и в историю, и в out;
+    pivot_days > 0 обновляет в prices.xlsx столбцы цен за последние pivot_days
+    дат (см. PriceHistory.write_pivot); при пустой истории в нее переносится
+    текущий out. summary.diff тогда считается относительно прошлых цен истории.
+    journal - JobJournal (или путь к нему): состояние каждой ссылки пишется в
+    журнал, и прерванный запуск с теми же out и ссылками продолжается с места
+    сбоя; перед продолжением on_event получает ('resumed', (обработано, всего)).
+    sites - путь к sites.json с правилами для разных сайтов (см. sites).
+    Запись в out идет под блокировкой файла (см. locking): если за
+    lock_timeout секунд ее не удалось получить, пачка откладывается в журнал
+    изменений при merge_on_conflict=True, иначе - LockTimeout.
+    summary.diff - UpsertResult со сводкой добавленных/измененных/неизменных.
+    """
+    import asyncio
+    from .cache import PageCache
+    from .history import PriceHistory
+    from .journal import JobJournal
+    from .parsepool import ParsePool
+    from .pipeline import AsyncPipeline, create_async_fetcher
+    from .shards import open_store
+    from .workbook import PriceWorkbook, UpsertResult
+
+    if sites is not None and sites != SITES.path:
+        configure_sites(sites)
+    store = open_store(out, lock_timeout=lock_timeout, merge_on_conflict=merge_on_conflict)
+    store.create_if_not_exists()
+    own_cache = isinstance(cache, str)
+    if own_cache:
+        cache = PageCache(cache)
+    own_history = isinstance(history, str)
+    if own_history:
+        history = PriceHistory(history)
+    if history is not None:
+        seed_history(history, store, out)
+    own_journal = isinstance(journal, str)
+    if own_journal:
+        journal = JobJournal(journal)
+    validators = cache.validators if cache is not None else None
+    fetcher = fetcher or PageFetcher(per_host=per_host, validators=validators)
+    parse_pool = ParsePool(parse_processes, engine) if parse_processes > 0 else None
+
+    diff = UpsertResult()
+
+    def commit(records):
+        if history is not None:
+            diff.merge(history.record_many(
+                [(record.product_name, price_value(record.price), record.url) for record in records.records()]))
+            store.upsert_many(records)
+        else:
+            diff.merge(store.upsert_many(records))
+        return True
+
+    job = None
+    resumed = 0
+    if journal is not None:
+        total = len(urls)
+        job, urls, commit, on_event = journal.start_job(urls, out, commit, on_event)
+        resumed = total - len(urls)
+
+    async def run():
+        async with create_async_fetcher(fetcher, workers, per_host) as async_fetcher:
+            pipeline = AsyncPipeline(async_fetcher, commit, concurrency=workers, per_host=per_host,
+                                     engine=engine, commit_every=commit_every, on_event=on_event,
+                                     cache=cache, force=force, parse_pool=parse_pool)
+            return await pipeline.run(urls)
+
+    try:
+        summary = asyncio.run(run())
+        summary.diff = diff
+        summary.resumed = resumed
+        if job is not None and (summary.saved or not summary.records):
+            job.finish()
+        if history is not None and pivot_days > 0 and isinstance(store, PriceWorkbook):
+            history.write_pivot(store, pivot_days)
+        return summary
+    finally:
+        fetcher.close()
+        if parse_pool is not None:
+            parse_pool.close()
+        if own_cache:
+            cache.close()
+        if own_history:
+            history.close()
+        if own_journal:
+            journal.close()
+
+
+def watch(out, schedule, urls=(), workers=32, per_host=4, engine='stream', on_round=None, on_event=None,
+          cache=None, history=None, sites=None, lock_timeout=LOCK_TIMEOUT, merge_on_conflict=False,
+          stop=None, batch_size=None):
+    """Обновляет цены по расписанию (режим демона), пока не установлен stop (threading.Event)
+
+    schedule - RepriceSchedule (или путь к нему). Отслеживаются ссылки urls и
+    ссылки из cache и history, товары которых есть в out (они перечитываются
+    во время работы); каждая проверяется в свой срок через тот же конвейер,
+    что и refresh, а новые и изменившиеся цены записываются в out (и в
+    history, если она задана).
+    on_round(summary, counts) вызывается после каждого прогона: counts -
+    {'changed', 'unchanged', 'failed': число ссылок}. Ошибка записи не
+    останавливает работу: on_event получает ('commit_failed', ошибка), а
+    пачка запишется при следующей проверке этих ссылок. batch_size - сколько
+    ссылок проверяется за прогон (None - BATCH_SIZE расписания).
+    """
+    import asyncio
+    from .cache import PageCache
+    from .history import PriceHistory
+    from .pipeline import AsyncPipeline, create_async_fetcher
+    from .scheduler import BATCH_SIZE, RepriceSchedule, run_schedule, stored_urls
+    from .shards import open_store
+
+    if batch_size is None:
+        batch_size = BATCH_SIZE
+    if sites is not None and sites != SITES.path:
+        configure_sites(sites)
+    store = open_store(out, lock_timeout=lock_timeout, merge_on_conflict=merge_on_conflict)
+    store.create_if_not_exists()
+    own_schedule = isinstance(schedule, str)
+    if own_schedule:
+        schedule = RepriceSchedule(schedule)
+    own_cache = isinstance(cache, str)
+    if own_cache:
+        cache = PageCache(cache)
+    own_history = isinstance(history, str)
+    if own_history:
+        history = PriceHistory(history)
+    if history is not None:
+        seed_history(history, store, out)
+    stop = stop or threading.Event()
+    fetcher = PageFetcher(per_host=per_host, validators=cache.validators if cache is not None else None)
+    # Срок проверки решает расписание, поэтому свежесть кэша (ttl) не учитывается:
+    # страница запрашивается условно, прошлый разбор берется из кэша при 304
+    parsed = cache.results if cache is not None else {}
+
+    def tracked():
+        # Кэш и история общие для всех таблиц: берутся только товары, которые есть в out
+        return list(urls) + stored_urls(store, cache, history)
+
+    def commit(records):
+        try:
+            if history is not None:
+                history.record_many(
+                    [(record.product_name, price_value(record.price), record.url) for record in records.records()])
+            store.upsert_many(records)
+        except Exception as e:
+            if on_event is not None:
+                on_event('commit_failed', e)
+            return False
+        return True
+
+    async def run():
+        async with create_async_fetcher(fetcher, workers, per_host) as async_fetcher:
+            pipeline = AsyncPipeline(async_fetcher, commit, concurrency=workers, per_host=per_host,
+                                     engine=engine, parsed=parsed, on_event=on_event)
+            await run_schedule(schedule, pipeline, parsed, stop, tracked=tracked, batch_size=batch_size,
+                               on_round=on_round)
+
+    try:
+        asyncio.run(run())
+    finally:
+        fetcher.close()
+        if own_schedule:
+            schedule.close()
+        if own_cache:
+            cache.close()
+        if own_history:
+            history.close()
@@ -0,0 +1,263 @@
+"""Извлечение названия и цены товара из HTML страницы
+
+Движки:
+    regex  - предкомпилированные регулярные выражения по байтам страницы;
+    stream - события html.parser, разбор останавливается, как только найдены
+             оба поля (обычно это <head> и начало <body>);
+    soup   - полный разбор BeautifulSoup (прежний способ).
+
+Если выбранный движок не нашел какое-то из полей, страница разбирается
+полностью через soup, так что результат не хуже прежнего. Если и soup не
+нашел поле, оно берется из общей разметки: JSON-LD (schema.org Product) или
+OpenGraph (og:title, product:price:amount).
+
+Валюта берется из meta product:price:currency (и похожих), иначе из
+offers.priceCurrency в JSON-LD (extract_currency).
+"""
+import json
+import re
+from html import unescape
+from html.parser import HTMLParser
+
+from .metrics import METRICS
+
+NAME_ATTR = 'data-product-name'
+PRICE_PROPERTY = 'product:price:amount'
+
+# Кодировка страницы ищется в начале документа (<meta charset> / http-equiv)
+CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([A-Za-z0-9_-]+)', re.I)
+CHARSET_SCAN_BYTES = 4096
+
+NAME_PATTERN = re.compile(rb'\sdata-product-name\s*=\s*(?:"([^"]*)"|\'([^\']*)\')', re.I)
+META_PATTERN = re.compile(rb'<meta\b[^>]*?\sproperty\s*=\s*["\']?product:price:amount["\'\s/>][^>]*>', re.I)
+CURRENCY_META_PATTERN = re.compile(
+    rb'<meta\b[^>]*?\sproperty\s*=\s*["\']?product:price:currency["\'\s/>][^>]*>', re.I)
+CONTENT_PATTERN = re.compile(rb'\scontent\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))', re.I)
+
+# Размер порции текста, подаваемой потоковому парсеру
+STREAM_CHUNK = 8192
+
+# Общая разметка товара: блоки JSON-LD и meta-теги OpenGraph
+JSON_LD_PATTERN = re.compile(
+    rb'<script\b[^>]*?\stype\s*=\s*["\']?application/ld\+json["\']?[^>]*>(.*?)</script>', re.I | re.S)
+META_TAG_PATTERN = re.compile(rb'<meta\b[^>]*>', re.I)
+META_KEY_PATTERN = re.compile(rb'\s(?:property|name|itemprop)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))', re.I)
+OPEN_GRAPH_NAMES = ('og:title',)
+OPEN_GRAPH_PRICES = ('product:price:amount', 'og:price:amount', 'price')
+OPEN_GRAPH_CURRENCIES = ('product:price:currency', 'og:price:currency', 'pricecurrency')
+
+
+def detect_encoding(content):
+    """Кодировка страницы по BOM или <meta charset>; по умолчанию utf-8"""
+    if content.startswith(b'\xef\xbb\xbf'):
+        return 'utf-8-sig'
+    match = CHARSET_PATTERN.search(content, 0, CHARSET_SCAN_BYTES)
+    if match:
+        encoding = match.group(1).decode('ascii').lower()
+        try:
+            ''.encode(encoding)
+            return encoding
+        except LookupError:
+            pass
+    return 'utf-8'
+
+
+def _first_group(match):
+    return next(group for group in match.groups() if group is not None)
+
+
+def extract_regex(content):
+    """Быстрый путь: поиск атрибута и meta-тега регулярными выражениями"""
+    encoding = detect_encoding(content)
+    product_name = price = None
+
+    match = NAME_PATTERN.search(content)
+    if match:
+        product_name = unescape(_first_group(match).decode(encoding, 'replace'))
+
+    match = META_PATTERN.search(content)
+    if match:
+        content_match = CONTENT_PATTERN.search(match.group(0))
+        if content_match:
+            price = unescape(_first_group(content_match).decode(encoding, 'replace'))
+
+    return product_name, price
+
+
+class _ProductParser(HTMLParser):
+    """Потоковый парсер: запоминает первые найденные название и цену"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.product_name = None
+        self.price = None
+
+    @property
+    def done(self):
+        return self.product_name is not None and self.price is not None
+
+    def handle_starttag(self, tag, attrs):
+        if self.product_name is None or (self.price is None and tag == 'meta'):
+            attrs = dict(attrs)
+            if self.product_name is None and NAME_ATTR in attrs:
+                self.product_name = attrs[NAME_ATTR] or ''
+            if self.price is None and tag == 'meta' and attrs.get('property') == PRICE_PROPERTY:
+                self.price = attrs.get('content') or ''
+
+    handle_startendtag = handle_starttag
+
+
+def extract_stream(content):
+    """Потоковый разбор html.parser с остановкой после нахождения обоих полей"""
+    text = content.decode(detect_encoding(content), 'replace')
+    parser = _ProductParser()
+    for start in range(0, len(text), STREAM_CHUNK):
+        parser.feed(text[start:start + STREAM_CHUNK])
+        if parser.done:
+            break
+    return parser.product_name, parser.price
+
+
+def extract_soup(content):
+    """Полный разбор страницы BeautifulSoup (bs4 импортируется при первом вызове)"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, 'html.parser')
+
+    product_element = soup.find(attrs={NAME_ATTR: True})
+    product_name = product_element.get(NAME_ATTR, '') if product_element else None
+
+    price_tag = soup.find('meta', {'property': PRICE_PROPERTY})
+    price = price_tag.get('content', '') if price_tag else None
+
+    return product_name, price
+
+
+def meta_content(content, keys, encoding=None):
+    """content первого meta-тега с property/name/itemprop из keys (в порядке keys) или None"""
+    encoding = encoding or detect_encoding(content)
+    found = {}
+    for tag in META_TAG_PATTERN.finditer(content):
+        key_match = META_KEY_PATTERN.search(tag.group(0))
+        if key_match is None:
+            continue
+        key = _first_group(key_match).decode(encoding, 'replace').lower()
+        if key in keys and key not in found:
+            content_match = CONTENT_PATTERN.search(tag.group(0))
+            if content_match:
+                found[key] = unescape(_first_group(content_match).decode(encoding, 'replace'))
+    return next((found[key] for key in keys if key in found), None)
+
+
+def _is_product(item):
+    kind = item.get('@type')
+    return kind == 'Product' or (isinstance(kind, list) and 'Product' in kind)
+
+
+def json_ld_products(content, encoding=None):
+    """Объекты schema.org Product из блоков JSON-LD страницы (в порядке появления)"""
+    encoding = encoding or detect_encoding(content)
+    products = []
+    for match in JSON_LD_PATTERN.finditer(content):
+        try:
+            data = json.loads(match.group(1).decode(encoding, 'replace'))
+        except ValueError:
+            continue
+        stack = [data]
+        while stack:
+            item = stack.pop(0)
+            if isinstance(item, list):
+                stack.extend(item)
+            elif isinstance(item, dict):
+                if _is_product(item):
+                    products.append(item)
+                elif '@graph' in item:
+                    stack.extend(item['@graph'] if isinstance(item['@graph'], list) else [item['@graph']])
+    return products
+
+
+def json_path(item, path):
+    """Значение по пути "offers.price" (в списках берется первый элемент) или None"""
+    for key in path.split('.'):
+        if isinstance(item, list):
+            item = item[0] if item else None
+        if not isinstance(item, dict):
+            return None
+        item = item.get(key)
+    if isinstance(item, list):
+        item = item[0] if item else None
+    if item is None or isinstance(item, (dict, list)):
+        return None
+    return str(item)
+
+
+def extract_structured(content):
+    """Общий запасной путь для любых сайтов: JSON-LD Product, затем OpenGraph"""
+    encoding = detect_encoding(content)
+    product_name = price = None
+    for product in json_ld_products(content, encoding):
+        if product_name is None:
+            product_name = json_path(product, 'name')
+        if price is None:
+            price = json_path(product, 'offers.price') or json_path(product, 'offers.lowPrice')
+    if product_name is None:
+        product_name = meta_content(content, OPEN_GRAPH_NAMES, encoding)
+    if price is None:
+        price = meta_content(content, OPEN_GRAPH_PRICES, encoding)
+    return product_name, price
+
+
+def extract_currency(content, encoding=None):
+    """Код валюты страницы как в разметке (meta-теги, затем JSON-LD offers.priceCurrency) или None"""
+    encoding = encoding or detect_encoding(content)
+    # Наша разметка: meta product:price:currency рядом с ценой
+    match = CURRENCY_META_PATTERN.search(content)
+    if match:
+        content_match = CONTENT_PATTERN.search(match.group(0))
+        if content_match:
+            return _first_group(content_match).decode(encoding, 'replace')
+    currency = meta_content(content, OPEN_GRAPH_CURRENCIES, encoding)
+    if currency is not None:
+        return currency
+    for product in json_ld_products(content, encoding):
+        currency = json_path(product, 'offers.priceCurrency')
+        if currency is not None:
+            return currency
+    return None
+
+
+def strip_fields(product_name, price):
+    """Убирает пробелы по краям найденных значений"""
+    if product_name is not None:
+        product_name = product_name.strip()
+    if price is not None:
+        price = price.strip()
+    return product_name, price
+
+
+ENGINES = {
+    'regex': extract_regex,
+    'stream': extract_stream,
+    'soup': extract_soup,
+}
+
+
+def extract_product(content, engine='stream'):
+    """Возвращает (название, цена, валюта) страницы текстом; ненайденное поле - None
+
+    Название и цена очищены от пробелов по краям. Если движок не нашел
+    какое-то поле, страница разбирается полностью через soup, а затем ищется
+    общая разметка (extract_structured).
+    """
+    with METRICS.timer('extract'):
+        product_name, price = ENGINES[engine](content)
+        if engine != 'soup' and (product_name is None or price is None):
+            METRICS.add('soup_fallbacks')
+            product_name, price = extract_soup(content)
+        if product_name is None or price is None:
+            METRICS.add('structured_fallbacks')
+            structured_name, structured_price = extract_structured(content)
+            product_name = product_name if product_name is not None else structured_name
+            price = price if price is not None else structured_price
+        currency = extract_currency(content)
+
+    return (*strip_fields(product_name, price), currency)
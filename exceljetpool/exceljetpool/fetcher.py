@@ -0,0 +1,117 @@
+"""HTTP-клиент парсера: общий пул соединений, повторы и условные запросы"""
+import threading
+
+from .metrics import METRICS
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+# Коды ответа, при которых запрос повторяется с экспоненциальной задержкой
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class FetchResult:
+    """Ответ сервера на запрос страницы товара"""
+    __slots__ = ('url', 'status', 'content', 'etag', 'last_modified')
+
+    def __init__(self, url, status, content=None, etag=None, last_modified=None):
+        self.url = url
+        self.status = status
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def not_modified(self):
+        """Страница не изменилась с прошлого запроса (304)"""
+        return self.status == 304
+
+
+class PageFetcher:
+    """Загружает страницы через один requests.Session с keep-alive
+
+    Соединения к каждому хосту берутся из пула размером per_host; при
+    исчерпании пула поток ждет свободное соединение. Ответы 429/5xx и
+    сетевые ошибки повторяются с экспоненциальной задержкой (с учетом
+    Retry-After). ETag/Last-Modified запоминаются, и повторный запрос той же
+    ссылки отправляется условным - неизменная страница вернет 304 без тела.
+
+    Сессия (и сам requests) создается при первом запросе, а не при запуске.
+    """
+
+    def __init__(self, per_host=4, retries=3, backoff=0.5, timeout=10, validators=None):
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        # Ссылка -> (ETag, Last-Modified)
+        self.validators = validators if validators is not None else {}
+        self._lock = threading.Lock()
+        self._session = None
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    def _create_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=self.backoff,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=self.per_host,
+                              pool_block=True, max_retries=retry)
+
+        session = requests.Session()
+        session.headers['User-Agent'] = USER_AGENT
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def fetch(self, url, conditional=True):
+        """Загружает страницу; при conditional=True отправляет сохраненные валидаторы"""
+        headers = {}
+        if conditional:
+            etag, last_modified = self.validators.get(url, (None, None))
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
+        with METRICS.timer('fetch'):
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        METRICS.add('requests')
+        # До получения заголовков: DNS, соединение и ожидание ответа сервера
+        METRICS.observe('fetch_wait', response.elapsed.total_seconds())
+        if response.status_code == 304:
+            METRICS.add('not_modified')
+            etag, last_modified = self.validators.get(url, (None, None))
+            return FetchResult(url, 304, etag=etag, last_modified=last_modified)
+
+        response.raise_for_status()
+
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        with self._lock:
+            if etag or last_modified:
+                self.validators[url] = (etag, last_modified)
+            else:
+                self.validators.pop(url, None)
+
+        METRICS.add('bytes_fetched', len(response.content))
+        return FetchResult(url, response.status_code, response.content, etag, last_modified)
+
+    def close(self):
+        """Закрывает все соединения пула"""
+        if self._session is not None:
+            self._session.close()
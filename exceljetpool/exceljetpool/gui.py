@@ -0,0 +1,1155 @@
+"""Окно парсера цен (Tk); вся работа с сайтом и таблицей - в core и workbook
+
+asyncio, конвейер, расписание и пул процессов нужны только пакетной загрузке
+и автообновлению - они импортируются при первом использовании, чтобы окно
+открывалось быстрее.
+"""
+import logging
+import os
+import tkinter as tk
+from tkinter import ttk, messagebox, scrolledtext, filedialog
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from logging.handlers import RotatingFileHandler
+from .cache import PageCache
+from .core import (NAME_NOT_FOUND, HostLimiter, default_cache_path, default_excel_path, default_journal_path,
+                  default_schedule_path,
+                  default_log_path, default_sites_path, extract_urls, parse_product)
+from .fetcher import PageFetcher
+from .locking import LockTimeout
+from .journal import JobJournal
+from .metrics import METRICS
+from .records import PriceRecord, RecordBatch, format_price
+from .shards import ShardedWorkbook, open_store
+from .sites import configure as configure_sites
+from .stores import FileStore
+from .uiqueue import UiQueue
+from .workbook import ADDED, DEFERRED, UNCHANGED, ProductIndex, UpsertResult, dedupe_records
+from .writer import WriteBehindWriter
+
+
+class PriceParserApp:
+    # Параметры пакетной загрузки
+    BATCH_MAX_WORKERS = 8
+    BATCH_PER_HOST = 4
+    
+    # Пакетная загрузка: 'asyncio' (один цикл событий на все задания) или 'threads'
+    BATCH_ENGINE = 'asyncio'
+    # Сколько страниц асинхронный конвейер держит в работе одновременно
+    PIPELINE_CONCURRENCY = 100
+    
+    # Движок извлечения данных со страницы: 'stream', 'regex' или 'soup'
+    EXTRACT_ENGINE = 'stream'
+    
+    # Пакеты от стольких ссылок разбираются в пуле процессов (все ядра, а не одно);
+    # PARSE_PROCESSES - число процессов (None - по числу ядер, 0 - только потоки)
+    PARSE_POOL_MIN_URLS = 200
+    PARSE_PROCESSES = None
+    
+    # Сколько секунд результат разбора страницы считается свежим
+    CACHE_TTL = 3600
+    
+    # Отложенная запись: товары копятся и пишутся одной пачкой, когда их
+    # набралось столько или самому старому исполнилось столько секунд
+    WRITE_BEHIND_MAX_PENDING = 20
+    WRITE_BEHIND_DELAY = 5.0
+    
+    # Как часто окно забирает лог и статус из рабочих потоков (мс)
+    UI_POLL_MS = 100
+    # Сколько последних строк лога держит окно; полный лог - в файле с ротацией
+    LOG_MAX_LINES = 1000
+    LOG_FILE_MAX_BYTES = 1024 * 1024
+    LOG_FILE_BACKUPS = 3
+    
+    # Если таблицу дольше LOCK_TIMEOUT секунд пишет другой процесс, пачка
+    # откладывается в журнал изменений (MERGE_ON_CONFLICT) вместо ошибки
+    LOCK_TIMEOUT = 30.0
+    MERGE_ON_CONFLICT = True
+    
+    # Основное хранилище цен: 'xlsx' (prices.xlsx) или 'csv', 'sqlite', 'parquet' -
+    # тогда prices.xlsx выгружается по кнопке "Выгрузить в Excel"
+    STORE_FORMAT = 'xlsx'
+    
+    # Автообновление: ссылки товаров таблицы (из кэша страниц) проверяются по
+    # расписанию, каждая в свой срок; не чаще SCHEDULE_RATE запросов в минуту к сайту
+    SCHEDULE_RATE = 30
+    
+    # Куда выгрузить метрики стадий при закрытии (*.prom - Prometheus, иначе JSON-строки); None - не выгружать
+    METRICS_FILE = None
+
+    def __init__(self, root):
+        self.root = root
+        self.root.title("Парсер цен товаров")
+        self.root.geometry("720x400")
+        self.root.resizable(True, True)
+        
+        # Определяем путь для сохранения Excel файла (рядом с EXE)
+        self.excel_file = self.get_excel_file_path()
+        
+        # Флаг для корректного завершения
+        self.is_closing = False
+        self.active_threads = []
+        
+        # Рабочие потоки обновляют окно только через очередь (см. poll_ui),
+        # полный лог пишется в файл
+        self.ui = UiQueue()
+        self.logger = self.create_file_log()
+        
+        # Фоновый цикл событий асинхронного конвейера и его незавершенные задания
+        self.pipeline_loop = None
+        self.active_jobs = []
+        # Пул процессов разбора создается при первом большом пакете
+        self.parse_pool = None
+        
+        # Кэш страниц на диске: свежие товары не загружаются повторно,
+        # остальные проверяются условным запросом (304)
+        try:
+            self.page_cache = PageCache(default_cache_path(), ttl=self.CACHE_TTL)
+        except Exception as e:
+            self.logger.warning(f"Кэш страниц недоступен: {e}")
+            self.page_cache = None
+        
+        # Общий HTTP-клиент и результаты разбора страниц (для ответов 304)
+        if self.page_cache is not None:
+            self.fetcher = PageFetcher(per_host=self.BATCH_PER_HOST, validators=self.page_cache.validators)
+            self.parsed_pages = self.page_cache.results
+        else:
+            self.fetcher = PageFetcher(per_host=self.BATCH_PER_HOST)
+            self.parsed_pages = {}
+        
+        # Журнал пакетных заданий: прерванная загрузка продолжается с места сбоя
+        try:
+            self.journal = JobJournal(default_journal_path())
+        except Exception as e:
+            self.logger.warning(f"Журнал заданий недоступен: {e}")
+            self.journal = None
+        
+        # Расписание автообновления открывается при первом включении
+        self.schedule = None
+        self.schedule_stop = None
+        
+        # Лист цен, который держится в памяти между записями через openpyxl
+        # (или каталог шардов, если рядом с prices.xlsx лежит манифест)
+        self.workbook = open_store(self.excel_file, lock_timeout=self.LOCK_TIMEOUT,
+                                   merge_on_conflict=self.MERGE_ON_CONFLICT)
+        self.sharded = isinstance(self.workbook, ShardedWorkbook)
+        self.file_store = isinstance(self.workbook, FileStore)
+        # Отчет о последней записи (добавлено/изменено/без изменений)
+        self.last_report = None
+        
+        # Все записи в таблицу идут через один поток-писатель
+        self.writer = WriteBehindWriter(self.update_excel_many,
+                                        max_pending=self.WRITE_BEHIND_MAX_PENDING,
+                                        max_delay=self.WRITE_BEHIND_DELAY,
+                                        on_flush=self.on_write_flush)
+        
+        # Обработка закрытия окна
+        self.root.protocol("WM_DELETE_WINDOW", self.safe_close)
+        
+        # Создаем и размещаем элементы интерфейса
+        self.create_widgets()
+        
+        # Правила извлечения для других магазинов (sites.json), компилируются один раз
+        if os.path.exists(default_sites_path()):
+            try:
+                sites = configure_sites(default_sites_path())
+                self.log_message(f"Правила сайтов: {len(sites)}")
+            except Exception as e:
+                self.log_message(f"Ошибка в правилах сайтов {os.path.basename(default_sites_path())}: {e}")
+        
+        # Лог и статус из рабочих потоков
+        self.root.after(self.UI_POLL_MS, self.poll_ui)
+        
+        # Предлагаем продолжить прерванную пакетную загрузку
+        self.root.after(500, self.offer_resume)
+        
+    def get_excel_file_path(self):
+        """Определяет путь для сохранения Excel файла (или хранилища STORE_FORMAT) рядом с EXE"""
+        if self.STORE_FORMAT == 'xlsx':
+            return default_excel_path()
+        return os.path.splitext(default_excel_path())[0] + '.' + self.STORE_FORMAT
+    
+    def create_widgets(self):
+        # Заголовок
+        title_label = ttk.Label(self.root, text="Парсер цен товаров", font=("Calibri", 16, "bold"))
+        title_label.pack(pady=10)
+        
+        # Информация о пути сохранения
+        path_info = ttk.Label(self.root, text=f"Файл будет сохранен: {os.path.basename(self.excel_file)}", 
+                             font=("Calibri", 9), foreground="blue")
+        path_info.pack(pady=2)
+        
+        # Описание
+        desc_label = ttk.Label(self.root, text="Введите ссылку на товар с вашего сайта:", font=("Calibri", 10))
+        desc_label.pack(pady=5)
+        
+        # Поле для ввода ссылки с кнопкой вставки
+        self.url_frame = ttk.Frame(self.root)
+        self.url_frame.pack(pady=10, padx=20, fill=tk.X)
+        
+        self.url_label = ttk.Label(self.url_frame, text="Ссылка:", font=("Calibri", 10))
+        self.url_label.pack(side=tk.LEFT)
+        
+        self.url_entry = ttk.Entry(self.url_frame, width=50, font=("Calibri", 10))
+        self.url_entry.pack(side=tk.LEFT, padx=(10, 5), fill=tk.X, expand=True)
+        self.url_entry.bind('<Return>', lambda event: self.add_to_table())
+        
+        # Кнопка вставки из буфера обмена
+        self.paste_button = ttk.Button(self.url_frame, text="Вставить", 
+                                      command=self.paste_from_clipboard, width=10)
+        self.paste_button.pack(side=tk.LEFT, padx=5)
+        
+        # Кнопки действий
+        self.button_frame = ttk.Frame(self.root)
+        self.button_frame.pack(pady=15)
+        
+        self.add_button = ttk.Button(self.button_frame, text="Добавить в таблицу", 
+                                   command=self.add_to_table, width=20)
+        self.add_button.pack(side=tk.LEFT, padx=5)
+        
+        self.batch_button = ttk.Button(self.button_frame, text="Пакетная загрузка", 
+                                     command=self.open_batch_window, width=18)
+        self.batch_button.pack(side=tk.LEFT, padx=5)
+        
+        self.clear_button = ttk.Button(self.button_frame, text="Очистить поле", 
+                                     command=self.clear_field, width=15)
+        self.clear_button.pack(side=tk.LEFT, padx=5)
+        
+        # Хранилище не в XLSX: таблица для Excel выгружается по требованию
+        if self.file_store:
+            self.export_button = ttk.Button(self.button_frame, text="Выгрузить в Excel", 
+                                          command=self.export_xlsx, width=18)
+            self.export_button.pack(side=tk.LEFT, padx=5)
+        
+        self.exit_button = ttk.Button(self.button_frame, text="Выйти", 
+                                    command=self.safe_close, width=15)
+        self.exit_button.pack(side=tk.LEFT, padx=5)
+        
+        # Фоновое обновление цен по расписанию
+        self.schedule_var = tk.BooleanVar(value=False)
+        self.schedule_check = ttk.Checkbutton(self.root, text="Автообновление цен по расписанию",
+                                              variable=self.schedule_var, command=self.toggle_schedule)
+        self.schedule_check.pack()
+        
+        # Область для вывода логов
+        self.log_frame = ttk.LabelFrame(self.root, text="Лог выполнения", padding=10)
+        self.log_frame.pack(pady=10, padx=20, fill=tk.BOTH, expand=True)
+        
+        self.log_text = scrolledtext.ScrolledText(self.log_frame, height=15, width=70, 
+                                                font=("Consolas", 9))
+        self.log_text.pack(fill=tk.BOTH, expand=True)
+        self.log_text.config(state=tk.DISABLED)
+        
+        # Статус бар
+        self.status_var = tk.StringVar()
+        self.status_var.set("Готов к работе")
+        self.status_bar = ttk.Label(self.root, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
+        self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        
+        # Контекстное меню для поля ввода
+        self.create_context_menu()
+        
+        # Фокус на поле ввода
+        self.url_entry.focus()
+        
+        # Создаем Excel файл при запуске, если его нет
+        self.create_excel_file_if_not_exists()
+    
+    def create_excel_file_if_not_exists(self):
+        """Создает Excel файл при запуске, если он не существует"""
+        try:
+            if self.workbook.create_if_not_exists():
+                self.log_message(f"Создан новый файл: {os.path.basename(self.excel_file)}")
+            # Пачки, отложенные, пока файл был занят, дописываются сразу
+            if self.workbook.has_pending_changes():
+                self.log_message(f"Записаны отложенные изменения: {self.workbook.upsert_many([])}")
+        except Exception as e:
+            self.log_message(f"Ошибка при создании файла: {e}")
+    
+    def create_context_menu(self):
+        """Создает контекстное меню для поля ввода"""
+        self.context_menu = tk.Menu(self.root, tearoff=0)
+        self.context_menu.add_command(label="Вставить", command=self.paste_from_clipboard)
+        self.context_menu.add_command(label="Вырезать", command=self.cut_text)
+        self.context_menu.add_command(label="Копировать", command=self.copy_text)
+        self.context_menu.add_separator()
+        self.context_menu.add_command(label="Очистить", command=self.clear_field)
+        
+        # Привязываем контекстное меню к полю ввода
+        self.url_entry.bind("<Button-3>", self.show_context_menu)
+    
+    def show_context_menu(self, event):
+        """Показывает контекстное меню"""
+        if self.is_closing:
+            return
+        try:
+            self.context_menu.tk_popup(event.x_root, event.y_root)
+        finally:
+            self.context_menu.grab_release()
+    
+    def safe_close(self):
+        """Безопасное закрытие приложения"""
+        if self.is_closing:
+            return
+            
+        self.is_closing = True
+        
+        # Проверяем активные потоки и задания конвейера
+        if self.active_threads or self.active_jobs:
+            active_count = sum(1 for thread in self.active_threads if thread.is_alive())
+            active_count += sum(1 for job in self.active_jobs if not job.done())
+            if active_count > 0:
+                result = messagebox.askyesno(
+                    "Подождите", 
+                    f"В настоящее время выполняется {active_count} операций. Вы уверены, что хотите выйти?"
+                )
+                if not result:
+                    self.is_closing = False
+                    return
+        
+        # Блокируем все кнопки
+        self.add_button.config(state=tk.DISABLED)
+        self.batch_button.config(state=tk.DISABLED)
+        self.clear_button.config(state=tk.DISABLED)
+        self.paste_button.config(state=tk.DISABLED)
+        self.exit_button.config(state=tk.DISABLED)
+        self.schedule_check.config(state=tk.DISABLED)
+        
+        self.log_message("Завершение работы приложения...")
+        self.update_status("Завершение...")
+        
+        # Даем время на завершение операций
+        self.root.after(100, self.force_close)
+    
+    def force_close(self):
+        """Принудительное закрытие приложения"""
+        # Вызовы из очереди окна больше не выполняются - отпускаем ожидающих ответа
+        self.ui.close()
+        try:
+            # Закрываем все соединения с Excel
+            try:
+                import win32com.client as win32
+                win32.Dispatch("Excel.Application").Quit()
+            except:
+                pass
+                
+            # Дописываем очередь отложенной записи напрямую через openpyxl
+            # (методы окна при закрытии уже ничего не записывают)
+            pending = self.writer.close(timeout=10)
+            if pending:
+                try:
+                    self.workbook.upsert_many(pending)
+                except Exception as e:
+                    self.logger.error(f"Не удалось записать {len(pending)} товаров при закрытии: {e}")
+            
+            if self.schedule_stop is not None:
+                self.schedule_stop.set()
+            self.fetcher.close()
+            if self.page_cache is not None:
+                self.page_cache.close()
+            if self.parse_pool is not None:
+                self.parse_pool.close()
+            if self.journal is not None:
+                self.journal.close()
+            if self.METRICS_FILE:
+                METRICS.write(self.METRICS_FILE)
+            
+            # Закрываем окно
+            self.root.quit()
+            self.root.destroy()
+            
+        except Exception as e:
+            print(f"Ошибка при закрытии: {e}")
+        
+        # Гарантированное завершение процесса
+        import time
+        time.sleep(0.5)
+        os._exit(0)
+    
+    def paste_from_clipboard(self):
+        """Вставляет текст из буфера обмена в поле ввода"""
+        if self.is_closing:
+            return
+        try:
+            self.url_entry.delete(0, tk.END)
+            clipboard_text = self.root.clipboard_get()
+            self.url_entry.insert(0, clipboard_text)
+            self.log_message("Текст из буфера обмена вставлен")
+        except Exception as e:
+            self.log_message(f"Ошибка при вставке из буфера обмена: {e}")
+            messagebox.showerror("Ошибка", "Не удалось вставить текст из буфера обмена")
+    
+    def cut_text(self):
+        """Вырезает выделенный текст"""
+        if self.is_closing:
+            return
+        try:
+            self.url_entry.event_generate("<<Cut>>")
+        except:
+            pass
+    
+    def copy_text(self):
+        """Копирует выделенный текст"""
+        if self.is_closing:
+            return
+        try:
+            self.url_entry.event_generate("<<Copy>>")
+        except:
+            pass
+    
+    def create_file_log(self):
+        """Файл полного лога рядом с программой (с ротацией)"""
+        logger = logging.getLogger('exceljetpool.gui')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        if not logger.handlers:
+            try:
+                handler = RotatingFileHandler(default_log_path(), maxBytes=self.LOG_FILE_MAX_BYTES,
+                                              backupCount=self.LOG_FILE_BACKUPS, encoding='utf-8')
+            except OSError as e:
+                print(f"Файл лога недоступен: {e}")
+                return logger
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            logger.addHandler(handler)
+        return logger
+    
+    def log_message(self, message):
+        """Добавляет сообщение в лог (можно вызывать из любого потока)"""
+        self.logger.info(message)
+        if not self.is_closing:
+            self.ui.log(message)
+    
+    def update_status(self, message):
+        """Обновляет статус бар (можно вызывать из любого потока)"""
+        if not self.is_closing:
+            self.ui.status(message)
+    
+    def poll_ui(self):
+        """Переносит в окно накопившиеся лог, статус и вызовы из рабочих потоков"""
+        lines, status, calls = self.ui.drain()
+        try:
+            if lines and not self.is_closing:
+                # Старше LOG_MAX_LINES строк все равно будут удалены - не вставляем их
+                self.log_text.config(state=tk.NORMAL)
+                self.log_text.insert(tk.END, "\n".join(lines[-self.LOG_MAX_LINES:]) + "\n")
+                excess = int(self.log_text.index('end-1c').split('.')[0]) - 1 - self.LOG_MAX_LINES
+                if excess > 0:
+                    self.log_text.delete('1.0', f'{excess + 1}.0')
+                self.log_text.see(tk.END)
+                self.log_text.config(state=tk.DISABLED)
+            if status is not None and not self.is_closing:
+                self.status_var.set(status)
+            self.root.after(self.UI_POLL_MS, self.poll_ui)
+        except tk.TclError:
+            # Окно уже закрыто
+            self.ui.close()
+            return
+        for call in calls:
+            try:
+                self.ui.run(call)
+            except Exception as e:
+                self.logger.info(f"Ошибка обновления окна: {e}")
+    
+    def set_buttons(self, state, *buttons):
+        """Включает/выключает кнопки (только из главного потока, из рабочих - через self.ui.call)"""
+        if self.is_closing:
+            return
+        for button in buttons:
+            button.config(state=state)
+    
+    def clear_field(self):
+        """Очищает поле ввода"""
+        if self.is_closing:
+            return
+        self.url_entry.delete(0, tk.END)
+        self.url_entry.focus()
+        self.log_message("Поле ввода очищено")
+    
+    @METRICS.timer('parse_my_site')
+    def parse_my_site(self, url, verbose=True):
+        """Парсит название и цену товара с вашего сайта; возвращает PriceRecord или None при ошибке"""
+        if self.is_closing:
+            return None
+            
+        # В пакетном режиме пишем в лог только ошибки
+        log = self.log_message if verbose else (lambda message: None)
+        
+        try:
+            if verbose:
+                self.update_status(f"Парсим сайт: {url}")
+            log(f"Начинаем парсинг: {url}")
+            
+            # Наша разметка или правила сайта из sites.json;
+            # неизменная страница (304) берется из прошлых разборов
+            product_name, price, currency = parse_product(url, self.fetcher, self.parsed_pages,
+                                                          self.EXTRACT_ENGINE, cache=self.page_cache)
+            
+            if product_name is not None:
+                log(f"Найдено название: {product_name}")
+            else:
+                product_name = NAME_NOT_FOUND
+                log("Не удалось найти название товара")
+            
+            # Цена уже разобрана в копейки при извлечении (extract_page)
+            record = PriceRecord(product_name, price, url, currency)
+            if record.price is not None:
+                log(f"Найдена цена: {record.price_text}")
+            else:
+                log("Не удалось найти цену")
+            
+            return record
+            
+        except Exception as e:
+            error_msg = f"Ошибка при парсинге вашего сайта: {e}"
+            self.log_message(error_msg)
+            return None
+    
+    def find_first_empty_row_in_column_a(self, ws, method='win32com'):
+        """Находит первую действительно пустую строку в столбце A"""
+        if method == 'win32com':
+            return ProductIndex.from_win32com(ws).next_row
+        return ProductIndex.from_openpyxl(ws).next_row
+    
+    def update_excel_with_win32com(self, product_name, my_price):
+        """Обновляет Excel файл с ценами через win32com"""
+        return self.update_excel_many_with_win32com([(product_name, my_price)])
+    
+    @METRICS.timer('update_excel_win32com')
+    def update_excel_many_with_win32com(self, records):
+        """Обновляет Excel файл списком (название, цена) через win32com за одно сохранение
+
+        Запасной путь, когда файл открыт в Excel. Как и upsert_many, пишет под
+        блокировкой файла и первыми применяет пачки, отложенные другими писателями.
+        """
+        if self.is_closing:
+            return False
+            
+        # win32com есть только на Windows, поэтому загружается по требованию
+        try:
+            import pythoncom
+            import win32com.client as win32
+        except ImportError as e:
+            self.log_message(f"win32com не доступен: {e}")
+            return False
+            
+        records = list(records)
+        # Пока книга открыта через Excel, другие писатели ее не перезаписывают
+        try:
+            self.workbook.lock.acquire()
+        except LockTimeout as e:
+            if not self.workbook.merge_on_conflict:
+                self.log_message(str(e))
+                return False
+            # Файл занят другим писателем - пачка откладывается, как в upsert_many
+            self.workbook.changes.append(records)
+            METRICS.add('deferred_batches')
+            report = UpsertResult()
+            for product_name in dedupe_records(records):
+                report.record(DEFERRED, product_name, None)
+            self.last_report = report
+            self.log_message(f"Файл занят, изменения отложены ({report})")
+            return True
+            
+        try:
+            deferred = self.workbook.changes.drain()
+            saved = False
+            try:
+                saved = self.write_with_win32com(pythoncom, win32, deferred + records)
+                return saved
+            finally:
+                # Чужие отложенные изменения не должны пропасть из-за нашей ошибки
+                if deferred and not saved:
+                    self.workbook.changes.append(deferred)
+        finally:
+            self.workbook.lock.release()
+    
+    def write_with_win32com(self, pythoncom, win32, records):
+        """Запись пачки через Excel (вызывается под блокировкой файла); True - файл сохранен"""
+        # Инициализируем COM для этого потока
+        pythoncom.CoInitialize()
+        
+        excel = None
+        wb = None
+        
+        try:
+            self.update_status("Обновляем Excel файл...")
+            
+            # Используем self.excel_file
+            abs_path = os.path.abspath(self.excel_file)
+            
+            # Подключаемся к Excel
+            excel = win32.Dispatch("Excel.Application")
+            excel.Visible = False  # Скрываем Excel
+            
+            # Пытаемся найти открытую книгу
+            try:
+                wb = excel.Workbooks.Open(abs_path)
+            except Exception as e:
+                self.log_message(f"Не удалось открыть файл через win32com: {e}")
+                return False
+            
+            ws = wb.ActiveSheet
+            
+            # Книга могла быть изменена в Excel - индекс строим заново
+            index = ProductIndex.from_win32com(ws)
+            report = UpsertResult()
+            new_rows = []
+            
+            for product_name, my_price in dedupe_records(records).items():
+                if self.is_closing:
+                    break
+                    
+                row, status = index.upsert(product_name, my_price)
+                report.record(status, product_name, row)
+                if status == UNCHANGED:
+                    # Цена та же - ячейку не трогаем
+                    continue
+                if status == ADDED:
+                    # Если товар не найден, добавляем в первую пустую строку столбца A
+                    new_rows.append((product_name, my_price))
+                    self.log_message(f"Добавлен новый товар в строку {row}: {product_name}")
+                    continue
+                
+                # Обновляем цену в столбце B (наш сайт)
+                ws.Cells(row, 2).Value = my_price
+                ws.Cells(row, 2).Font.Name = "Calibri"
+                ws.Cells(row, 2).Font.Size = 18
+                self.log_message(f"Обновлена цена для: {product_name}")
+            
+            # Новые товары идут подряд - записываем их одним диапазоном
+            if new_rows and not self.is_closing:
+                first_row = index.next_row - len(new_rows)
+                block = ws.Range(ws.Cells(first_row, 1), ws.Cells(index.next_row - 1, 2))
+                block.Value = tuple(new_rows)
+                block.Font.Name = "Calibri"
+                block.Font.Size = 18
+            
+            # Сохраняем файл, только если что-то изменилось
+            if not self.is_closing:
+                self.last_report = report
+                if not report:
+                    wb.Close(False)
+                    self.log_message(f"Цены не изменились ({report}), файл не перезаписан")
+                    return True
+                with METRICS.timer('save'):
+                    wb.Save()
+                METRICS.add('cells_written', len(report) + len(report.added))
+                # Книга openpyxl в памяти больше не соответствует файлу
+                self.workbook.invalidate()
+                self.log_message(f"Файл {os.path.basename(self.excel_file)} успешно обновлен! ({report})")
+                return True
+            else:
+                if wb:
+                    wb.Close(False)
+                return False
+            
+        except Exception as e:
+            error_msg = f"Ошибка при работе с Excel через win32com: {e}"
+            self.log_message(error_msg)
+            return False
+        finally:
+            # Всегда закрываем Excel и освобождаем COM
+            try:
+                if wb:
+                    wb.Close()
+            except:
+                pass
+            try:
+                if excel:
+                    excel.Quit()
+            except:
+                pass
+            # Освобождаем COM
+            pythoncom.CoUninitialize()
+    
+    def update_excel_with_openpyxl(self, product_name, my_price):
+        """Обновляет Excel файл с ценами через openpyxl"""
+        return self.update_excel_many_with_openpyxl([(product_name, my_price)])
+    
+    @METRICS.timer('update_excel_openpyxl')
+    def update_excel_many_with_openpyxl(self, records):
+        """Обновляет Excel файл списком (название, цена) через openpyxl за одно сохранение"""
+        if self.is_closing:
+            return False
+            
+        # Пачка может понадобиться второй раз - для записи через win32com
+        records = list(records)
+        try:
+            self.update_status("Обновляем Excel файл...")
+            
+            if self.is_closing:
+                return False
+                
+            # Вся пачка объединяется с листом за один проход и одно сохранение
+            # (неизмененные цены не записываются, а без изменений файл не сохраняется)
+            result = self.workbook.upsert_many(records)
+            self.last_report = result
+            for product_name, row in result.changed:
+                self.log_message(f"Обновлена цена для: {product_name}")
+            for product_name, row in result.added:
+                self.log_message(f"Добавлен новый товар в строку {row}: {product_name}")
+            if result:
+                self.log_message(f"Файл {os.path.basename(self.excel_file)} успешно обновлен! ({result})")
+            else:
+                self.log_message(f"Цены не изменились ({result}), файл не перезаписан")
+            return True
+            
+        except Exception as e:
+            error_msg = f"Ошибка при работе с Excel через openpyxl: {e}"
+            self.log_message(error_msg)
+            if isinstance(e, PermissionError) and not (self.sharded or self.file_store):
+                self.log_message("Файл открыт в Excel. Пытаемся использовать альтернативный метод...")
+                return self.update_excel_many_with_win32com(records)
+            return False
+    
+    def update_excel(self, product_name, my_price):
+        """Основная функция обновления Excel"""
+        return self.update_excel_many([(product_name, my_price)])
+    
+    def update_excel_many(self, records):
+        """Записывает пачку (название, цена) в Excel одним сохранением
+
+        Основной путь - upsert_many: запись под блокировкой файла, атомарная
+        замена, отложенные пачки и слияние при конфликте. win32com
+        используется, только если файл открыт в Excel (PermissionError).
+        """
+        if self.is_closing:
+            return False
+        return self.update_excel_many_with_openpyxl(records)
+    
+    def on_write_flush(self, records, saved):
+        """Сообщает об исходе записи пачки из очереди"""
+        if not saved:
+            self.log_message(f"Не удалось записать {len(records)} товаров, повтор через "
+                             f"{self.WRITE_BEHIND_DELAY:g} с")
+    
+    def add_to_table_thread(self, url):
+        """Функция для выполнения в отдельном потоке; окно обновляется через self.ui"""
+        thread_id = threading.current_thread().ident
+        self.active_threads.append(threading.current_thread())
+        buttons = (self.add_button, self.batch_button, self.clear_button, self.paste_button)
+        
+        try:
+            if self.is_closing:
+                return
+            
+            try:
+                # Парсинг данных с вашего сайта
+                record = self.parse_my_site(url)
+                
+                if record is not None and not self.is_closing:
+                    # Подтверждение действия
+                    result = self.ui.ask(messagebox.askyesno, "Подтверждение", 
+                                         f"Найдено: {record.product_name}\nЦена: {format_price(record.price)} руб.\n\nДобавить в таблицу?")
+                    
+                    if result and not self.is_closing:
+                        # Запись в файл выполнит поток-писатель вместе с другими товарами
+                        self.writer.submit(record.product_name, record.value)
+                        if self.schedule is not None:
+                            self.schedule.track([url])
+                        self.log_message(f"Товар поставлен в очередь записи (в очереди: {len(self.writer)})")
+                        if not self.is_closing:
+                            self.ui.call(messagebox.showinfo, "Успех", "Данные приняты и будут записаны в таблицу!")
+                            self.ui.call(self.clear_field)
+                elif not self.is_closing:
+                    self.ui.call(messagebox.showerror, "Ошибка", "Не удалось получить данные о товаре!")
+                    
+            except Exception as e:
+                if not self.is_closing:
+                    self.ui.call(messagebox.showerror, "Ошибка", f"Произошла ошибка: {e}")
+            finally:
+                # Разблокируем кнопки
+                if not self.is_closing:
+                    self.ui.call(self.set_buttons, tk.NORMAL, *buttons)
+                    self.update_status("Готов к работе")
+                
+        finally:
+            # Удаляем поток из списка активных
+            self.active_threads = [t for t in self.active_threads if t.ident != thread_id]
+    
+    def add_to_table(self):
+        """Проверяет ссылку и запускает добавление в таблицу в отдельном потоке"""
+        if self.is_closing:
+            return
+            
+        url = self.url_entry.get().strip()
+        
+        if not url:
+            messagebox.showwarning("Внимание", "Введите ссылку на товар!")
+            return
+        
+        if not url.startswith('http'):
+            messagebox.showwarning("Внимание", "Неверный формат ссылки!")
+            return
+        
+        # Блокируем кнопки на время выполнения
+        self.set_buttons(tk.DISABLED, self.add_button, self.batch_button, self.clear_button, self.paste_button)
+        
+        thread = threading.Thread(target=self.add_to_table_thread, args=(url,))
+        thread.daemon = True
+        thread.start()
+    
+    def open_batch_window(self):
+        """Открывает окно пакетной загрузки списка ссылок"""
+        if self.is_closing:
+            return
+            
+        window = tk.Toplevel(self.root)
+        window.title("Пакетная загрузка")
+        window.geometry("600x400")
+        window.transient(self.root)
+        
+        desc_label = ttk.Label(window, text="Вставьте ссылки (по одной в строке) или загрузите TXT/CSV файл:", 
+                              font=("Calibri", 10))
+        desc_label.pack(pady=5)
+        
+        urls_text = scrolledtext.ScrolledText(window, height=15, width=70, font=("Consolas", 9))
+        urls_text.pack(padx=20, fill=tk.BOTH, expand=True)
+        
+        def load_file():
+            path = filedialog.askopenfilename(parent=window, title="Файл со ссылками",
+                                              filetypes=[("Текст и CSV", "*.txt *.csv"), ("Все файлы", "*.*")])
+            if not path:
+                return
+            try:
+                with open(path, encoding='utf-8-sig', errors='replace') as f:
+                    urls_text.insert(tk.END, f.read() + "\n")
+            except Exception as e:
+                messagebox.showerror("Ошибка", f"Не удалось прочитать файл: {e}", parent=window)
+        
+        def start():
+            urls = extract_urls(urls_text.get("1.0", tk.END))
+            if not urls:
+                messagebox.showwarning("Внимание", "Не найдено ни одной ссылки!", parent=window)
+                return
+            window.destroy()
+            self.add_batch(urls)
+        
+        button_frame = ttk.Frame(window)
+        button_frame.pack(pady=10)
+        ttk.Button(button_frame, text="Из файла...", command=load_file, width=15).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Запустить", command=start, width=15).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Отмена", command=window.destroy, width=15).pack(side=tk.LEFT, padx=5)
+        
+        urls_text.focus()
+    
+    def parse_many(self, urls):
+        """Параллельно парсит список ссылок; возвращает (записи, ссылки с ошибками)"""
+        limiter = HostLimiter(self.BATCH_PER_HOST)
+        
+        def parse(url):
+            with limiter.acquire(url):
+                if self.is_closing:
+                    return None
+                return self.parse_my_site(url, verbose=False)
+        
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.BATCH_MAX_WORKERS) as pool:
+            futures = {pool.submit(parse, url): url for url in urls}
+            for done, future in enumerate(as_completed(futures), 1):
+                results[futures[future]] = future.result()
+                self.update_status(f"Пакетная загрузка: {done} из {len(urls)}")
+        
+        # Записи идут в порядке исходного списка ссылок;
+        # при повторе товара остается последняя цена
+        records = RecordBatch()
+        failed = []
+        for url in urls:
+            record = results[url]
+            if record is not None and record.product_name != NAME_NOT_FOUND:
+                records.append(record)
+            else:
+                failed.append(url)
+        
+        return records, failed
+    
+    def add_batch_thread(self, urls):
+        """Пакетная загрузка: параллельный парсинг и одна запись в таблицу"""
+        thread_id = threading.current_thread().ident
+        self.active_threads.append(threading.current_thread())
+        
+        try:
+            if self.is_closing:
+                return
+                
+            # Блокируем кнопки на время выполнения
+            self.ui.call(self.set_buttons, tk.DISABLED, self.add_button, self.batch_button)
+            
+            try:
+                self.log_message(f"Пакетная загрузка: {len(urls)} ссылок")
+                records, failed = self.parse_many(urls)
+                
+                if self.is_closing:
+                    return
+                    
+                saved = bool(records) and self.writer.write(records)
+                self.report_batch(len(urls), len(records), failed, saved)
+                    
+            except Exception as e:
+                if not self.is_closing:
+                    self.ui.call(messagebox.showerror, "Ошибка", f"Произошла ошибка: {e}")
+            finally:
+                # Разблокируем кнопки
+                if not self.is_closing:
+                    self.ui.call(self.set_buttons, tk.NORMAL, self.add_button, self.batch_button)
+                    self.update_status("Готов к работе")
+                    
+        finally:
+            # Удаляем поток из списка активных
+            self.active_threads = [t for t in self.active_threads if t.ident != thread_id]
+    
+    def report_batch(self, total, received, failed, saved):
+        """Выводит итог пакетной загрузки одним сообщением"""
+        for url in failed:
+            self.log_message(f"Не удалось получить данные: {url}")
+            
+        summary = (f"Ссылок: {total}\n"
+                   f"Получено товаров: {received}\n"
+                   f"Ошибок: {len(failed)}")
+        if saved and self.last_report is not None:
+            summary += f"\nТаблица: {self.last_report}"
+        self.log_message(summary.replace("\n", "; "))
+        
+        if self.is_closing:
+            return
+        if saved:
+            self.ui.call(messagebox.showinfo, "Пакетная загрузка", summary + "\n\nТаблица обновлена!")
+        else:
+            self.ui.call(messagebox.showerror, "Пакетная загрузка", summary + "\n\nТаблица не обновлена!")
+    
+    def get_pipeline_loop(self):
+        """Запускает (один раз) фоновый поток с циклом событий конвейера"""
+        if self.pipeline_loop is None:
+            import asyncio
+            self.pipeline_loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=self.pipeline_loop.run_forever)
+            thread.daemon = True
+            thread.start()
+        return self.pipeline_loop
+    
+    def run_in_pipeline_loop(self, coroutine):
+        """Ставит корутину в цикл событий конвейера; возвращает concurrent.futures.Future"""
+        import asyncio
+        return asyncio.run_coroutine_threadsafe(coroutine, self.get_pipeline_loop())
+    
+    def get_parse_pool(self, url_count):
+        """Пул процессов разбора для пакета из url_count ссылок или None (разбор в потоках)"""
+        if self.PARSE_PROCESSES == 0 or url_count < self.PARSE_POOL_MIN_URLS:
+            return None
+        if self.parse_pool is None:
+            from .parsepool import ParsePool
+            try:
+                self.parse_pool = ParsePool(self.PARSE_PROCESSES, self.EXTRACT_ENGINE)
+            except Exception as e:
+                self.log_message(f"Пул процессов разбора недоступен: {e}")
+                self.PARSE_PROCESSES = 0
+                return None
+        return self.parse_pool
+    
+    def on_pipeline_event(self, kind, data):
+        """Отображает прогресс конвейера"""
+        if kind == 'failed':
+            url, error = data
+            if error is not None:
+                self.log_message(f"Ошибка при парсинге {url}: {error}")
+        elif kind == 'committed':
+            count, saved = data
+            if not saved:
+                self.log_message(f"Не удалось записать {count} товаров в таблицу")
+    
+    def offer_resume(self):
+        """Предлагает продолжить пакетные загрузки, прерванные закрытием или сбоем"""
+        if self.is_closing or self.journal is None:
+            return
+        excel_file = os.path.abspath(self.excel_file)
+        for job_id, out, total, remaining in self.journal.unfinished():
+            if out != excel_file:
+                continue
+            if remaining and messagebox.askyesno(
+                    "Пакетная загрузка",
+                    f"Прошлая пакетная загрузка была прервана: осталось {remaining} из {total} ссылок.\n\n"
+                    f"Продолжить?"):
+                # Тот же список ссылок продолжает то же задание журнала
+                self.add_batch(self.journal.job_urls(job_id))
+            else:
+                self.journal.close_job(job_id)
+    
+    async def run_batch_pipeline(self, urls):
+        """Пакетная загрузка через асинхронный конвейер (в потоке цикла событий)"""
+        import asyncio
+        from .pipeline import AsyncPipeline, create_async_fetcher
+        self.ui.call(self.set_buttons, tk.DISABLED, self.add_button, self.batch_button)
+        total = len(urls)
+        done = 0
+        
+        def on_event(kind, data):
+            nonlocal done
+            if kind in ('parsed', 'failed'):
+                done += 1
+                self.update_status(f"Пакетная загрузка: {done} из {total}")
+            elif kind == 'resumed':
+                done = data[0]
+                self.log_message(f"Продолжение прерванной загрузки: обработано {done} из {total}")
+            self.on_pipeline_event(kind, data)
+        
+        commit = self.writer.write
+        job = None
+        try:
+            if self.journal is not None:
+                # Продолжение после сбоя сразу дописывает разобранное - не в цикле событий
+                job, urls, commit, on_event = await asyncio.get_running_loop().run_in_executor(
+                    None, self.journal.start_job, urls, self.excel_file, commit, on_event)
+            
+            self.log_message(f"Пакетная загрузка: {len(urls)} ссылок")
+            async with create_async_fetcher(self.fetcher, self.PIPELINE_CONCURRENCY,
+                                            self.BATCH_PER_HOST) as fetcher:
+                pipeline = AsyncPipeline(fetcher, commit,
+                                         concurrency=self.PIPELINE_CONCURRENCY,
+                                         per_host=self.BATCH_PER_HOST,
+                                         engine=self.EXTRACT_ENGINE,
+                                         parsed=self.parsed_pages,
+                                         on_event=on_event,
+                                         cache=self.page_cache,
+                                         parse_pool=self.get_parse_pool(len(urls)))
+                summary = await pipeline.run(urls)
+            if job is not None and (summary.saved or not summary.records):
+                job.finish()
+            
+            if summary.cached:
+                self.log_message(f"Взято из кэша: {summary.cached} из {summary.total}")
+            if summary.not_modified:
+                self.log_message(f"Без изменений (304): {summary.not_modified}")
+            self.report_batch(summary.total, len(summary.records), summary.failed, summary.saved)
+            
+        except Exception as e:
+            if not self.is_closing:
+                self.ui.call(messagebox.showerror, "Ошибка", f"Произошла ошибка: {e}")
+        finally:
+            # Разблокируем кнопки
+            if not self.is_closing:
+                self.ui.call(self.set_buttons, tk.NORMAL, self.add_button, self.batch_button)
+                self.update_status("Готов к работе")
+    
+    def export_xlsx(self):
+        """Выгружает хранилище в prices.xlsx в отдельном потоке"""
+        if self.is_closing:
+            return
+        self.set_buttons(tk.DISABLED, self.export_button)
+        
+        def export():
+            try:
+                self.update_status("Выгрузка в Excel...")
+                self.workbook.export_xlsx(default_excel_path())
+                self.log_message(f"Таблица выгружена: {os.path.basename(default_excel_path())}")
+            except Exception as e:
+                self.log_message(f"Ошибка выгрузки в Excel: {e}")
+                self.ui.call(messagebox.showerror, "Ошибка", f"Не удалось выгрузить таблицу: {e}")
+            finally:
+                self.ui.call(self.set_buttons, tk.NORMAL, self.export_button)
+                self.update_status("Готов к работе")
+        
+        thread = threading.Thread(target=export)
+        thread.daemon = True
+        thread.start()
+    
+    def toggle_schedule(self):
+        """Включает или выключает автообновление по флажку"""
+        if self.is_closing:
+            return
+        if not self.schedule_var.get():
+            if self.schedule_stop is not None:
+                self.schedule_stop.set()
+                self.log_message("Автообновление выключено")
+            return
+        
+        # Ссылки товаров таблицы и прошлые разборы берутся из кэша страниц
+        if self.page_cache is None:
+            self.schedule_var.set(False)
+            messagebox.showwarning("Автообновление", "Без кэша страниц автообновление недоступно")
+            return
+        if self.schedule is None:
+            from .scheduler import RepriceSchedule
+            try:
+                self.schedule = RepriceSchedule(default_schedule_path(self.excel_file), rate=self.SCHEDULE_RATE)
+            except Exception as e:
+                self.schedule_var.set(False)
+                messagebox.showerror("Автообновление", f"Расписание недоступно: {e}")
+                return
+        self.schedule_stop = threading.Event()
+        self.run_in_pipeline_loop(self.run_scheduled(self.schedule_stop))
+    
+    def tracked_urls(self):
+        """Ссылки из кэша страниц, товары которых есть в таблице (отклоненные при добавлении не отслеживаются)"""
+        from .scheduler import stored_urls
+        return stored_urls(self.workbook, self.page_cache)
+    
+    async def run_scheduled(self, stop):
+        """Автообновление (в потоке цикла событий) до установки stop; запись идет через поток-писатель
+
+        В таблицу пишутся только новые и изменившиеся цены (см. run_schedule).
+        """
+        import asyncio
+        from .pipeline import AsyncPipeline, create_async_fetcher
+        from .scheduler import run_schedule
+        
+        def on_round(summary, counts):
+            if counts['changed'] or counts['failed']:
+                self.log_message(f"Автообновление: проверено {summary.total}, изменилось {counts['changed']}, "
+                                 f"ошибок {counts['failed']}")
+        
+        try:
+            tracked = await asyncio.get_running_loop().run_in_executor(None, self.tracked_urls)
+            self.log_message(f"Автообновление включено: отслеживается ссылок: {len(tracked)}")
+            async with create_async_fetcher(self.fetcher, self.PIPELINE_CONCURRENCY,
+                                            self.BATCH_PER_HOST) as fetcher:
+                # Срок проверки решает расписание: свежесть кэша не учитывается,
+                # страницы запрашиваются условно (304)
+                pipeline = AsyncPipeline(fetcher, self.writer.write,
+                                         concurrency=self.PIPELINE_CONCURRENCY,
+                                         per_host=self.BATCH_PER_HOST,
+                                         engine=self.EXTRACT_ENGINE,
+                                         parsed=self.parsed_pages,
+                                         on_event=self.on_pipeline_event)
+                await run_schedule(self.schedule, pipeline, self.parsed_pages, stop,
+                                   tracked=self.tracked_urls, on_round=on_round, initial=tracked)
+        except Exception as e:
+            if not self.is_closing:
+                self.log_message(f"Автообновление остановлено из-за ошибки: {e}")
+                self.ui.call(self.schedule_var.set, False)
+    
+    def add_batch(self, urls):
+        """Запускает пакетную загрузку: заданием конвейера или в отдельном потоке"""
+        if self.is_closing:
+            return
+            
+        if self.BATCH_ENGINE == 'asyncio':
+            job = self.run_in_pipeline_loop(self.run_batch_pipeline(urls))
+            self.active_jobs = [j for j in self.active_jobs if not j.done()] + [job]
+            return
+            
+        thread = threading.Thread(target=self.add_batch_thread, args=(urls,))
+        thread.daemon = True
+        thread.start()
+
+
+def run():
+    """Запускает оконное приложение"""
+    # Создаем главное окно
+    root = tk.Tk()
+    
+    # Настраиваем стиль (тема vista есть только в Windows)
+    style = ttk.Style()
+    if 'vista' in style.theme_names():
+        style.theme_use('vista')
+    
+    # Создаем приложение
+    app = PriceParserApp(root)
+    
+    try:
+        # Запускаем главный цикл
+        root.mainloop()
+    except Exception as e:
+        print(f"Ошибка в главном цикле: {e}")
+    finally:
+        # Гарантированное завершение
+        os._exit(0)
@@ -0,0 +1,240 @@
+"""История цен в SQLite и столбцы цен по датам в prices.xlsx
+
+Каждое наблюдение (товар, цена, время, ссылка) дописывается в таблицу
+observations, а не только перезаписывает столбец B. Таблица latest хранит
+последнюю и предыдущую цену каждого товара и время последнего изменения:
+по ней за миллисекунды строится выборка "что подорожало или подешевело за
+неделю" даже при миллионах наблюдений.
+
+prices.xlsx из истории не пересобирается: последние цены сливаются в
+существующую таблицу через PriceWorkbook.upsert_many, а столбцы цен по датам
+занимают отдельный блок справа. Строки, столбцы и листы, которых нет в
+истории (например, добавленные окном), остаются на месте.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from .records import cell_price
+from .workbook import (ADDED, CHANGED, DATA_FONT, FIRST_DATA_ROW, HEADER_FONT, HEADERS, UNCHANGED,
+                      PriceWorkbook, UpsertResult, dedupe_records, is_empty, same_price, shared_font)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    product_name TEXT NOT NULL,
+    price TEXT,
+    observed_at REAL NOT NULL,
+    url TEXT
+);
+CREATE INDEX IF NOT EXISTS observations_product_time ON observations (product_name, observed_at);
+CREATE INDEX IF NOT EXISTS observations_time ON observations (observed_at);
+CREATE TABLE IF NOT EXISTS latest (
+    product_name TEXT PRIMARY KEY,
+    price TEXT,
+    previous_price TEXT,
+    url TEXT,
+    observed_at REAL NOT NULL,
+    changed_at REAL
+);
+CREATE INDEX IF NOT EXISTS latest_changed_at ON latest (changed_at);
+"""
+
+WEEK = 7 * 24 * 3600
+
+# Заголовок столбца цен за дату (prices_by_day отдает даты в таком виде)
+DAY_HEADER = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+class PriceChange:
+    """Изменение цены товара"""
+    __slots__ = ('product_name', 'previous_price', 'price', 'changed_at', 'url')
+
+    def __init__(self, product_name, previous_price, price, changed_at, url):
+        self.product_name = product_name
+        self.previous_price = previous_price
+        self.price = price
+        self.changed_at = changed_at
+        self.url = url
+
+
+class PriceHistory:
+    """Хранилище наблюдений цен; безопасно для нескольких потоков"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def __len__(self):
+        """Число товаров"""
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM latest").fetchone()[0]
+
+    def record_many(self, records, observed_at=None):
+        """Дописывает наблюдения (название, цена[, ссылка]); возвращает UpsertResult относительно прошлых цен
+
+        Строки в отчете - None: место товара в prices.xlsx определяет выгрузка.
+        Записи без цены (не найдена на странице) пропускаются: это не наблюдение.
+        """
+        observed_at = observed_at if observed_at is not None else time.time()
+        latest = {}
+        for record in records:
+            product_name, price = record[0], record[1]
+            if price is None:
+                continue
+            # Цена хранится текстом (TEXT), в ячейку выгружается числом
+            price = str(price)
+            latest[product_name] = (price, record[2] if len(record) > 2 else None)
+
+        result = UpsertResult()
+        with self._lock, self._db:
+            known = {}
+            names = list(latest)
+            # Прошлые цены читаются порциями (ограничение числа параметров SQLite)
+            for start in range(0, len(names), 500):
+                chunk = names[start:start + 500]
+                known.update(self._db.execute(
+                    f"SELECT product_name, price FROM latest WHERE product_name IN ({','.join('?' * len(chunk))})",
+                    chunk))
+
+            self._db.executemany(
+                "INSERT INTO observations (product_name, price, observed_at, url) VALUES (?, ?, ?, ?)",
+                ((product_name, price, observed_at, url) for product_name, (price, url) in latest.items()))
+
+            added, changed, unchanged = [], [], []
+            for product_name, (price, url) in latest.items():
+                if product_name not in known:
+                    status, row = ADDED, (product_name, price, url, observed_at)
+                    added.append(row)
+                elif same_price(known[product_name], price):
+                    status, row = UNCHANGED, (url, observed_at, product_name)
+                    unchanged.append(row)
+                else:
+                    status, row = CHANGED, (known[product_name], price, url, observed_at, observed_at, product_name)
+                    changed.append(row)
+                result.record(status, product_name, None)
+
+            self._db.executemany(
+                "INSERT INTO latest (product_name, price, url, observed_at) VALUES (?, ?, ?, ?)", added)
+            self._db.executemany(
+                "UPDATE latest SET url = COALESCE(?, url), observed_at = ? WHERE product_name = ?", unchanged)
+            self._db.executemany(
+                "UPDATE latest SET previous_price = ?, price = ?, url = COALESCE(?, url), "
+                "observed_at = ?, changed_at = ? WHERE product_name = ?", changed)
+        return result
+
+    def import_workbook(self, path):
+        """Переносит в историю товары из существующего prices.xlsx (время - изменения файла)"""
+        import openpyxl
+        wb = openpyxl.load_workbook(path, read_only=True)
+        try:
+            rows = wb.active.iter_rows(min_row=FIRST_DATA_ROW, max_col=2, values_only=True)
+            records = []
+            for row in rows:
+                if not row or is_empty(row[0]):
+                    break
+                records.append((row[0], row[1] if len(row) > 1 else None))
+        finally:
+            wb.close()
+        return self.record_many(dedupe_records(records).items(), observed_at=os.path.getmtime(path))
+
+    def products(self):
+        """Пары (ссылка, название) товаров с известной ссылкой (в порядке появления товаров)"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT url, product_name FROM latest WHERE url IS NOT NULL ORDER BY rowid").fetchall()
+
+    def changed_since(self, since):
+        """Товары, цена которых менялась начиная с since (время Unix), от последних изменений к ранним"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT product_name, previous_price, price, changed_at, url FROM latest "
+                "WHERE changed_at >= ? ORDER BY changed_at DESC", (since,)).fetchall()
+        return [PriceChange(*row) for row in rows]
+
+    def changed_this_week(self):
+        """Товары, цена которых менялась за последние 7 дней"""
+        return self.changed_since(time.time() - WEEK)
+
+    def prices_by_day(self, days):
+        """(последние days дат, {название: {дата: последняя цена за день}}) по локальному времени"""
+        since = time.time() - days * 24 * 3600
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT product_name, date(observed_at, 'unixepoch', 'localtime') AS day, price, "
+                "MAX(observed_at) FROM observations WHERE observed_at >= ? "
+                "GROUP BY product_name, day", (since,)).fetchall()
+        by_product = {}
+        all_days = set()
+        for product_name, day, price, _ in rows:
+            by_product.setdefault(product_name, {})[day] = price
+            all_days.add(day)
+        return sorted(all_days)[-days:], by_product
+
+    def export_xlsx(self, path, pivot_days=0, store=None):
+        """Сливает последние цены в таблицу path (store - ее PriceWorkbook); возвращает UpsertResult
+
+        Товары, которых в таблице нет, дописываются в конец, остальные
+        строки, столбцы и листы не трогаются. pivot_days > 0 обновляет блок
+        столбцов с ценой на каждую из последних pivot_days дат (write_pivot).
+        """
+        store = store or PriceWorkbook(path)
+        store.create_if_not_exists()
+        with self._lock:
+            rows = self._db.execute("SELECT product_name, price FROM latest ORDER BY rowid").fetchall()
+        result = store.upsert_many((product_name, cell_price(price)) for product_name, price in rows)
+        if pivot_days > 0:
+            self.write_pivot(store, pivot_days)
+        return result
+
+    def write_pivot(self, store, days):
+        """Записывает в таблицу store (PriceWorkbook) столбцы цен за последние days дат наблюдений
+
+        Столбцы с датой в заголовке - блок истории: прежний блок очищается, а
+        новый пишется на его место, если он стоит последним, иначе - после
+        последнего заполненного столбца. Цены получают только товары из
+        истории; книга загружается в память (без потокового режима).
+        """
+        dates, by_day = self.prices_by_day(days)
+        with store.lock:
+            ws = store.load()
+            try:
+                headers = [cell.value for cell in next(ws.iter_rows(min_row=1, max_row=1))]
+                last_used = max((column for column, value in enumerate(headers, 1) if not is_empty(value)),
+                                default=len(HEADERS))
+                old = [column for column, value in enumerate(headers, 1)
+                       if column > len(HEADERS) and isinstance(value, str) and DAY_HEADER.match(value)]
+                if old and old == list(range(old[0], last_used + 1)):
+                    start = old[0]
+                else:
+                    start = last_used + 1
+                for column in old:
+                    for (cell,) in ws.iter_rows(min_col=column, max_col=column):
+                        cell.value = None
+
+                header_font = shared_font(HEADER_FONT)
+                data_font = shared_font(DATA_FONT)
+                for offset, day in enumerate(dates):
+                    cell = ws.cell(row=1, column=start + offset, value=day)
+                    cell.font = header_font
+                for product_name, row in store.index.rows.items():
+                    prices = by_day.get(product_name)
+                    if not prices:
+                        continue
+                    for offset, day in enumerate(dates):
+                        if day in prices:
+                            cell = ws.cell(row=row, column=start + offset, value=cell_price(prices[day]))
+                            cell.font = data_font
+            except Exception:
+                store.invalidate()
+                raise
+            store.save()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,259 @@
+"""Журнал заданий пакетной загрузки для продолжения после сбоя
+
+Для каждой ссылки задания в SQLite хранится состояние: pending -> fetched ->
+parsed (с названием, ценой в копейках и валютой) -> committed, или failed. Если программа
+упала или была закрыта посреди загрузки, повторный запуск того же задания
+(тот же файл таблицы и тот же список ссылок) сначала дописывает в таблицу
+уже разобранные, но не записанные товары, а затем загружает только
+оставшиеся ссылки. Запись в таблицу идемпотентна (та же цена - без
+изменений), поэтому повтор уже записанной пачки безопасен.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from .records import PriceRecord, RecordBatch, parse_price
+
+PENDING = 'pending'
+FETCHED = 'fetched'
+PARSED = 'parsed'
+COMMITTED = 'committed'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL,
+    out TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, finished_at);
+CREATE TABLE IF NOT EXISTS job_urls (
+    job_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    state TEXT NOT NULL,
+    product_name TEXT,
+    price INTEGER,
+    currency TEXT,
+    updated_at REAL,
+    PRIMARY KEY (job_id, url)
+);
+CREATE INDEX IF NOT EXISTS job_urls_state ON job_urls (job_id, state, position);
+"""
+
+# Сколько отметок копить в памяти перед записью в журнал
+FLUSH_EVERY = 500
+
+
+def job_key(urls, out):
+    """Отпечаток задания: файл таблицы и список ссылок"""
+    digest = hashlib.sha1(out.encode('utf-8'))
+    for url in urls:
+        digest.update(b'\n' + url.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class Job:
+    """Задание в журнале: отметки состояний ссылок копятся и пишутся пачками"""
+
+    def __init__(self, journal, job_id, total, resumed):
+        self.journal = journal
+        self.id = job_id
+        self.total = total
+        # Задание продолжено после сбоя (а не начато заново)
+        self.resumed = resumed
+        self._lock = threading.Lock()
+        self._marks = []
+
+    def counts(self):
+        """{состояние: число ссылок}"""
+        self.flush()
+        return self.journal._counts(self.id)
+
+    def remaining_urls(self):
+        """Ссылки, которые еще нужно загрузить (в исходном порядке), включая failed"""
+        return self.journal._urls(self.id, (PENDING, FETCHED, FAILED))
+
+    def parsed_batch(self):
+        """RecordBatch разобранных, но не записанных товаров"""
+        batch = RecordBatch()
+        for url, product_name, price, currency in self.journal._parsed(self.id):
+            batch.append(PriceRecord(product_name, price, url, currency))
+        return batch
+
+    def mark(self, url, state, result=(None, None, None)):
+        """Отмечает состояние ссылки; result - (название, копейки, валюта) для parsed"""
+        with self._lock:
+            self._marks.append((state, *result, time.time(), self.id, url))
+            flush = len(self._marks) >= FLUSH_EVERY
+        if flush:
+            self.flush()
+
+    def flush(self):
+        """Записывает накопленные отметки в журнал"""
+        with self._lock:
+            marks, self._marks = self._marks, []
+        if marks:
+            self.journal._update(marks)
+
+    def mark_committed(self, urls):
+        self.flush()
+        now = time.time()
+        self.journal._update([(COMMITTED, None, None, None, now, self.id, url) for url in urls], keep_result=True)
+
+    def finish(self):
+        """Закрывает задание; следующий запуск того же списка начнется заново"""
+        self.flush()
+        self.journal.close_job(self.id)
+
+    def track(self, commit, on_event=None):
+        """Обертки (commit, on_event) для AsyncPipeline, отмечающие состояния ссылок"""
+        def tracked_commit(records):
+            # Разобранное попадает в журнал раньше, чем в таблицу
+            self.flush()
+            saved = commit(records)
+            if saved:
+                self.mark_committed(url for url in records.urls if url)
+            return saved
+
+        def tracked_event(kind, data):
+            if kind == 'fetched':
+                self.mark(data, FETCHED)
+            elif kind == 'parsed':
+                url, result = data
+                self.mark(url, PARSED, result)
+            elif kind == 'failed':
+                self.mark(data[0], FAILED)
+            if on_event is not None:
+                on_event(kind, data)
+
+        return tracked_commit, tracked_event
+
+
+class JobJournal:
+    """Журнал заданий в SQLite; безопасен для нескольких потоков"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+        self._db.executescript(SCHEMA)
+
+    def _migrate(self):
+        """Журнал прежней версии хранил цену текстом: переводит ее в копейки"""
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(job_urls)")]
+        if not columns or 'currency' in columns:
+            return
+        with self._db:
+            self._db.execute("ALTER TABLE job_urls RENAME TO job_urls_text")
+            self._db.execute("DROP INDEX IF EXISTS job_urls_state")
+            # executescript завершил бы транзакцию - схема создается по одной команде
+            for statement in SCHEMA.split(';'):
+                if statement.strip():
+                    self._db.execute(statement)
+            rows = self._db.execute(
+                "SELECT job_id, position, url, state, product_name, price, updated_at FROM job_urls_text")
+            self._db.executemany(
+                "INSERT INTO job_urls (job_id, position, url, state, product_name, price, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(*row[:5], parse_price(row[5]), row[6]) for row in rows])
+            self._db.execute("DROP TABLE job_urls_text")
+
+    def open_job(self, urls, out):
+        """Продолжает незавершенное задание с теми же out и ссылками или начинает новое"""
+        out = os.path.abspath(out)
+        key = job_key(urls, out)
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT id, total FROM jobs WHERE key = ? AND finished_at IS NULL ORDER BY id DESC LIMIT 1",
+                (key,)).fetchone()
+            if row is not None:
+                return Job(self, row[0], row[1], resumed=True)
+            job_id = self._db.execute(
+                "INSERT INTO jobs (key, out, total, created_at) VALUES (?, ?, ?, ?)",
+                (key, out, len(urls), time.time())).lastrowid
+            self._db.executemany(
+                "INSERT OR IGNORE INTO job_urls (job_id, position, url, state) VALUES (?, ?, ?, ?)",
+                ((job_id, position, url, PENDING) for position, url in enumerate(urls)))
+        return Job(self, job_id, len(urls), resumed=False)
+
+    def start_job(self, urls, out, commit, on_event=None):
+        """Открывает задание и оборачивает commit/on_event; возвращает (job, ссылки для загрузки, commit, on_event)
+
+        Если задание продолжено после сбоя, разобранное до сбоя сразу
+        дописывается через commit, в загрузку идут только оставшиеся ссылки,
+        а on_event получает ('resumed', (обработано, всего)). Блокирует поток
+        (запись и журнал), из цикла событий вызывается через run_in_executor.
+        """
+        job = self.open_job(urls, out)
+        commit, on_event = job.track(commit, on_event)
+        if job.resumed:
+            # Разобранное до сбоя дописывается повторно: запись идемпотентна
+            replay = job.parsed_batch()
+            if replay:
+                commit(replay)
+            urls = job.remaining_urls()
+            on_event('resumed', (job.total - len(urls), job.total))
+        return job, urls, commit, on_event
+
+    def unfinished(self):
+        """[(id задания, файл таблицы, всего ссылок, осталось ссылок)] незавершенных заданий"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT jobs.id, jobs.out, jobs.total, "
+                "(SELECT COUNT(*) FROM job_urls WHERE job_id = jobs.id AND state != ?) "
+                "FROM jobs WHERE finished_at IS NULL ORDER BY jobs.id", (COMMITTED,)).fetchall()
+
+    def job_urls(self, job_id):
+        """Все ссылки задания в исходном порядке (чтобы запустить его снова)"""
+        with self._lock:
+            return [url for (url,) in self._db.execute(
+                "SELECT url FROM job_urls WHERE job_id = ? ORDER BY position", (job_id,))]
+
+    def _urls(self, job_id, states):
+        with self._lock:
+            return [url for (url,) in self._db.execute(
+                f"SELECT url FROM job_urls WHERE job_id = ? AND state IN ({','.join('?' * len(states))}) "
+                "ORDER BY position", (job_id, *states))]
+
+    def _parsed(self, job_id):
+        with self._lock:
+            return self._db.execute(
+                "SELECT url, product_name, price, currency FROM job_urls WHERE job_id = ? AND state = ? "
+                "ORDER BY position", (job_id, PARSED)).fetchall()
+
+    def _counts(self, job_id):
+        with self._lock:
+            return dict(self._db.execute(
+                "SELECT state, COUNT(*) FROM job_urls WHERE job_id = ? GROUP BY state", (job_id,)))
+
+    def _update(self, marks, keep_result=False):
+        with self._lock, self._db:
+            if keep_result:
+                self._db.executemany(
+                    "UPDATE job_urls SET state = ?, product_name = COALESCE(?, product_name), "
+                    "price = COALESCE(?, price), currency = COALESCE(?, currency), updated_at = ? "
+                    "WHERE job_id = ? AND url = ?", marks)
+            else:
+                self._db.executemany(
+                    "UPDATE job_urls SET state = ?, product_name = ?, price = ?, currency = ?, updated_at = ? "
+                    "WHERE job_id = ? AND url = ?", marks)
+
+    def close_job(self, job_id):
+        """Закрывает задание (завершенное или то, которое решили не продолжать)"""
+        with self._lock, self._db:
+            self._db.execute("UPDATE jobs SET finished_at = ? WHERE id = ?", (time.time(), job_id))
+            # Состояния ссылок завершенного задания больше не нужны
+            self._db.execute("DELETE FROM job_urls WHERE job_id = ?", (job_id,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,219 @@
+"""Межпроцессная блокировка файлов, атомарная запись и журнал отложенных изменений
+
+Несколько процессов (или окно и консольный режим) могут писать в один
+prices.xlsx. Протокол записи:
+    1. взять блокировку: на файл prices.xlsx.lock ставится блокировка ОС
+       (fcntl.flock, на Windows - msvcrt.locking), в него пишутся pid, хост
+       и время; если он занят, ждать до timeout;
+    2. перечитать книгу, если ее изменил другой процесс, и внести пачку;
+    3. сохранить во временный файл рядом и атомарно заменить им prices.xlsx;
+    4. снять блокировку (файл prices.xlsx.lock остается на месте).
+Блокировку ОС снимает сама система, когда процесс завершается любым путем
+(сбой, os._exit при закрытии окна), поэтому брошенных блокировок не бывает и
+ждать их устаревания не нужно.
+
+Если блокировку не удалось получить за timeout, пачку можно не терять, а
+дописать в журнал изменений (ChangeLog): следующий писатель, получивший
+блокировку, сначала применит накопленные изменения, затем свою пачку.
+"""
+import json
+import os
+import socket
+import stat
+import tempfile
+import threading
+import time
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+LOCK_SUFFIX = '.lock'
+CHANGES_SUFFIX = '.changes.jsonl'
+
+# Сколько ждать блокировку по умолчанию (с)
+DEFAULT_TIMEOUT = 30.0
+POLL_INTERVAL = 0.05
+
+# На Windows блокируется один байт с этим смещением: заблокированный участок
+# нельзя прочитать, а сведения о владельце лежат в начале файла
+LOCK_BYTE = 1 << 20
+
+
+class LockTimeout(TimeoutError):
+    """Блокировку файла не удалось получить за отведенное время"""
+
+    def __init__(self, path, holder=None):
+        self.path = path
+        self.holder = holder
+        detail = ""
+        if holder:
+            detail = f" (процесс {holder.get('pid')} на {holder.get('host')})"
+        super().__init__(f"Файл {os.path.basename(path)} занят другим процессом{detail}")
+
+
+def _try_lock(fd):
+    """Ставит блокировку ОС на открытый файл fd без ожидания; False - ее держит другой"""
+    try:
+        if os.name == 'nt':
+            os.lseek(fd, LOCK_BYTE, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def _unlock(fd):
+    if os.name == 'nt':
+        os.lseek(fd, LOCK_BYTE, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+class FileLock:
+    """Блокировка path через блокировку ОС на файле path.lock; повторно входима в одном потоке"""
+
+    def __init__(self, path, timeout=DEFAULT_TIMEOUT):
+        self.path = path
+        self.lock_path = path + LOCK_SUFFIX
+        self.timeout = timeout
+        self._fd = None
+        self._owner = None
+        self._depth = 0
+        self._guard = threading.Lock()
+
+    def holder(self):
+        """Сведения о текущем владельце блокировки или None"""
+        try:
+            with open(self.lock_path, encoding='utf-8') as f:
+                return json.loads(f.read() or 'null')
+        except (OSError, ValueError):
+            return None
+
+    def acquire(self, timeout=None):
+        me = threading.get_ident()
+        with self._guard:
+            if self._owner == me:
+                self._depth += 1
+                return
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT)
+        try:
+            while not _try_lock(fd):
+                if time.monotonic() >= deadline:
+                    raise LockTimeout(self.path, self.holder())
+                time.sleep(POLL_INTERVAL)
+            # Сведения о владельце - для сообщения тем, кто ждет блокировку
+            os.ftruncate(fd, 0)
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.write(fd, json.dumps({'pid': os.getpid(), 'host': socket.gethostname(),
+                                     'acquired_at': time.time()}).encode('utf-8'))
+        except BaseException:
+            os.close(fd)
+            raise
+        with self._guard:
+            self._fd = fd
+            self._owner = me
+            self._depth = 1
+
+    def release(self):
+        with self._guard:
+            self._depth -= 1
+            if self._depth > 0:
+                return
+            self._owner = None
+            fd, self._fd = self._fd, None
+        try:
+            os.ftruncate(fd, 0)
+            _unlock(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def atomic_save(save, path):
+    """Вызывает save(временный путь) и атомарно заменяет path записанным файлом
+
+    Временный файл создается в той же папке (os.replace работает только в
+    пределах одного диска) и получает права заменяемого файла.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    base, extension = os.path.splitext(os.path.basename(path))
+    fd, tmp_path = tempfile.mkstemp(suffix=extension, prefix=f'.{base}-', dir=directory)
+    os.close(fd)
+    try:
+        save(tmp_path)
+        copy_mode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def copy_mode(source, target):
+    """Права source (или обычные права нового файла) для target: mkstemp создает файл только для владельца"""
+    try:
+        mode = stat.S_IMODE(os.stat(source).st_mode)
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    os.chmod(target, mode)
+
+
+class ChangeLog:
+    """Журнал отложенных пачек (название, цена) рядом с файлом: path.changes.jsonl"""
+
+    def __init__(self, path, timeout=DEFAULT_TIMEOUT):
+        self.path = path + CHANGES_SUFFIX
+        # Журнал защищен своей короткой блокировкой, не блокировкой книги
+        self._lock = FileLock(self.path, timeout=timeout)
+
+    def __bool__(self):
+        return os.path.exists(self.path)
+
+    def append(self, records):
+        """Дописывает пачку одной строкой JSON"""
+        line = json.dumps([[product_name, price] for product_name, price in records],
+                          ensure_ascii=False, default=str)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def drain(self):
+        """Забирает все отложенные записи (в порядке добавления) и очищает журнал
+
+        Если запись сорвется, вызывающий код возвращает их через append.
+        """
+        if not self:
+            return []
+        with self._lock:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    lines = f.readlines()
+            except FileNotFoundError:
+                return []
+            os.remove(self.path)
+        records = []
+        for line in lines:
+            try:
+                records.extend(tuple(record) for record in json.loads(line))
+            except ValueError:
+                # Оборванная строка (сбой посреди записи) пропускается
+                continue
+        return records
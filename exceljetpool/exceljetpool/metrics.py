@@ -0,0 +1,130 @@
+"""Таймеры стадий и счетчики горячего пути
+
+    from exceljetpool.metrics import METRICS
+    with METRICS.timer('save'):
+        wb.save(path)
+    METRICS.add('cells_written', 2)
+
+timer() работает и как декоратор. Накопленные значения выгружаются
+JSON-строками или в текстовом формате Prometheus (METRICS.write);
+profile() записывает профиль cProfile одного прогона.
+"""
+import cProfile
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Префикс имен метрик в формате Prometheus
+PREFIX = 'exceljetpool'
+
+
+class StageTimer:
+    """Сводка по одной стадии: число вызовов, суммарное и наибольшее время"""
+    __slots__ = ('count', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+class Metrics:
+    """Потокобезопасный набор счетчиков и таймеров стадий"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.stages = {}
+
+    def add(self, name, value=1):
+        """Увеличивает счетчик name на value"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, stage, seconds):
+        """Учитывает одно выполнение стадии длительностью seconds"""
+        with self._lock:
+            timer = self.stages.get(stage)
+            if timer is None:
+                timer = self.stages[stage] = StageTimer()
+            timer.count += 1
+            timer.total += seconds
+            timer.max = max(timer.max, seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        """Замеряет время блока (или функции, если используется как декоратор)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def snapshot(self):
+        """{'counters': {имя: значение}, 'stages': {стадия: {'count', 'sum', 'max'}}}"""
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'stages': {stage: {'count': timer.count, 'sum': timer.total, 'max': timer.max}
+                           for stage, timer in self.stages.items()},
+            }
+
+    def reset(self):
+        """Обнуляет все счетчики и таймеры"""
+        with self._lock:
+            self.counters.clear()
+            self.stages.clear()
+
+    def to_json_lines(self):
+        """Снимок в виде JSON-строк: по одной на стадию и на счетчик"""
+        snapshot = self.snapshot()
+        now = time.time()
+        lines = [json.dumps({'time': now, 'stage': stage, **values})
+                 for stage, values in sorted(snapshot['stages'].items())]
+        lines += [json.dumps({'time': now, 'counter': name, 'value': value})
+                  for name, value in sorted(snapshot['counters'].items())]
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def to_prometheus(self):
+        """Снимок в текстовом формате Prometheus"""
+        snapshot = self.snapshot()
+        stages = sorted(snapshot['stages'].items())
+        lines = []
+        if stages:
+            lines.append(f'# TYPE {PREFIX}_stage_seconds summary')
+            for stage, values in stages:
+                lines.append(f'{PREFIX}_stage_seconds_sum{{stage="{stage}"}} {values["sum"]:.6f}')
+                lines.append(f'{PREFIX}_stage_seconds_count{{stage="{stage}"}} {values["count"]}')
+            lines.append(f'# TYPE {PREFIX}_stage_seconds_max gauge')
+            for stage, values in stages:
+                lines.append(f'{PREFIX}_stage_seconds_max{{stage="{stage}"}} {values["max"]:.6f}')
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'# TYPE {PREFIX}_{name}_total counter')
+            lines.append(f'{PREFIX}_{name}_total {value}')
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def write(self, path):
+        """Выгружает снимок: *.prom перезаписывается в формате Prometheus, иначе дописываются JSON-строки"""
+        if path.endswith('.prom'):
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self.to_prometheus())
+        else:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(self.to_json_lines())
+
+
+# Общий набор метрик процесса
+METRICS = Metrics()
+
+
+@contextmanager
+def profile(path):
+    """Профилирует блок через cProfile и сохраняет статистику в path (для pstats/snakeviz)"""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
@@ -0,0 +1,103 @@
+"""Разбор HTML в пуле процессов
+
+Извлечение данных (особенно запасной разбор через BeautifulSoup) нагружает
+процессор, а потоки из-за GIL выполняют его на одном ядре. ParsePool
+передает тело страницы в один из workers процессов и получает обратно
+только (название, копейки, валюта).
+
+Тело страницы не сериализуется через канал: пул заранее создает слоты
+общей памяти (SharedMemory), страница копируется в свободный слот, а
+процесс читает ее оттуда по имени слота. Страницы больше slot_size
+передаются обычным образом.
+
+Процессы загружают те же правила сайтов (sites.json), что и программа, один
+раз при старте.
+"""
+import asyncio
+import os
+import queue
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+from .sites import SITES, configure as configure_sites, extract_page
+
+# Размер слота общей памяти; страница товара обычно в разы меньше
+SLOT_SIZE = 1024 * 1024
+
+# Слоты общей памяти, открытые в процессе-обработчике (имя -> SharedMemory)
+_attached = {}
+
+
+def _attach(name):
+    """Открывает слот в процессе-обработчике (один раз на процесс)
+
+    Обработчики делят resource_tracker с создавшим слоты процессом, поэтому
+    повторная регистрация слота безвредна, а удаляет его только ParsePool.close.
+    """
+    shm = _attached.get(name)
+    if shm is None:
+        shm = _attached[name] = shared_memory.SharedMemory(name=name)
+    return shm
+
+
+def _extract_slot(name, size, engine, url):
+    content = bytes(_attach(name).buf[:size])
+    return extract_page(content, url, engine)
+
+
+def default_workers():
+    """Число процессов по умолчанию: все ядра, кроме одного (оно занято загрузкой)"""
+    return max((os.cpu_count() or 1) - 1, 1)
+
+
+class ParsePool:
+    """Пул процессов, возвращающий (название, копейки, валюта) страницы, как extract_page"""
+
+    def __init__(self, workers=None, engine='stream', slot_size=SLOT_SIZE):
+        self.workers = workers or default_workers()
+        self.engine = engine
+        self.slot_size = slot_size
+        # Правила сайтов компилируются в каждом процессе один раз
+        if SITES.path:
+            self._executor = ProcessPoolExecutor(self.workers, initializer=configure_sites, initargs=(SITES.path,))
+        else:
+            self._executor = ProcessPoolExecutor(self.workers)
+        # По два слота на процесс: пока один разбирается, следующий уже заполняется
+        self.slots = [shared_memory.SharedMemory(create=True, size=slot_size)
+                      for _ in range(self.workers * 2)]
+        self._free = queue.Queue()
+        for slot in self.slots:
+            self._free.put(slot)
+        # Потоки, которые заполняют слоты и ждут результата для asyncio
+        self._feeders = ThreadPoolExecutor(len(self.slots), thread_name_prefix='parse-feeder')
+
+    def extract(self, content, engine=None, url=None):
+        """Разбирает страницу в одном из процессов; блокирует поток до результата"""
+        engine = engine or self.engine
+        if len(content) > self.slot_size:
+            return self._executor.submit(extract_page, content, url, engine).result()
+        slot = self._free.get()
+        try:
+            slot.buf[:len(content)] = content
+            return self._executor.submit(_extract_slot, slot.name, len(content), engine, url).result()
+        finally:
+            self._free.put(slot)
+
+    async def extract_async(self, content, engine=None, url=None):
+        """То же для asyncio: ожидание не занимает общий пул потоков цикла"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._feeders, self.extract, content, engine, url)
+
+    def close(self):
+        """Останавливает процессы и освобождает общую память"""
+        self._feeders.shutdown()
+        self._executor.shutdown()
+        for slot in self.slots:
+            slot.close()
+            slot.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,305 @@
+"""Асинхронный конвейер пакетной загрузки: загрузка -> разбор -> запись
+
+Стадии связаны ограниченными очередями asyncio, поэтому быстрая стадия
+ждет медленную, а не копит данные в памяти. Сотни страниц могут
+загружаться одновременно в одном потоке с циклом событий; разбор HTML
+выполняется в пуле потоков, запись в таблицу - единственным писателем.
+"""
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+from .fetcher import RETRY_STATUSES, USER_AGENT, FetchResult
+from .metrics import METRICS
+from .records import PriceRecord, RecordBatch
+from .sites import extract_page
+
+# Модуль aiohttp, False - не установлен, None - еще не импортирован
+_aiohttp = None
+
+
+def load_aiohttp():
+    """aiohttp или None, если он не установлен
+
+    Импорт (~0,15 с) выполняется при первой пакетной загрузке, а не при
+    запуске программы; без aiohttp страницы загружаются PageFetcher в пуле
+    потоков.
+    """
+    global _aiohttp
+    if _aiohttp is None:
+        try:
+            import aiohttp
+        except ImportError:
+            aiohttp = False
+        _aiohttp = aiohttp
+    return _aiohttp or None
+
+
+class AsyncPageFetcher:
+    """Асинхронный аналог PageFetcher на aiohttp: общий пул, повторы, условные запросы"""
+
+    def __init__(self, limit=100, per_host=8, retries=3, backoff=0.5, timeout=10, validators=None):
+        self.limit = limit
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        # Ссылка -> (ETag, Last-Modified), общий формат с PageFetcher
+        self.validators = validators if validators is not None else {}
+        self.session = None
+
+    async def __aenter__(self):
+        aiohttp = load_aiohttp()
+        connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.per_host)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={'User-Agent': USER_AGENT},
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    def _retry_delay(self, attempt, retry_after=None):
+        if retry_after and retry_after.isdigit():
+            return int(retry_after)
+        return self.backoff * (2 ** attempt)
+
+    async def fetch(self, url, conditional=True):
+        """Загружает страницу; при conditional=True отправляет сохраненные валидаторы"""
+        etag, last_modified = self.validators.get(url, (None, None)) if conditional else (None, None)
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        attempt = 0
+        while True:
+            try:
+                start = time.perf_counter()
+                async with self.session.get(url, headers=headers) as response:
+                    METRICS.add('requests')
+                    METRICS.observe('fetch_wait', time.perf_counter() - start)
+                    if response.status in RETRY_STATUSES and attempt < self.retries:
+                        delay = self._retry_delay(attempt, response.headers.get('Retry-After'))
+                    elif response.status == 304:
+                        METRICS.add('not_modified')
+                        METRICS.observe('fetch', time.perf_counter() - start)
+                        return FetchResult(url, 304, etag=etag, last_modified=last_modified)
+                    else:
+                        response.raise_for_status()
+                        content = await response.read()
+                        METRICS.add('bytes_fetched', len(content))
+                        METRICS.observe('fetch', time.perf_counter() - start)
+                        new_etag = response.headers.get('ETag')
+                        new_last_modified = response.headers.get('Last-Modified')
+                        if new_etag or new_last_modified:
+                            self.validators[url] = (new_etag, new_last_modified)
+                        else:
+                            self.validators.pop(url, None)
+                        return FetchResult(url, response.status, content, new_etag, new_last_modified)
+            except (load_aiohttp().ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= self.retries:
+                    raise
+                delay = self._retry_delay(attempt)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+
+class ThreadedPageFetcher:
+    """Запасной вариант без aiohttp: синхронный PageFetcher в пуле потоков цикла"""
+
+    def __init__(self, fetcher):
+        self.fetcher = fetcher
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def fetch(self, url, conditional=True):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.fetcher.fetch, url, conditional)
+
+
+def create_async_fetcher(sync_fetcher, limit=100, per_host=8):
+    """AsyncPageFetcher на aiohttp, если он установлен, иначе обертка над PageFetcher"""
+    if load_aiohttp() is None:
+        return ThreadedPageFetcher(sync_fetcher)
+    return AsyncPageFetcher(limit=limit, per_host=per_host, validators=sync_fetcher.validators)
+
+
+class PipelineSummary:
+    """Итоги прогона конвейера"""
+    __slots__ = ('total', 'fetched', 'not_modified', 'cached', 'records', 'failed', 'saved', 'diff', 'resumed')
+
+    def __init__(self, total):
+        self.total = total
+        self.fetched = 0
+        self.not_modified = 0
+        self.cached = 0
+        # Название -> цена для ячейки
+        self.records = {}
+        self.failed = []
+        self.saved = True
+        # Отчет писателя (UpsertResult), если его заполняет вызывающий код
+        self.diff = None
+        # Сколько ссылок было обработано до сбоя (при продолжении задания из журнала)
+        self.resumed = 0
+
+
+class AsyncPipeline:
+    """Конвейер fetch -> parse -> единственный писатель с обратным давлением
+
+    commit(records) - блокирующая функция записи RecordBatch (итерируется как
+    пары (название, цена)); вызывается в пуле потоков каждые commit_every
+    записей (None - один раз в
+    конце). on_event(kind, data) получает события прогресса: 'fetched',
+    'parsed', 'failed', 'committed'. cache - PageCache: свежие ссылки идут
+    сразу писателю; force=True обходит кэш и условные запросы. parse_pool -
+    ParsePool: разбор идет в его процессах, а не в пуле потоков цикла.
+    """
+
+    def __init__(self, fetcher, commit, concurrency=100, per_host=8, parse_workers=4,
+                 engine='stream', parsed=None, commit_every=None, on_event=None,
+                 cache=None, force=False, parse_pool=None):
+        self.fetcher = fetcher
+        self.commit = commit
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.parse_pool = parse_pool
+        # Каждому слоту общей памяти пула - свой разборщик
+        self.parse_workers = max(parse_workers, len(parse_pool.slots)) if parse_pool else parse_workers
+        self.engine = engine
+        # Ссылка -> (название, копейки, валюта) прошлого разбора, для ответов 304
+        if parsed is None:
+            parsed = cache.results if cache is not None else {}
+        self.parsed = parsed
+        self.cache = cache
+        self.force = force
+        self.commit_every = commit_every
+        self.on_event = on_event or (lambda kind, data: None)
+        self._host_limits = {}
+
+    def _host_limit(self, url):
+        host = urlsplit(url).netloc.lower()
+        semaphore = self._host_limits.get(host)
+        if semaphore is None:
+            semaphore = self._host_limits[host] = asyncio.Semaphore(self.per_host)
+        return semaphore
+
+    async def run(self, urls):
+        """Прогоняет список ссылок через конвейер и возвращает PipelineSummary"""
+        summary = PipelineSummary(len(urls))
+        fetch_queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        parse_queue = asyncio.Queue(maxsize=self.concurrency)
+        write_queue = asyncio.Queue(maxsize=self.concurrency)
+
+        async def produce():
+            for url in urls:
+                await fetch_queue.put(url)
+            for _ in range(self.concurrency):
+                await fetch_queue.put(None)
+
+        async def fetch_worker():
+            while True:
+                url = await fetch_queue.get()
+                if url is None:
+                    return
+                try:
+                    if self.cache is not None and not self.force:
+                        fresh = self.cache.fresh(url)
+                        if fresh is not None:
+                            summary.cached += 1
+                            METRICS.add('cache_hits')
+                            self.on_event('parsed', (url, fresh))
+                            await write_queue.put((url, fresh))
+                            continue
+                    async with self._host_limit(url):
+                        page = await self.fetcher.fetch(url, conditional=not self.force)
+                        if page.not_modified:
+                            if url in self.parsed:
+                                summary.not_modified += 1
+                                result = self.parsed[url]
+                                # Сайт подтвердил, что запись актуальна
+                                self.parsed[url] = result
+                                self.on_event('parsed', (url, result))
+                                await write_queue.put((url, result))
+                                continue
+                            page = await self.fetcher.fetch(url, conditional=False)
+                    summary.fetched += 1
+                    self.on_event('fetched', url)
+                    await parse_queue.put((url, page.content))
+                except Exception as e:
+                    summary.failed.append(url)
+                    self.on_event('failed', (url, e))
+
+        async def parse_worker():
+            loop = asyncio.get_running_loop()
+            while True:
+                item = await parse_queue.get()
+                if item is None:
+                    return
+                url, content = item
+                try:
+                    if self.parse_pool is not None:
+                        result = await self.parse_pool.extract_async(content, self.engine, url)
+                    else:
+                        result = await loop.run_in_executor(None, extract_page, content, url, self.engine)
+                except Exception as e:
+                    summary.failed.append(url)
+                    self.on_event('failed', (url, e))
+                    continue
+                if not result[0]:
+                    summary.failed.append(url)
+                    self.on_event('failed', (url, None))
+                    continue
+                self.parsed[url] = result
+                self.on_event('parsed', (url, result))
+                await write_queue.put((url, result))
+
+        async def write_worker():
+            loop = asyncio.get_running_loop()
+            pending = RecordBatch()
+
+            async def flush():
+                nonlocal pending
+                records, pending = pending, RecordBatch()
+                saved = await loop.run_in_executor(None, self.commit, records)
+                summary.saved = summary.saved and bool(saved)
+                self.on_event('committed', (len(records), saved))
+
+            while True:
+                item = await write_queue.get()
+                if item is None:
+                    break
+                url, result = item
+                # Цена уже разобрана (extract_page); ненайденная записывается нулем
+                record = PriceRecord.from_result(url, result)
+                pending.append(record)
+                summary.records[record.product_name] = record.value
+                if self.commit_every and len(pending) >= self.commit_every:
+                    await flush()
+            if pending:
+                await flush()
+
+        async def close_after(workers, queue, count):
+            await asyncio.gather(*workers)
+            for _ in range(count):
+                await queue.put(None)
+
+        fetchers = [asyncio.create_task(fetch_worker()) for _ in range(self.concurrency)]
+        parsers = [asyncio.create_task(parse_worker()) for _ in range(self.parse_workers)]
+        writer = asyncio.create_task(write_worker())
+        await asyncio.gather(
+            produce(),
+            close_after(fetchers, parse_queue, self.parse_workers),
+            close_after(parsers, write_queue, 1),
+            writer,
+        )
+        if not summary.records:
+            summary.saved = False
+        return summary
@@ -0,0 +1,225 @@
+"""Типизированные записи о товарах: цена в копейках, ссылка, валюта, время загрузки
+
+Цена разбирается один раз при извлечении (page_result) и дальше хранится
+целым числом копеек - в том числе в кэше страниц и журнале заданий; в
+таблицу она пишется числом (cell_price), а не текстом. RecordBatch хранит пачку записей по столбцам (цены и время - в
+массивах array) и схлопывает повторы названий при добавлении.
+"""
+import re
+import time
+from array import array
+from decimal import Decimal, InvalidOperation
+
+# Разделители разрядов: любые пробелы (в том числе неразрывные) и апостроф;
+# запятая и точка - см. normalize_number
+THOUSANDS_SEPARATORS = re.compile(r"[\s']")
+PRICE_PATTERN = re.compile(r'-?\d[\d.,]*')
+
+# Код валюты ISO 4217 ("RUB", "USD")
+CURRENCY_PATTERN = re.compile(r'^[A-Z]{3}$')
+
+# Значение столбца цен RecordBatch для ненайденной цены
+NO_PRICE = -2 ** 63
+
+
+def _grouped(text, separator):
+    """Разбито ли число text на разряды separator: "1,299", "12.345.678" (первая группа не 0)"""
+    groups = text.split(separator)
+    return (len(groups) > 1 and 1 <= len(groups[0]) <= 3 and groups[0] != '0'
+            and all(len(group) == 3 for group in groups[1:]))
+
+
+def normalize_number(text):
+    """Число с запятой/точкой ("1,299.00", "1.299,00", "1,299", "150,5") в виде "1299.00"; None - неоднозначно
+
+    Из двух знаков десятичный - последний, другой разделяет разряды. Один
+    знак разделяет разряды, если он повторяется или после него ровно три
+    цифры ("1.299" - 1299, но "0.125" и "1299.000" - дробные).
+    """
+    text = text.rstrip('.,')
+    if ',' in text and '.' in text:
+        decimal = ',' if text.rfind(',') > text.rfind('.') else '.'
+        thousands = '.' if decimal == ',' else ','
+        integer, _, fraction = text.rpartition(decimal)
+        if decimal in integer or not _grouped(integer, thousands):
+            return None
+        return integer.replace(thousands, '') + '.' + fraction
+    separator = ',' if ',' in text else '.' if '.' in text else None
+    if separator is None:
+        return text
+    if _grouped(text, separator):
+        return text.replace(separator, '')
+    if text.count(separator) > 1:
+        return None
+    return text.replace(separator, '.')
+
+
+def parse_price(value):
+    """Цена в копейках (int) из текста вида "32 990", "1234,50 руб.", "$1,299" или числа; None - не цена"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value * 100
+    if isinstance(value, (float, Decimal)):
+        return int((Decimal(str(value)) * 100).to_integral_value())
+    match = PRICE_PATTERN.search(THOUSANDS_SEPARATORS.sub('', str(value)))
+    if match is None:
+        return None
+    number = normalize_number(match.group())
+    if number is None:
+        return None
+    try:
+        return int((Decimal(number) * 100).to_integral_value())
+    except InvalidOperation:
+        return None
+
+
+def price_value(kopecks):
+    """Число для ячейки: целые рубли - int, иначе Decimal с копейками"""
+    if kopecks is None:
+        return None
+    if kopecks % 100 == 0:
+        return kopecks // 100
+    return Decimal(kopecks) / 100
+
+
+def cell_price(price):
+    """Цена для записи в ячейку: текст с числом становится числом, остальное не меняется"""
+    if isinstance(price, str):
+        kopecks = parse_price(price)
+        return price_value(kopecks) if kopecks is not None else price
+    return price
+
+
+def normalize_currency(text):
+    """Код валюты из разметки ("rub" -> "RUB"); None - не найден или не код ISO 4217"""
+    if text is None:
+        return None
+    text = text.strip().upper()
+    return text if CURRENCY_PATTERN.match(text) else None
+
+
+def page_result(product_name, price_text, currency=None):
+    """Результат разбора страницы: (название, копейки или None, валюта или None)
+
+    Текст цены разбирается здесь, один раз; в таком виде результат хранят
+    кэш страниц, журнал заданий и словари прошлых разборов.
+    """
+    return product_name, parse_price(price_text), normalize_currency(currency)
+
+
+def format_price(kopecks):
+    """Цена для сообщений: "32 990" или "1 234,50" """
+    if kopecks is None:
+        return "-"
+    rubles, rest = divmod(abs(kopecks), 100)
+    text = f"{rubles:,}".replace(',', ' ')
+    if rest:
+        text += f",{rest:02d}"
+    return ("-" if kopecks < 0 else "") + text
+
+
+class PriceRecord:
+    """Цена товара, полученная со страницы"""
+    __slots__ = ('product_name', 'price', 'url', 'currency', 'fetched_at')
+
+    def __init__(self, product_name, price, url=None, currency=None, fetched_at=None):
+        self.product_name = product_name
+        # Копейки или None, если цена не найдена
+        self.price = price
+        self.url = url
+        # Код валюты со страницы или None, если сайт ее не указал
+        self.currency = currency
+        self.fetched_at = fetched_at if fetched_at is not None else time.time()
+
+    @classmethod
+    def from_result(cls, url, result, fetched_at=None):
+        """Запись из результата разбора (название, копейки, валюта) - см. page_result"""
+        product_name, price, currency = result
+        return cls(product_name, price, url, currency, fetched_at)
+
+    @property
+    def result(self):
+        """(название, копейки, валюта) - в таком виде запись хранят кэш и журнал"""
+        return self.product_name, self.price, self.currency
+
+    @property
+    def value(self):
+        """Цена для ячейки; ненайденная цена записывается нулем, как и прежде"""
+        return price_value(self.price) if self.price is not None else 0
+
+    @property
+    def price_text(self):
+        """Цена для сообщений с валютой: "32 990 RUB" """
+        text = format_price(self.price)
+        return f"{text} {self.currency}" if self.currency and self.price is not None else text
+
+    def __repr__(self):
+        return f"PriceRecord({self.product_name!r}, {self.price_text})"
+
+
+class RecordBatch:
+    """Пачка записей по столбцам; повтор названия заменяет цену, сохраняя место первого появления
+
+    Итерация дает пары (название, цена для ячейки) - в таком виде пачку
+    принимают upsert_many и остальные функции записи.
+    """
+    __slots__ = ('names', 'prices', 'urls', 'currencies', 'fetched_at', '_positions')
+
+    def __init__(self, records=()):
+        self.names = []
+        self.prices = array('q')
+        self.urls = []
+        self.currencies = []
+        self.fetched_at = array('d')
+        self._positions = {}
+        for record in records:
+            self.append(record)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __bool__(self):
+        return bool(self.names)
+
+    def append(self, record):
+        price = record.price if record.price is not None else NO_PRICE
+        position = self._positions.get(record.product_name)
+        if position is None:
+            self._positions[record.product_name] = len(self.names)
+            self.names.append(record.product_name)
+            self.prices.append(price)
+            self.urls.append(record.url)
+            self.currencies.append(record.currency)
+            self.fetched_at.append(record.fetched_at)
+        else:
+            self.prices[position] = price
+            self.urls[position] = record.url
+            self.currencies[position] = record.currency
+            self.fetched_at[position] = record.fetched_at
+
+    def __getitem__(self, position):
+        price = self.prices[position]
+        return PriceRecord(self.names[position], price if price != NO_PRICE else None,
+                           self.urls[position], self.currencies[position], self.fetched_at[position])
+
+    def records(self):
+        """Записи PriceRecord в порядке первого появления"""
+        return (self[position] for position in range(len(self)))
+
+    def __iter__(self):
+        for name, price in zip(self.names, self.prices):
+            yield name, price_value(price) if price != NO_PRICE else 0
+
+    def price_of(self, product_name):
+        """Цена товара в копейках или None"""
+        position = self._positions.get(product_name)
+        if position is None or self.prices[position] == NO_PRICE:
+            return None
+        return self.prices[position]
+
+    def sorted(self, by='name', reverse=False):
+        """Новая пачка, упорядоченная по названию ('name') или цене ('price')"""
+        column = self.names if by == 'name' else self.prices
+        order = sorted(range(len(self)), key=column.__getitem__, reverse=reverse)
+        return RecordBatch(self[position] for position in order)
@@ -0,0 +1,318 @@
+"""Фоновое обновление цен по расписанию
+
+Вместо полного обновления всех ссылок разом каждая отслеживаемая ссылка
+проверяется в свой срок. Сроки хранятся в SQLite и в памяти - в куче
+(heapq) по времени следующей проверки:
+    - цена изменилась - интервал ссылки сокращается (SPEEDUP), но не ниже
+      min_interval: изменчивые товары проверяются чаще;
+    - цена та же - интервал растет (BACKOFF) до max_interval;
+    - ошибка загрузки - интервал растет быстрее (FAILURE_BACKOFF).
+К каждому сроку добавляется случайный разброс (JITTER), а новые ссылки
+распределяются равномерно по первому интервалу, поэтому нагрузка на сайты
+идет ровно, а не всплесками. Сверх предела одновременных запросов к хосту
+(per_host в конвейере) действует предел частоты: не больше rate запросов
+в минуту к одному хосту, лишние ссылки сдвигаются на свободное время.
+
+Отслеживаются только записанные товары: ссылки из кэша страниц и истории
+цен, товар которых есть в таблице (stored_urls), - не отклоненные при
+добавлении и не записанные в другую таблицу. В таблицу после проверки
+пишутся только новые товары и товары с изменившейся ценой.
+"""
+import asyncio
+import heapq
+import random
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+from .metrics import METRICS
+from .records import RecordBatch
+
+# Исход проверки ссылки
+CHANGED = 'changed'
+UNCHANGED = 'unchanged'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS schedule (
+    url TEXT PRIMARY KEY,
+    interval REAL NOT NULL,
+    next_due REAL NOT NULL,
+    checks INTEGER NOT NULL DEFAULT 0,
+    changes INTEGER NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0,
+    checked_at REAL
+);
+"""
+
+# Интервалы проверки одной ссылки (с)
+MIN_INTERVAL = 15 * 60
+MAX_INTERVAL = 24 * 3600
+INITIAL_INTERVAL = 3600
+# Множители интервала после проверки
+SPEEDUP = 0.5
+BACKOFF = 1.5
+FAILURE_BACKOFF = 2.0
+# Случайный разброс срока: +-10% интервала
+JITTER = 0.1
+# Запросов в минуту к одному хосту
+DEFAULT_RATE = 30
+# Сколько ссылок прогонять через конвейер за один раз
+BATCH_SIZE = 200
+# Как часто перечитывать отслеживаемые ссылки из хранилищ (с)
+RESCAN_INTERVAL = 300
+# Наибольший сон между проверками остановки (с)
+IDLE_SECONDS = 1.0
+
+
+def host_of(url):
+    return urlsplit(url).netloc.lower()
+
+
+class RepriceSchedule:
+    """Сроки проверки ссылок: SQLite на диске и куча по времени в памяти; безопасно для нескольких потоков"""
+
+    def __init__(self, path, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL,
+                 initial_interval=INITIAL_INTERVAL, rate=DEFAULT_RATE):
+        self.path = path
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.initial_interval = min(max(initial_interval, min_interval), max_interval)
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        # Ссылка -> [интервал, срок]; в куче устаревшие пары (срок, ссылка) пропускаются
+        self._entries = {}
+        self._heap = []
+        # Хост -> время, раньше которого к нему не обращаемся (предел частоты);
+        # сдвинутые ссылки уже заняли свое время и в срок выдаются без проверки
+        self._host_free_at = {}
+        self._reserved = set()
+        for url, interval, next_due in self._db.execute("SELECT url, interval, next_due FROM schedule"):
+            self._entries[url] = [interval, next_due]
+            self._heap.append((next_due, url))
+        heapq.heapify(self._heap)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, url):
+        with self._lock:
+            return url in self._entries
+
+    def track(self, urls, now=None):
+        """Добавляет новые ссылки; первые проверки распределяются по initial_interval. Возвращает число новых"""
+        now = time.time() if now is None else now
+        with self._lock:
+            new = [url for url in dict.fromkeys(urls) if url not in self._entries]
+            rows = []
+            for position, url in enumerate(new):
+                next_due = now + self.initial_interval * position / len(new)
+                self._entries[url] = [self.initial_interval, next_due]
+                heapq.heappush(self._heap, (next_due, url))
+                rows.append((url, self.initial_interval, next_due))
+            if rows:
+                self._db.executemany("INSERT OR IGNORE INTO schedule (url, interval, next_due) VALUES (?, ?, ?)", rows)
+                self._db.commit()
+        return len(new)
+
+    def forget(self, url):
+        """Перестает отслеживать ссылку"""
+        with self._lock:
+            self._reserved.discard(url)
+            if self._entries.pop(url, None) is not None:
+                self._db.execute("DELETE FROM schedule WHERE url = ?", (url,))
+                self._db.commit()
+
+    def next_due(self):
+        """Ближайший срок проверки или None, если ссылок нет"""
+        with self._lock:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def _drop_stale(self):
+        while self._heap:
+            next_due, url = self._heap[0]
+            entry = self._entries.get(url)
+            if entry is not None and entry[1] == next_due:
+                return
+            heapq.heappop(self._heap)
+
+    def _slot(self, url, now):
+        """Время, когда к хосту ссылки можно обратиться с учетом предела частоты, и занимает его"""
+        if not self.rate:
+            return now
+        host = host_of(url)
+        slot = max(now, self._host_free_at.get(host, now))
+        self._host_free_at[host] = slot + 60.0 / self.rate
+        return slot
+
+    def due(self, now=None, limit=BATCH_SIZE):
+        """Забирает до limit ссылок, срок которых подошел (раньше - более просроченные)
+
+        Ссылки хоста, исчерпавшего предел частоты, сдвигаются на его
+        свободное время. Забранная ссылка остается в расписании: срок ей
+        назначает reschedule_many после проверки.
+        """
+        now = time.time() if now is None else now
+        urls = []
+        deferred = []
+        with self._lock:
+            while self._heap and len(urls) < limit:
+                self._drop_stale()
+                if not self._heap or self._heap[0][0] > now:
+                    break
+                _, url = heapq.heappop(self._heap)
+                if url in self._reserved:
+                    self._reserved.discard(url)
+                    slot = now
+                else:
+                    slot = self._slot(url, now)
+                if slot > now:
+                    deferred.append((slot, url))
+                else:
+                    urls.append(url)
+                    # До reschedule_many ссылка не выдается повторно
+                    self._entries[url][1] = float('inf')
+            for slot, url in deferred:
+                self._reserved.add(url)
+                self._entries[url][1] = slot
+                heapq.heappush(self._heap, (slot, url))
+        if deferred:
+            METRICS.add('schedule_rate_limited', len(deferred))
+        return urls
+
+    def reschedule_many(self, outcomes, now=None):
+        """Назначает новые сроки по исходам {ссылка: CHANGED / UNCHANGED / FAILED}; возвращает {исход: число}"""
+        now = time.time() if now is None else now
+        counts = {CHANGED: 0, UNCHANGED: 0, FAILED: 0}
+        rows = []
+        with self._lock:
+            for url, outcome in outcomes.items():
+                entry = self._entries.get(url)
+                if entry is None:
+                    continue
+                interval = entry[0]
+                if outcome == CHANGED:
+                    interval *= SPEEDUP
+                elif outcome == FAILED:
+                    interval *= FAILURE_BACKOFF
+                else:
+                    interval *= BACKOFF
+                interval = min(max(interval, self.min_interval), self.max_interval)
+                next_due = now + interval * random.uniform(1 - JITTER, 1 + JITTER)
+                entry[0], entry[1] = interval, next_due
+                heapq.heappush(self._heap, (next_due, url))
+                counts[outcome] += 1
+                rows.append((interval, next_due, now, outcome == CHANGED, outcome == FAILED, url))
+            if rows:
+                self._db.executemany(
+                    "UPDATE schedule SET interval = ?, next_due = ?, checked_at = ?, checks = checks + 1, "
+                    "changes = changes + ?, failures = failures + ? WHERE url = ?", rows)
+                self._db.commit()
+        for outcome, count in counts.items():
+            METRICS.add(f'schedule_{outcome}', count)
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def stored_urls(store, *sources):
+    """Ссылки товаров из sources (PageCache, PriceHistory или None), которые есть в хранилище store"""
+    names = store.product_names()
+    urls = []
+    for source in sources:
+        if source is not None:
+            urls.extend(url for url, product_name in source.products() if product_name in names)
+    return urls
+
+
+def is_changed(record, before):
+    """Отличается ли запись PriceRecord от прошлого разбора before (название, копейки, валюта) или None"""
+    return before is None or tuple(before) != record.result
+
+
+def outcomes_of(urls, previous, parsed, failed):
+    """Исходы проверки: previous - {ссылка: (название, копейки, валюта)} до прогона, parsed - результаты после"""
+    failed = set(failed)
+    outcomes = {}
+    for url in urls:
+        if url in failed:
+            outcomes[url] = FAILED
+            continue
+        before = previous.get(url)
+        after = parsed.get(url)
+        changed = before is not None and after is not None and tuple(after) != tuple(before)
+        outcomes[url] = CHANGED if changed else UNCHANGED
+    return outcomes
+
+
+async def run_schedule(schedule, pipeline, parsed, stop, tracked=None, batch_size=BATCH_SIZE, on_round=None,
+                       initial=None):
+    """Прогоняет ссылки, срок которых подошел, через pipeline (AsyncPipeline), пока не установлен stop
+
+    parsed - словарь ссылка -> (название, копейки, валюта), который пополняет конвейер
+    (по нему определяется, изменилась ли цена). tracked() возвращает
+    отслеживаемые ссылки хранилищ, она вызывается раз в RESCAN_INTERVAL в
+    потоке пула (читает хранилище под блокировкой и не должна останавливать
+    загрузки). initial - уже полученный результат tracked(): с ним первый
+    просмотр откладывается на RESCAN_INTERVAL.
+    on_round(summary, counts) вызывается после каждого прогона.
+
+    На время работы pipeline.commit получает только новые товары и товары
+    с изменившимся названием или ценой: неизменная пачка не пишется вовсе.
+    Товары, запись которых не удалась, передаются снова при следующей проверке.
+    """
+    commit = pipeline.commit
+    previous = {}
+    unsaved = set()
+
+    def commit_changed(records):
+        batch = RecordBatch(record for record in records.records()
+                            if record.url in unsaved or is_changed(record, previous.get(record.url)))
+        if not batch:
+            return True
+        saved = commit(batch)
+        if saved:
+            unsaved.difference_update(batch.urls)
+        else:
+            unsaved.update(batch.urls)
+        return saved
+
+    loop = asyncio.get_running_loop()
+    pipeline.commit = commit_changed
+    try:
+        rescan_at = 0
+        if initial is not None:
+            schedule.track(initial)
+            rescan_at = time.monotonic() + RESCAN_INTERVAL
+        while not stop.is_set():
+            if tracked is not None and time.monotonic() >= rescan_at:
+                schedule.track(await loop.run_in_executor(None, tracked))
+                rescan_at = time.monotonic() + RESCAN_INTERVAL
+            urls = schedule.due(limit=batch_size)
+            if not urls:
+                next_due = schedule.next_due()
+                delay = IDLE_SECONDS if next_due is None else next_due - time.time()
+                await asyncio.sleep(min(max(delay, 0.05), IDLE_SECONDS))
+                continue
+            previous.clear()
+            previous.update((url, parsed.get(url)) for url in urls)
+            try:
+                summary = await pipeline.run(urls)
+            except Exception:
+                # Взятые ссылки не должны выпасть из расписания
+                schedule.reschedule_many(dict.fromkeys(urls, FAILED))
+                raise
+            counts = schedule.reschedule_many(outcomes_of(urls, previous, parsed, summary.failed))
+            if on_round is not None:
+                on_round(summary, counts)
+    finally:
+        pipeline.commit = commit
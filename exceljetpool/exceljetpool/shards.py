@@ -0,0 +1,289 @@
+"""Разбиение каталога на несколько файлов-шардов с манифестом
+
+Когда каталог не помещается на один лист (или такой лист слишком долго
+открывается), товары раскладываются по файлам prices_shards/prices-<ключ>.xlsx.
+Ключ шарда определяется по названию товара:
+    hash     - crc32 названия по модулю числа шардов;
+    range    - диапазон названий по алфавиту (границы в манифесте);
+    category - первое слово названия ("Чайник", "Пылесос", ...).
+Манифест prices.manifest.json хранит схему, границы и список файлов, поэтому
+поиск товара открывает только его шард, а пачка записывается во все
+затронутые шарды параллельно. Манифест меняется под блокировкой файла и
+перечитывается перед записью, так что несколько процессов могут добавлять
+шарды одновременно.
+"""
+import bisect
+import json
+import os
+import re
+import tempfile
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from .locking import DEFAULT_TIMEOUT as LOCK_TIMEOUT
+from .locking import FileLock
+from .stores import STORES, store_format
+from .workbook import FIRST_DATA_ROW, PriceWorkbook, UpsertResult, dedupe_records, is_empty
+
+SCHEMES = ('hash', 'range', 'category')
+
+MANIFEST_SUFFIX = '.manifest.json'
+
+# Сколько шардов записывать одновременно
+DEFAULT_PARALLEL = 4
+
+# Границы схемы range берутся из названий, только если их не меньше стольких на шард:
+# по маленькой пачке каталог навсегда остался бы из 1-3 шардов
+RANGE_MIN_SAMPLE = 100
+
+# Символы, недопустимые в имени файла шарда
+UNSAFE_KEY = re.compile(r'[^\w-]+')
+
+
+def manifest_path(path):
+    """prices.xlsx -> prices.manifest.json"""
+    return os.path.splitext(path)[0] + MANIFEST_SUFFIX
+
+
+def open_store(path, streaming=None, lock_timeout=LOCK_TIMEOUT, merge_on_conflict=False):
+    """Хранилище для path, формат - по расширению (см. stores)
+
+    Для .xlsx - ShardedWorkbook, если рядом есть манифест, иначе PriceWorkbook.
+    """
+    if store_format(path) in STORES:
+        return STORES[store_format(path)](path, lock_timeout=lock_timeout, merge_on_conflict=merge_on_conflict)
+    if os.path.exists(manifest_path(path)):
+        return ShardedWorkbook(path, lock_timeout=lock_timeout, merge_on_conflict=merge_on_conflict)
+    return PriceWorkbook(path, streaming, lock_timeout=lock_timeout, merge_on_conflict=merge_on_conflict)
+
+
+class ShardedWorkbook:
+    """Каталог из нескольких prices-*.xlsx с тем же интерфейсом записи, что у PriceWorkbook
+
+    Параметры scheme, shards и boundaries используются только при создании
+    манифеста; у существующего каталога они читаются из манифеста.
+    """
+
+    def __init__(self, path, scheme='hash', shards=16, boundaries=None, parallel=DEFAULT_PARALLEL,
+                 lock_timeout=LOCK_TIMEOUT, merge_on_conflict=False):
+        self.path = path
+        self.lock_timeout = lock_timeout
+        self.merge_on_conflict = merge_on_conflict
+        self.manifest_file = manifest_path(path)
+        base = os.path.splitext(os.path.basename(path))[0]
+        self.directory = os.path.join(os.path.dirname(os.path.abspath(path)), base + '_shards')
+        self.prefix = base + '-'
+        self.parallel = parallel
+        self.manifest_lock = FileLock(self.manifest_file, timeout=lock_timeout)
+        self._lock = threading.Lock()
+        self._stores = {}
+
+        if scheme not in SCHEMES:
+            raise ValueError(f"Неизвестная схема разбиения: {scheme}")
+        self.scheme = scheme
+        self.shards = shards
+        self.boundaries = boundaries
+        self.files = {}
+        self.reload()
+
+    def read_manifest(self):
+        """Манифест с диска или None, если его нет"""
+        try:
+            with open(self.manifest_file, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def reload(self):
+        """Перечитывает схему, границы и список файлов из манифеста; возвращает False, если его нет"""
+        manifest = self.read_manifest()
+        if manifest is None:
+            return False
+        self.scheme = manifest['scheme']
+        self.shards = manifest['shards']
+        self.boundaries = manifest.get('boundaries')
+        self.files = manifest['files']
+        return True
+
+    def shard_key(self, product_name):
+        """Ключ шарда товара"""
+        product_name = str(product_name)
+        if self.scheme == 'hash':
+            width = len(str(self.shards - 1))
+            return str(zlib.crc32(product_name.encode('utf-8')) % self.shards).zfill(width)
+        if self.scheme == 'range':
+            width = len(str(len(self.boundaries)))
+            return str(bisect.bisect_right(self.boundaries, product_name.casefold())).zfill(width)
+        words = product_name.split()
+        return UNSAFE_KEY.sub('_', words[0].casefold()) if words else '_'
+
+    def shard_path(self, key):
+        return os.path.join(self.directory, f'{self.prefix}{key}.xlsx')
+
+    def store(self, key):
+        """PriceWorkbook шарда (объект держится между записями, как книга в PriceWorkbook)"""
+        with self._lock:
+            store = self._stores.get(key)
+            if store is None:
+                store = self._stores[key] = PriceWorkbook(self.shard_path(key), lock_timeout=self.lock_timeout,
+                                                          merge_on_conflict=self.merge_on_conflict)
+            return store
+
+    def create_if_not_exists(self):
+        """Создает папку шардов и манифест; возвращает True, если каталог был создан
+
+        Если манифест тем временем создал другой процесс, берутся его схема и границы.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self.manifest_file):
+            return False
+        with self.manifest_lock:
+            if self.reload():
+                return False
+            self._write_manifest()
+        return True
+
+    def save_manifest(self, updates=None):
+        """Записывает манифест под блокировкой, добавляя к нему записи updates {ключ шарда: запись}
+
+        Манифест сначала перечитывается с диска: шарды, которые тем временем
+        добавили другие процессы, не теряются.
+        """
+        with self.manifest_lock:
+            manifest = self.read_manifest()
+            if manifest is not None:
+                self.files = manifest['files']
+            if updates:
+                self.files.update(updates)
+            self._write_manifest()
+
+    def _write_manifest(self):
+        """Атомарно записывает манифест (под manifest_lock)"""
+        manifest = {
+            'version': 1,
+            'scheme': self.scheme,
+            'shards': self.shards,
+            'boundaries': self.boundaries,
+            'files': self.files,
+        }
+        directory = os.path.dirname(os.path.abspath(self.manifest_file))
+        fd, tmp_path = tempfile.mkstemp(suffix='.json', prefix='.manifest-', dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.manifest_file)
+
+    def _ensure_boundaries(self, names):
+        """Для схемы range без границ берет их из названий (квантили)
+
+        Названий должно быть не меньше RANGE_MIN_SAMPLE на шард, иначе ValueError:
+        границы по маленькой выборке остались бы в манифесте навсегда.
+        """
+        if self.scheme != 'range' or self.boundaries is not None:
+            return
+        names = sorted({str(name).casefold() for name in names})
+        if len(names) < self.shards * RANGE_MIN_SAMPLE:
+            raise ValueError(f"Для {self.shards} шардов по диапазонам нужно не меньше "
+                             f"{self.shards * RANGE_MIN_SAMPLE} товаров (есть {len(names)}): "
+                             f"уменьшите число шардов, задайте границы или выберите схему hash")
+        self.boundaries = [names[len(names) * i // self.shards] for i in range(1, self.shards)]
+
+    def find(self, product_name):
+        """(файл шарда, строка) товара или None; открывается только нужный шард"""
+        key = self.shard_key(product_name)
+        if key not in self.files:
+            # Шард мог добавить другой процесс
+            self.reload()
+        if key not in self.files:
+            return None
+        store = self.store(key)
+        store.load()
+        row = store.index.find(product_name)
+        return (store.path, row) if row is not None else None
+
+    def upsert_many(self, records, save=True):
+        """Раскладывает пачку по шардам и записывает их параллельно; возвращает общий UpsertResult"""
+        latest = dedupe_records(records)
+        if not os.path.exists(self.manifest_file):
+            self._ensure_boundaries(latest)
+            self.create_if_not_exists()
+        groups = {}
+        for product_name, price in latest.items():
+            groups.setdefault(self.shard_key(product_name), []).append((product_name, price))
+        # Шарды с отложенными пачками записываются, даже если в этой пачке их товаров нет
+        for key in self.files:
+            if key not in groups and self.store(key).has_pending_changes():
+                groups[key] = []
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        def write(key):
+            store = self.store(key)
+            store.create_if_not_exists()
+            result = store.upsert_many(groups[key], save=save)
+            return key, result, len(store.index) if store.index is not None else None
+
+        result = UpsertResult()
+        updates = {}
+        with ThreadPoolExecutor(min(self.parallel, len(groups)) or 1) as executor:
+            for key, shard_result, products in executor.map(write, sorted(groups)):
+                result.merge(shard_result)
+                entry = dict(self.files.get(key) or {'file': os.path.basename(self.shard_path(key)), 'products': 0})
+                entry['products'] = products if products is not None else entry['products'] + len(shard_result.added)
+                if key not in self.files or shard_result.added:
+                    updates[key] = entry
+        if updates:
+            self.save_manifest(updates)
+        return result
+
+    def product_names(self):
+        """Множество названий товаров всех шардов"""
+        self.reload()
+        names = set()
+        for key in self.files:
+            if os.path.exists(self.shard_path(key)):
+                names.update(self.store(key).product_names())
+        return names
+
+    def has_pending_changes(self):
+        """Есть ли отложенные пачки хотя бы в одном шарде"""
+        return any(self.store(key).has_pending_changes() for key in self.files)
+
+    def invalidate(self):
+        """Сбрасывает книги шардов в памяти"""
+        with self._lock:
+            for store in self._stores.values():
+                store.invalidate()
+
+    def split(self, source, batch_size=50000):
+        """Раскладывает товары из обычного prices.xlsx по шардам пачками по batch_size
+
+        Лист читается потоково; для схемы range без границ он сначала
+        прочитывается целиком ради названий, чтобы шарды вышли равными.
+        """
+        if self.scheme == 'range' and self.boundaries is None:
+            self._ensure_boundaries(product_name for product_name, price in read_records(source))
+        self.create_if_not_exists()
+        result = UpsertResult()
+        batch = []
+        for record in read_records(source):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                result.merge(self.upsert_many(batch))
+                batch = []
+        if batch:
+            result.merge(self.upsert_many(batch))
+        return result
+
+
+def read_records(path):
+    """Генератор (название, цена) листа prices.xlsx до первой пустой ячейки в A"""
+    import openpyxl
+    wb = openpyxl.load_workbook(path, read_only=True)
+    try:
+        for row in wb.active.iter_rows(min_row=FIRST_DATA_ROW, max_col=2, values_only=True):
+            if not row or is_empty(row[0]):
+                break
+            yield row[0], row[1] if len(row) > 1 else None
+    finally:
+        wb.close()
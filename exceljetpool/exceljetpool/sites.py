@@ -0,0 +1,249 @@
+"""Правила извлечения для разных магазинов: реестр по домену
+
+Для сайтов, чья разметка отличается от нашей (data-product-name и meta
+product:price:amount), правила описываются в sites.json рядом с программой:
+
+    {
+        "shop.example.ru": {
+            "name": {"css": "h1.product-title"},
+            "price": [{"css": "[itemprop=price]", "attr": "content"},
+                      {"regex": "\\"price\\":\\\\s*\\"?([\\\\d.]+)"}]
+        },
+        "other.example.com": {
+            "name": {"jsonld": "name"},
+            "price": {"xpath": "string(//span[@class='price'])"},
+            "currency": {"jsonld": "offers.priceCurrency"}
+        }
+    }
+
+Виды правил: css (селектор; attr - взять атрибут вместо текста), xpath
+(нужен lxml), jsonld (путь в объекте schema.org Product), regex (первая
+группа или все совпадение), meta (content meta-тега с таким property/name).
+Для поля можно указать список правил - берется первое сработавшее. Поле
+currency необязательно: без правил валюта ищется в общей разметке
+(extract_currency).
+
+Правила компилируются один раз при загрузке (configure), а ссылка
+направляется к правилам своего домена по имени хоста (www.shop.ru ищется
+как www.shop.ru, затем shop.ru). Сайты без правил разбираются как прежде
+(extract_product); поля, не найденные правилами, берутся из JSON-LD или
+OpenGraph.
+
+soupsieve, bs4 и lxml импортируются только при загрузке правил css/xpath.
+"""
+import json
+import re
+from html import unescape
+from urllib.parse import urlsplit
+
+from .extract import (detect_encoding, extract_currency, extract_product, extract_structured, json_ld_products,
+                     json_path, meta_content, strip_fields)
+from .metrics import METRICS
+from .records import page_result
+
+FIELDS = ('name', 'price', 'currency')
+KINDS = ('css', 'xpath', 'jsonld', 'regex', 'meta')
+
+
+class _Page:
+    """Страница, разобранная по требованию: текст, soup и дерево lxml строятся один раз на все правила"""
+    __slots__ = ('content', 'encoding', '_text', '_soup', '_tree', '_products')
+
+    def __init__(self, content):
+        self.content = content
+        self.encoding = detect_encoding(content)
+        self._text = self._soup = self._tree = self._products = None
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = self.content.decode(self.encoding, 'replace')
+        return self._text
+
+    @property
+    def soup(self):
+        if self._soup is None:
+            from bs4 import BeautifulSoup
+            self._soup = BeautifulSoup(self.content, 'html.parser')
+        return self._soup
+
+    @property
+    def tree(self):
+        if self._tree is None:
+            from lxml import html as lxml_html
+            self._tree = lxml_html.fromstring(self.content)
+        return self._tree
+
+    @property
+    def products(self):
+        if self._products is None:
+            self._products = json_ld_products(self.content, self.encoding)
+        return self._products
+
+
+class Rule:
+    """Одно скомпилированное правило извлечения поля"""
+    __slots__ = ('kind', 'expression', 'attr', '_compiled')
+
+    def __init__(self, kind, expression, attr=None):
+        if kind not in KINDS:
+            raise ValueError(f"Неизвестный вид правила: {kind}")
+        self.kind = kind
+        self.expression = expression
+        self.attr = attr
+        if kind == 'css':
+            import soupsieve
+            try:
+                self._compiled = soupsieve.compile(expression)
+            except soupsieve.SelectorSyntaxError as e:
+                raise ValueError(str(e)) from e
+        elif kind == 'xpath':
+            try:
+                from lxml import etree
+            except ImportError:
+                raise ValueError("Для правил xpath нужен пакет lxml") from None
+            self._compiled = etree.XPath(expression)
+        elif kind == 'regex':
+            self._compiled = re.compile(expression, re.I | re.S)
+        elif kind == 'meta':
+            self._compiled = (expression.lower(),)
+        else:
+            self._compiled = expression
+
+    @classmethod
+    def from_config(cls, config):
+        """Правило из словаря вида {"css": "h1", "attr": "content"}"""
+        kinds = [kind for kind in KINDS if kind in config]
+        if len(kinds) != 1:
+            raise ValueError(f"В правиле должен быть ровно один из видов {', '.join(KINDS)}: {config}")
+        return cls(kinds[0], config[kinds[0]], config.get('attr'))
+
+    def apply(self, page):
+        """Значение поля со страницы _Page или None"""
+        if self.kind == 'css':
+            element = self._compiled.select_one(page.soup)
+            if element is None:
+                return None
+            return element.get(self.attr) if self.attr else element.get_text(' ', strip=True)
+        if self.kind == 'xpath':
+            result = self._compiled(page.tree)
+            if isinstance(result, list):
+                result = result[0] if result else None
+            if result is None:
+                return None
+            if hasattr(result, 'text_content'):
+                return result.get(self.attr) if self.attr else result.text_content()
+            return str(result) or None
+        if self.kind == 'regex':
+            match = self._compiled.search(page.text)
+            if match is None:
+                return None
+            return unescape(match.group(1) if match.groups() else match.group(0))
+        if self.kind == 'meta':
+            return meta_content(page.content, self._compiled, page.encoding)
+        for product in page.products:
+            value = json_path(product, self._compiled)
+            if value is not None:
+                return value
+        return None
+
+
+class SiteExtractor:
+    """Правила одного сайта: для каждого поля - список правил по порядку"""
+
+    def __init__(self, domain, config):
+        self.domain = domain
+        self.rules = {}
+        for field in FIELDS:
+            rules = config.get(field, [])
+            if isinstance(rules, dict):
+                rules = [rules]
+            try:
+                self.rules[field] = [Rule.from_config(rule) for rule in rules]
+            except (ValueError, re.error) as e:
+                raise ValueError(f"{domain}, поле {field}: {e}") from e
+        unknown = set(config) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"{domain}: неизвестные поля {', '.join(sorted(unknown))}")
+
+    def extract(self, content):
+        """(название, цена, валюта) по правилам сайта; ненайденное поле - None"""
+        page = _Page(content)
+        values = []
+        for field in FIELDS:
+            value = None
+            for rule in self.rules[field]:
+                value = rule.apply(page)
+                if value is not None:
+                    break
+            values.append(value)
+        return tuple(values)
+
+
+class SiteRegistry:
+    """Домен -> SiteExtractor"""
+
+    def __init__(self, sites=None, path=None):
+        self.sites = sites or {}
+        self.path = path
+
+    @classmethod
+    def load(cls, path):
+        """Читает и компилирует правила из JSON-файла"""
+        with open(path, encoding='utf-8-sig') as f:
+            config = json.load(f)
+        if not isinstance(config, dict):
+            raise ValueError(f"{path}: ожидается объект {{домен: правила}}")
+        sites = {}
+        for domain, rules in config.items():
+            domain = domain.lower()
+            sites[domain[4:] if domain.startswith('www.') else domain] = SiteExtractor(domain, rules)
+        return cls(sites, path)
+
+    def __len__(self):
+        return len(self.sites)
+
+    def find(self, url):
+        """Правила сайта ссылки или None: хост и его родительские домены"""
+        if not self.sites or not url:
+            return None
+        host = (urlsplit(url).hostname or '').rstrip('.')
+        while host:
+            extractor = self.sites.get(host)
+            if extractor is not None:
+                return extractor
+            host = host.partition('.')[2]
+        return None
+
+
+# Правила текущего процесса (пустые, пока не вызван configure)
+SITES = SiteRegistry()
+
+
+def configure(path):
+    """Загружает правила из path в SITES (в процессе программы и в процессах ParsePool)"""
+    registry = SiteRegistry.load(path)
+    SITES.sites = registry.sites
+    SITES.path = path
+    return SITES
+
+
+def extract_page(content, url=None, engine='stream'):
+    """(название, копейки, валюта) страницы url: по правилам ее сайта, иначе extract_product
+
+    Цена разбирается здесь (page_result), в процессе разбора страницы.
+    """
+    extractor = SITES.find(url)
+    if extractor is None:
+        return page_result(*extract_product(content, engine))
+    with METRICS.timer('extract'):
+        METRICS.add('site_rules')
+        product_name, price, currency = extractor.extract(content)
+        if product_name is None or price is None:
+            METRICS.add('structured_fallbacks')
+            structured_name, structured_price = extract_structured(content)
+            product_name = product_name if product_name is not None else structured_name
+            price = price if price is not None else structured_price
+        if currency is None:
+            currency = extract_currency(content)
+    return page_result(*strip_fields(product_name, price), currency)
@@ -0,0 +1,411 @@
+"""Хранилища цен в других форматах: CSV, SQLite и Parquet
+
+Основным хранилищем вместо prices.xlsx может быть prices.csv,
+prices.sqlite или prices.parquet - формат выбирается по расширению файла
+(open_store в shards). Интерфейс записи тот же, что у PriceWorkbook:
+create_if_not_exists, upsert_many -> UpsertResult, та же блокировка файла и
+журнал отложенных пачек (см. locking). Номера строк в отчете - строки, которые
+товары займут в выгруженном prices.xlsx.
+
+    csv     - дописывается в конец: новая цена товара - новая строка, при
+              чтении побеждает последняя; файл переписывается целиком
+              (уплотняется), только когда устаревших строк стало больше, чем
+              живых. Разделитель ";", десятичная запятая и BOM - как у CSV
+              из русского Excel;
+    sqlite  - таблица prices с ключом по названию, запись - одна транзакция;
+    parquet - столбцы product_name и price; файл неизменяемый, поэтому
+              переписывается при каждой записи (нужен пакет pyarrow).
+
+XLSX из любого хранилища выгружается по требованию: export_xlsx или
+"python exceljetpool.py export prices.csv --out prices.xlsx".
+"""
+import csv
+import importlib.util
+import io
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from decimal import Decimal
+
+from .locking import DEFAULT_TIMEOUT as LOCK_TIMEOUT
+from .locking import ChangeLog, FileLock, LockTimeout, atomic_save
+from .metrics import METRICS
+from .records import cell_price, parse_price, price_value
+from .workbook import (CHANGED, DATA_FONT, DEFERRED, HEADER_FONT, HEADERS, UNCHANGED, PriceWorkbook, ProductIndex,
+                      UpsertResult, dedupe_records, file_signature, is_empty)
+
+CSV_DELIMITER = ';'
+CSV_ENCODING = 'utf-8-sig'
+# CSV уплотняется, когда устаревших строк больше живых и не меньше этого числа
+COMPACT_MIN_ROWS = 10000
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    product_name TEXT PRIMARY KEY,
+    price,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def store_format(path):
+    """Формат хранилища по расширению: 'xlsx', 'csv', 'sqlite' или 'parquet'"""
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension in ('db', 'sqlite3'):
+        return 'sqlite'
+    return extension if extension in STORES else 'xlsx'
+
+
+def stored_price(value):
+    """Цена, прочитанная из хранилища, в виде для ячейки (как в prices.xlsx)"""
+    if isinstance(value, float):
+        return price_value(parse_price(value))
+    return cell_price(value)
+
+
+def csv_price(price):
+    """Цена для CSV: число с десятичной запятой ("1234,50"), текст не меняется"""
+    kopecks = None if isinstance(price, str) else parse_price(price)
+    if kopecks is None:
+        return price
+    rubles, rest = divmod(abs(kopecks), 100)
+    text = f"{rubles},{rest:02d}" if rest else str(rubles)
+    return "-" + text if kopecks < 0 else text
+
+
+def numeric_price(price):
+    """Цена для числового столбца: Decimal - float (SQLite и Parquet его не принимают)"""
+    return float(price) if isinstance(price, Decimal) else price
+
+
+class FileStore(ABC):
+    """Общее для хранилищ-файлов: блокировка, отложенные пачки, индекс в памяти, выгрузка XLSX
+
+    Подклассы читают файл в ProductIndex (_read_index), создают пустой файл
+    (_create) и записывают добавленные и измененные товары (_write; replaced -
+    сколько из них уже были в файле с другой ценой).
+    """
+    format = None
+
+    def __init__(self, path, lock_timeout=LOCK_TIMEOUT, merge_on_conflict=False):
+        self.path = path
+        self.merge_on_conflict = merge_on_conflict
+        self.lock = FileLock(path, timeout=lock_timeout)
+        self.changes = ChangeLog(path)
+        self.index = None
+        self.signature = None
+
+    def create_if_not_exists(self):
+        """Создает пустое хранилище; возвращает True, если файл был создан"""
+        if os.path.exists(self.path):
+            return False
+        with self.lock:
+            if os.path.exists(self.path):
+                return False
+            self._create()
+        return True
+
+    def load(self):
+        """Строит индекс товаров, если его нет или файл изменил другой процесс"""
+        signature = file_signature(self.path)
+        if self.index is None or signature != self.signature:
+            with METRICS.timer('index_build'):
+                self.index = self._read_index()
+            self.signature = signature
+        return self.index
+
+    def invalidate(self):
+        self.index = self.signature = None
+
+    def has_pending_changes(self):
+        """Есть ли отложенные пачки (upsert_many([]) их запишет)"""
+        return bool(self.changes)
+
+    def product_names(self):
+        """Множество названий товаров хранилища"""
+        with self.lock:
+            return set(self.load().rows)
+
+    def upsert_many(self, records, save=True):
+        """Записывает пачку (название, цена) под блокировкой; возвращает UpsertResult
+
+        Протокол тот же, что у PriceWorkbook.upsert_many; save не
+        используется - запись всегда сразу попадает в файл.
+        """
+        records = list(records)
+        try:
+            self.lock.acquire()
+        except LockTimeout:
+            if not self.merge_on_conflict:
+                raise
+            self.changes.append(records)
+            METRICS.add('deferred_batches')
+            result = UpsertResult()
+            for product_name in dedupe_records(records):
+                result.record(DEFERRED, product_name, None)
+            return result
+        try:
+            deferred = self.changes.drain()
+            try:
+                return self._upsert_locked(deferred + records)
+            except Exception:
+                if deferred:
+                    self.changes.append(deferred)
+                raise
+        finally:
+            self.lock.release()
+
+    def _upsert_locked(self, records):
+        index = self.load()
+        result = UpsertResult()
+        written = []
+        replaced = 0
+        try:
+            with METRICS.timer('upsert'):
+                for product_name, price in dedupe_records(records).items():
+                    row, status = index.upsert(product_name, price)
+                    result.record(status, product_name, row)
+                    if status != UNCHANGED:
+                        written.append((product_name, price))
+                        replaced += status == CHANGED
+            if written:
+                with METRICS.timer('save'):
+                    self._write(written, replaced)
+                self.signature = file_signature(self.path)
+        except Exception:
+            # Индекс в памяти разошелся с файлом
+            self.invalidate()
+            raise
+        METRICS.add('cells_written', len(result) + len(result.added))
+        return result
+
+    def records(self):
+        """(название, цена) всех товаров в порядке строк"""
+        index = self.load()
+        return ((product_name, index.prices[product_name]) for product_name in index.rows)
+
+    def export_xlsx(self, path):
+        """Выгружает товары в path (prices.xlsx); список товаров снимается под блокировкой хранилища"""
+        with self.lock:
+            records = list(self.records())
+        write_xlsx(path, records)
+
+    def close(self):
+        pass
+
+    @abstractmethod
+    def _read_index(self):
+        """ProductIndex товаров файла"""
+
+    @abstractmethod
+    def _create(self):
+        """Создает пустой файл (вызывается под блокировкой)"""
+
+    @abstractmethod
+    def _write(self, records, replaced):
+        """Записывает добавленные и измененные (название, цена) в файл"""
+
+
+class CsvStore(FileStore):
+    """prices.csv: новые и измененные цены дописываются в конец файла"""
+    format = 'csv'
+
+    def __init__(self, path, lock_timeout=LOCK_TIMEOUT, merge_on_conflict=False):
+        super().__init__(path, lock_timeout, merge_on_conflict)
+        # Строк с устаревшей ценой (их заменили строки ниже)
+        self.superseded = 0
+
+    def _create(self):
+        atomic_save(lambda tmp_path: self._write_all(tmp_path, ()), self.path)
+
+    def _write_all(self, path, records):
+        with open(path, 'w', encoding=CSV_ENCODING, newline='') as f:
+            writer = csv.writer(f, delimiter=CSV_DELIMITER)
+            writer.writerow(HEADERS)
+            writer.writerows((product_name, csv_price(price)) for product_name, price in records)
+
+    def _read_index(self):
+        index = ProductIndex()
+        lines = 0
+        with open(self.path, encoding=CSV_ENCODING, newline='') as f:
+            text = f.read()
+        # Строка без перевода строки в конце еще дописывается (или оборвана сбоем)
+        text = text[:text.rfind('\n') + 1]
+        reader = csv.reader(io.StringIO(text, newline=''), delimiter=CSV_DELIMITER)
+        next(reader, None)
+        for row in reader:
+            if not row or is_empty(row[0]):
+                continue
+            lines += 1
+            product_name = row[0]
+            if product_name not in index.rows:
+                index.rows[product_name] = index.next_row
+                index.next_row += 1
+            # Последняя строка товара - его текущая цена
+            index.prices[product_name] = cell_price(row[1]) if len(row) > 1 and row[1] != '' else None
+        self.superseded = lines - len(index)
+        METRICS.add('rows_scanned', lines)
+        return index
+
+    def _repair_tail(self):
+        """Обрезает оборванную последнюю строку (сбой посреди дописывания)"""
+        with open(self.path, 'rb+') as f:
+            size = f.seek(0, os.SEEK_END)
+            if not size:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b'\n':
+                return
+            position = max(size - 65536, 0)
+            f.seek(position)
+            tail = f.read()
+            f.truncate(position + tail.rfind(b'\n') + 1)
+
+    def _write(self, records, replaced):
+        self.superseded += replaced
+        if self.superseded > max(len(self.index), COMPACT_MIN_ROWS):
+            self.compact()
+            return
+        self._repair_tail()
+        with open(self.path, 'a', encoding='utf-8', newline='') as f:
+            csv.writer(f, delimiter=CSV_DELIMITER).writerows(
+                (product_name, csv_price(price)) for product_name, price in records)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def compact(self):
+        """Переписывает файл с последними ценами, по строке на товар (вызывается под блокировкой)"""
+        with METRICS.timer('compact'):
+            atomic_save(lambda tmp_path: self._write_all(tmp_path, self.records()), self.path)
+        self.superseded = 0
+        METRICS.add('compactions')
+
+
+class SqliteStore(FileStore):
+    """prices.sqlite: таблица prices (название, цена, время изменения)"""
+    format = 'sqlite'
+
+    def __init__(self, path, lock_timeout=LOCK_TIMEOUT, merge_on_conflict=False):
+        super().__init__(path, lock_timeout, merge_on_conflict)
+        self._db = None
+
+    @property
+    def db(self):
+        # Журнал отката, а не WAL: изменения другого процесса меняют сам файл,
+        # и file_signature их замечает
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.executescript(SQLITE_SCHEMA)
+        return self._db
+
+    def _create(self):
+        self.db.commit()
+
+    def _read_index(self):
+        # rowid - порядок первого появления товара (обновление его не меняет)
+        rows = self.db.execute("SELECT product_name, price FROM prices ORDER BY rowid")
+        return ProductIndex.from_rows((product_name, stored_price(price)) for product_name, price in rows)
+
+    def _write(self, records, replaced):
+        now = time.time()
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO prices (product_name, price, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(product_name) DO UPDATE SET price = excluded.price, updated_at = excluded.updated_at",
+                ((product_name, numeric_price(price), now) for product_name, price in records))
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class ParquetStore(FileStore):
+    """prices.parquet: столбцы product_name (строка) и price (число; не число - пусто)"""
+    format = 'parquet'
+
+    def __init__(self, path, lock_timeout=LOCK_TIMEOUT, merge_on_conflict=False):
+        if importlib.util.find_spec('pyarrow') is None:
+            raise ImportError("Для формата parquet нужен пакет pyarrow")
+        super().__init__(path, lock_timeout, merge_on_conflict)
+
+    def _table(self, records):
+        import pyarrow
+        names = []
+        prices = []
+        for product_name, price in records:
+            names.append(product_name)
+            price = numeric_price(price)
+            prices.append(price if isinstance(price, (int, float)) else None)
+        return pyarrow.table({'product_name': pyarrow.array(names, pyarrow.string()),
+                              'price': pyarrow.array(prices, pyarrow.float64())})
+
+    def _save(self, records):
+        import pyarrow.parquet
+        table = self._table(records)
+        atomic_save(lambda tmp_path: pyarrow.parquet.write_table(table, tmp_path), self.path)
+
+    def _create(self):
+        self._save(())
+
+    def _read_index(self):
+        import pyarrow.parquet
+        table = pyarrow.parquet.read_table(self.path, columns=['product_name', 'price'])
+        return ProductIndex.from_rows(
+            (product_name, stored_price(price))
+            for product_name, price in zip(table.column('product_name').to_pylist(),
+                                           table.column('price').to_pylist()))
+
+    def _write(self, records, replaced):
+        # Файл неизменяемый: записывается весь индекс с новыми ценами
+        self._save(self.records())
+
+
+STORES = {
+    'csv': CsvStore,
+    'sqlite': SqliteStore,
+    'parquet': ParquetStore,
+}
+
+
+def write_xlsx(path, records):
+    """Пишет prices.xlsx из (название, цена) потоково и атомарно заменяет path под его блокировкой"""
+    import openpyxl
+    out = openpyxl.Workbook(write_only=True)
+    ws = out.create_sheet('Sheet')
+    ws.append(PriceWorkbook._styled_row(ws, HEADERS, HEADER_FONT))
+    with METRICS.timer('export_xlsx'):
+        for product_name, price in records:
+            ws.append(PriceWorkbook._styled_row(ws, (product_name, price), DATA_FONT))
+        with FileLock(path):
+            atomic_save(out.save, path)
+
+
+def export(source, out, lock_timeout=LOCK_TIMEOUT):
+    """Переносит товары из хранилища source в out (формат - по расширению); возвращает число товаров
+
+    Выгрузка в .xlsx пишет файл заново; в другие форматы товары
+    записываются через upsert_many (как обычное обновление).
+    """
+    from .shards import open_store, read_records
+
+    if store_format(source) == 'xlsx':
+        records = list(read_records(source))
+    else:
+        store = STORES[store_format(source)](source, lock_timeout=lock_timeout)
+        try:
+            records = list(store.records())
+        finally:
+            store.close()
+    if store_format(out) == 'xlsx':
+        write_xlsx(out, records)
+        return len(records)
+    target = open_store(out, lock_timeout=lock_timeout)
+    try:
+        target.create_if_not_exists()
+        target.upsert_many(records)
+    finally:
+        if isinstance(target, FileStore):
+            target.close()
+    return len(records)
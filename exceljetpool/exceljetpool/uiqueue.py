@@ -0,0 +1,91 @@
+"""Очередь обновлений окна из рабочих потоков
+
+Tk можно трогать только из главного потока. Рабочие потоки кладут в
+UiQueue строки лога, статус и вызовы (кнопки, сообщения), а окно раз в
+несколько десятков миллисекунд забирает все накопившееся одной пачкой
+(drain) через root.after: строки лога вставляются одной операцией, из
+статусов показывается последний. Когда окно закрывается, оно вызывает
+close(), и ожидающие ask возвращают False вместо вечного ожидания.
+"""
+import queue
+import threading
+
+LOG = 'log'
+STATUS = 'status'
+CALL = 'call'
+ASK_POLL = 0.1  # как часто ask проверяет, живо ли окно, с
+
+
+class UiQueue:
+    """Потокобезопасная очередь событий для окна"""
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._closed = threading.Event()
+
+    def log(self, message):
+        self._queue.put((LOG, message))
+
+    def status(self, message):
+        self._queue.put((STATUS, message))
+
+    def call(self, func, *args, **kwargs):
+        """Выполнить func в главном потоке при следующем drain (результат не нужен)"""
+        self._queue.put((CALL, (func, args, kwargs, None)))
+
+    def ask(self, func, *args, **kwargs):
+        """Выполнить func в главном потоке и дождаться результата (например, askyesno)
+
+        Из главного потока func вызывается сразу. Если окно закрыто (close)
+        до ответа, возвращает False.
+        """
+        if threading.current_thread() is threading.main_thread():
+            return func(*args, **kwargs)
+        if self._closed.is_set():
+            return False
+        reply = [threading.Event(), None, None]
+        self._queue.put((CALL, (func, args, kwargs, reply)))
+        while not reply[0].wait(ASK_POLL):
+            if self._closed.is_set():
+                return False
+        if reply[2] is not None:
+            raise reply[2]
+        return reply[1]
+
+    def close(self):
+        """Окно закрыто: вызовы больше не выполнятся, ожидающие ask получают False"""
+        self._closed.set()
+
+    def drain(self):
+        """Забирает накопившееся: (строки лога, последний статус или None, вызовы)"""
+        lines = []
+        status = None
+        calls = []
+        while True:
+            try:
+                kind, data = self._queue.get_nowait()
+            except queue.Empty:
+                return lines, status, calls
+            if kind == LOG:
+                lines.append(data)
+            elif kind == STATUS:
+                status = data
+            else:
+                calls.append(data)
+
+    @staticmethod
+    def run(call):
+        """Выполняет вызов из drain (в главном потоке) и передает результат ожидающему ask"""
+        func, args, kwargs, reply = call
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if reply is None:
+                raise
+            reply[2] = e
+        else:
+            if reply is not None:
+                reply[1] = result
+        finally:
+            if reply is not None:
+                reply[0].set()
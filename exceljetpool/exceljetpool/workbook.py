@@ -0,0 +1,506 @@
+"""Хранилище цен prices.xlsx: индекс товаров и пакетная запись без интерфейса
+
+Запись идет под межпроцессной блокировкой файла с атомарной заменой (см.
+locking), поэтому несколько процессов могут обновлять одну таблицу.
+"""
+import os
+import tempfile
+
+from .locking import DEFAULT_TIMEOUT as LOCK_TIMEOUT
+from .locking import ChangeLog, FileLock, LockTimeout, atomic_save, copy_mode
+from .metrics import METRICS
+from .records import cell_price, parse_price
+
+# Первая строка с данными (в первой - заголовки)
+FIRST_DATA_ROW = 2
+
+HEADERS = ("Наименование товара", "Цена")
+
+# Шрифты создаются один раз (при первой записи) и разделяются всеми ячейками
+HEADER_FONT = 'header'
+DATA_FONT = 'data'
+FONT_SPECS = {
+    HEADER_FONT: {'name': 'Calibri', 'size': 14, 'bold': True},
+    DATA_FONT: {'name': 'Calibri', 'size': 18},
+}
+_fonts = {}
+
+# Начиная с этого размера файла запись идет потоково (read_only -> write_only),
+# если в книге один лист (см. stream_upsert_many)
+STREAMING_MIN_BYTES = 20 * 1024 * 1024
+
+
+
+def shared_font(key):
+    """Общий объект Font для HEADER_FONT / DATA_FONT
+
+    openpyxl импортируется при первой записи, а не при запуске программы.
+    """
+    font = _fonts.get(key)
+    if font is None:
+        from openpyxl.styles import Font
+        font = _fonts[key] = Font(**FONT_SPECS[key])
+    return font
+
+
+# Что произошло с товаром при записи
+ADDED = 'added'
+CHANGED = 'changed'
+UNCHANGED = 'unchanged'
+# Файл был занят: пачка отложена в журнал изменений и будет записана следующим писателем
+DEFERRED = 'deferred'
+
+
+def is_empty(value):
+    """Пустая ячейка столбца A (конец списка товаров)"""
+    if value is None:
+        return True
+    # Числа и даты пустыми не бывают - их не нужно превращать в строку
+    return isinstance(value, str) and not value.strip()
+
+
+def same_price(current, new):
+    """Совпадает ли цена в ячейке с новой ("32 990", 32990 и 32990.0 - одна цена)"""
+    if current is None or new is None:
+        return current is new
+    if current == new:
+        return True
+    current_kopecks = parse_price(current)
+    new_kopecks = parse_price(new)
+    if current_kopecks is None or new_kopecks is None:
+        return str(current).strip() == str(new).strip()
+    return current_kopecks == new_kopecks
+
+
+def needs_rewrite(current, new):
+    """Нужно ли переписать ячейку: цена другая или прежняя записана текстом, а новая - число
+
+    Старые таблицы хранили все цены строками ("32990"); такая ячейка
+    переписывается числом, даже если цена не изменилась.
+    """
+    if isinstance(current, str) and new is not None and not isinstance(new, str):
+        return True
+    return not same_price(current, new)
+
+
+def file_signature(path):
+    """Отпечаток файла (время изменения, размер, inode) для проверки актуальности индекса
+
+    inode меняется при атомарной замене файла другим процессом.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def sheet_count(path):
+    """Число листов книги (читается только список листов, без данных)"""
+    import openpyxl
+    wb = openpyxl.load_workbook(path, read_only=True)
+    try:
+        return len(wb.sheetnames)
+    finally:
+        wb.close()
+
+
+class ProductIndex:
+    """Индекс листа: название товара -> номер строки и текущая цена
+
+    Строится одним проходом по столбцам A:B до первой пустой ячейки в A (как
+    и прежний поиск); при повторе названия запоминается первая строка. Поиск
+    и добавление работают за O(1) без повторного сканирования листа, а
+    сравнение с текущей ценой позволяет не трогать неизменные ячейки.
+    """
+
+    def __init__(self):
+        self.rows = {}
+        self.prices = {}
+        self.next_row = FIRST_DATA_ROW
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Строит индекс по парам (столбец A, столбец B), начиная со 2-й строки"""
+        index = cls()
+        row = FIRST_DATA_ROW
+        for product_name, price in rows:
+            if is_empty(product_name):
+                break
+            if product_name not in index.rows:
+                index.rows[product_name] = row
+                index.prices[product_name] = price
+            row += 1
+        index.next_row = row
+        METRICS.add('rows_scanned', row - FIRST_DATA_ROW)
+        return index
+
+    @classmethod
+    @METRICS.timer('index_build')
+    def from_openpyxl(cls, ws):
+        """Строит индекс по листу openpyxl"""
+        values = ws.iter_rows(min_row=FIRST_DATA_ROW, max_col=2, values_only=True)
+        return cls.from_rows((row[0], row[1] if len(row) > 1 else None) for row in values)
+
+    @classmethod
+    @METRICS.timer('index_build')
+    def from_win32com(cls, ws):
+        """Строит индекс по листу Excel, читая столбцы A:B одним вызовом COM"""
+        # xlUp: последняя заполненная ячейка столбца A
+        last_row = ws.Cells(ws.Rows.Count, 1).End(-4162).Row
+        if last_row < FIRST_DATA_ROW:
+            return cls()
+        values = ws.Range(ws.Cells(FIRST_DATA_ROW, 1), ws.Cells(last_row, 2)).Value
+        return cls.from_rows(values)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, product_name):
+        return product_name in self.rows
+
+    def find(self, product_name):
+        """Строка товара или None"""
+        return self.rows.get(product_name)
+
+    def upsert(self, product_name, price):
+        """Возвращает (строка, ADDED/CHANGED/UNCHANGED); новый товар занимает первую свободную строку"""
+        row = self.rows.get(product_name)
+        if row is None:
+            row = self.next_row
+            self.rows[product_name] = row
+            self.next_row += 1
+            status = ADDED
+        elif not needs_rewrite(self.prices[product_name], price):
+            return row, UNCHANGED
+        else:
+            status = CHANGED
+        self.prices[product_name] = price
+        return row, status
+
+
+def dedupe_records(records):
+    """Схлопывает повторы (название, цена): остается последняя цена, порядок - первого появления
+
+    Цены-строки с числом превращаются в числа, чтобы в таблицу не попадал текст.
+    """
+    latest = {}
+    for product_name, price in records:
+        latest[product_name] = cell_price(price)
+    return latest
+
+
+class UpsertResult:
+    """Отчет о пакетной записи: списки (название, строка) по исходу
+
+    len() - число товаров, которые действительно пришлось записать.
+    """
+    __slots__ = (ADDED, CHANGED, UNCHANGED, DEFERRED)
+
+    def __init__(self):
+        self.added = []
+        self.changed = []
+        self.unchanged = []
+        self.deferred = []
+
+    def __len__(self):
+        return len(self.added) + len(self.changed)
+
+    def record(self, status, product_name, row):
+        getattr(self, status).append((product_name, row))
+
+    def merge(self, other):
+        """Добавляет к отчету результаты другой записи"""
+        for status in self.__slots__:
+            getattr(self, status).extend(getattr(other, status))
+
+    def counts(self):
+        """Словарь {исход: количество}"""
+        return {status: len(getattr(self, status)) for status in self.__slots__}
+
+    def __str__(self):
+        text = (f"добавлено: {len(self.added)}, изменено: {len(self.changed)}, "
+                f"без изменений: {len(self.unchanged)}")
+        if self.deferred:
+            text += f", отложено: {len(self.deferred)}"
+        return text
+
+
+class PriceWorkbook:
+    """Лист цен prices.xlsx, открытый через openpyxl
+
+    Книга и индекс товаров держатся в памяти между записями и загружаются
+    заново только если файл изменили извне. upsert_many объединяет всю
+    пачку с существующими строками за один проход и сохраняет файл один раз.
+
+    В потоковом режиме (streaming=True, или автоматически для книг из одного
+    листа больше STREAMING_MIN_BYTES) книга в память не загружается, но
+    оформление листа не сохраняется: см. stream_upsert_many.
+
+    Запись идет под блокировкой файла (ждет до lock_timeout секунд, затем
+    LockTimeout). С merge_on_conflict=True пачка, для которой блокировку
+    получить не удалось, откладывается в журнал изменений и применяется
+    следующей записью любого процесса.
+    """
+
+    def __init__(self, path, streaming=None, lock_timeout=LOCK_TIMEOUT, merge_on_conflict=False):
+        self.path = path
+        self.streaming = streaming
+        self.merge_on_conflict = merge_on_conflict
+        self.lock = FileLock(path, timeout=lock_timeout)
+        self.changes = ChangeLog(path)
+        self.wb = None
+        self.ws = None
+        self.index = None
+        self.signature = None
+
+    def create_if_not_exists(self):
+        """Создает файл с заголовками; возвращает True, если файл был создан"""
+        if os.path.exists(self.path):
+            return False
+        with self.lock:
+            # Пока ждали блокировку, файл мог создать другой процесс
+            if os.path.exists(self.path):
+                return False
+            import openpyxl
+            wb = openpyxl.Workbook()
+            ws = wb.active
+            for column, title in enumerate(HEADERS, 1):
+                cell = ws.cell(row=1, column=column, value=title)
+                cell.font = shared_font(HEADER_FONT)
+            atomic_save(wb.save, self.path)
+        return True
+
+    def load(self):
+        """Загружает книгу и строит индекс, если они устарели"""
+        signature = file_signature(self.path)
+        if self.wb is None or signature != self.signature:
+            import openpyxl
+            with METRICS.timer('load_workbook'):
+                self.wb = openpyxl.load_workbook(self.path)
+            self.ws = self.wb.active
+            self.index = ProductIndex.from_openpyxl(self.ws)
+            self.signature = signature
+        return self.ws
+
+    def invalidate(self):
+        """Сбрасывает книгу в памяти (например, после неудачного сохранения)"""
+        self.wb = self.ws = self.index = self.signature = None
+
+    def has_pending_changes(self):
+        """Есть ли отложенные пачки (upsert_many([]) их запишет)"""
+        return bool(self.changes)
+
+    def product_names(self):
+        """Множество названий товаров таблицы; в потоковом режиме лист читается без загрузки книги"""
+        with self.lock:
+            if not self.use_streaming():
+                self.load()
+                return set(self.index.rows)
+            import openpyxl
+            wb = openpyxl.load_workbook(self.path, read_only=True)
+            try:
+                names = set()
+                for (product_name,) in wb.active.iter_rows(min_row=FIRST_DATA_ROW, max_col=1, values_only=True):
+                    if is_empty(product_name):
+                        break
+                    names.add(product_name)
+                return names
+            finally:
+                wb.close()
+
+    def use_streaming(self):
+        """Включен ли потоковый режим для текущего файла
+
+        Автоматически он включается только для книги из одного листа:
+        остальные листы потоковая запись не переносит.
+        """
+        if self.streaming is not None:
+            return self.streaming
+        try:
+            return os.path.getsize(self.path) >= STREAMING_MIN_BYTES and sheet_count(self.path) == 1
+        except OSError:
+            return False
+
+    def upsert_many(self, records, save=True):
+        """Записывает пачку (название, цена): обновляет найденные товары, новые дописывает в конец
+
+        Ячейки с той же ценой не трогаются; если ничего не добавлено и не
+        изменено, файл не сохраняется. Возвращает UpsertResult. В потоковом
+        режиме файл сохраняется при любом значении save. Отложенные другими
+        писателями пачки применяются первыми (более новые цены - после них).
+        """
+        records = list(records)
+        try:
+            self.lock.acquire()
+        except LockTimeout:
+            if not self.merge_on_conflict:
+                raise
+            self.changes.append(records)
+            METRICS.add('deferred_batches')
+            result = UpsertResult()
+            for product_name in dedupe_records(records):
+                result.record(DEFERRED, product_name, None)
+            return result
+        try:
+            deferred = self.changes.drain()
+            try:
+                return self._upsert_locked(deferred + records, save)
+            except Exception:
+                # Чужие отложенные изменения не должны пропасть из-за нашей ошибки
+                if deferred:
+                    self.changes.append(deferred)
+                raise
+        finally:
+            self.lock.release()
+
+    def _upsert_locked(self, records, save):
+        if self.use_streaming():
+            return self.stream_upsert_many(records)
+
+        # Если файл изменил другой процесс, книга перечитывается
+        ws = self.load()
+        result = UpsertResult()
+        data_font = shared_font(DATA_FONT)
+        try:
+            with METRICS.timer('upsert'):
+                for product_name, price in dedupe_records(records).items():
+                    row, status = self.index.upsert(product_name, price)
+                    result.record(status, product_name, row)
+                    if status == UNCHANGED:
+                        continue
+                    price_cell = ws.cell(row=row, column=2, value=price)
+                    price_cell.font = data_font
+                    if status == ADDED:
+                        name_cell = ws.cell(row=row, column=1, value=product_name)
+                        name_cell.font = data_font
+            METRICS.add('cells_written', len(result) + len(result.added))
+        except Exception:
+            # Книга в памяти разошлась с файлом
+            self.invalidate()
+            raise
+        if save and result:
+            self.save()
+        return result
+
+    def save(self):
+        """Атомарно сохраняет книгу под блокировкой и запоминает отпечаток записанного файла"""
+        try:
+            with self.lock, METRICS.timer('save'):
+                atomic_save(self.wb.save, self.path)
+                self.signature = file_signature(self.path)
+        except Exception:
+            self.invalidate()
+            raise
+
+    @METRICS.timer('stream_upsert')
+    def stream_upsert_many(self, records):
+        """Потоковая запись пачки без загрузки листа в память
+
+        Лист читается генератором строк (read_only), строки с обновленными
+        ценами подменяются на лету, и результат пишется через write_only книгу
+        во временный файл рядом с prices.xlsx, который затем атомарно заменяет
+        исходный. В памяти держится только сама пачка, а не строки листа.
+        Строки выбираются так же, как в ProductIndex: товары ищутся до первой
+        пустой ячейки в A (обновляется первая строка с таким названием), новые
+        товары занимают строки начиная с нее - столбцы A:B этих строк
+        перезаписываются, как при записи через индекс. Если ни одна цена не
+        изменилась, временный файл удаляется и prices.xlsx не заменяется
+        (проверить это без прохода по всему листу нельзя). Вызывается под
+        блокировкой из upsert_many.
+
+        Переносятся только значения ячеек: ширина столбцов, форматы чисел и
+        прочее оформление листа теряются, столбцы A:B получают шрифты
+        HEADER_FONT / DATA_FONT. Книгу из нескольких листов так записать
+        нельзя - ValueError (без streaming=True она пишется обычным путем).
+        """
+        import openpyxl
+        pending = dedupe_records(records)
+        result = UpsertResult()
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(suffix='.xlsx', prefix='.prices-', dir=directory)
+        os.close(fd)
+        try:
+            src = openpyxl.load_workbook(self.path, read_only=True)
+            try:
+                if len(src.sheetnames) > 1:
+                    raise ValueError(f"Потоковая запись {os.path.basename(self.path)} невозможна: в книге несколько "
+                                     f"листов ({', '.join(src.sheetnames)}), все, кроме активного, были бы потеряны")
+                out = openpyxl.Workbook(write_only=True)
+                out_ws = out.create_sheet(src.active.title)
+
+                row_number = 0
+                # Новые товары; None - еще не дошли до первой пустой ячейки в A
+                new_rows = None
+                for row_number, values in enumerate(src.active.iter_rows(values_only=True), 1):
+                    if row_number < FIRST_DATA_ROW:
+                        out_ws.append(self._styled_row(out_ws, values, HEADER_FONT))
+                        continue
+                    values = list(values)
+                    while len(values) < 2:
+                        values.append(None)
+                    product_name = values[0]
+                    if new_rows is None and is_empty(product_name):
+                        # Конец списка товаров: все ненайденные - новые
+                        new_rows = iter(list(pending.items()))
+                        pending.clear()
+                    if new_rows is None:
+                        if product_name in pending:
+                            price = pending.pop(product_name)
+                            if not needs_rewrite(values[1], price):
+                                result.unchanged.append((product_name, row_number))
+                            else:
+                                values[1] = price
+                                result.changed.append((product_name, row_number))
+                    else:
+                        new_row = next(new_rows, None)
+                        if new_row is not None:
+                            values[:2] = new_row
+                            result.added.append((new_row[0], row_number))
+                    out_ws.append(self._styled_row(out_ws, values, DATA_FONT))
+
+                if row_number < FIRST_DATA_ROW:
+                    # Пустой лист - восстанавливаем заголовки
+                    for row_number in range(row_number + 1, FIRST_DATA_ROW):
+                        out_ws.append(self._styled_row(out_ws, HEADERS, HEADER_FONT))
+
+                for product_name, price in (pending.items() if new_rows is None else new_rows):
+                    row_number += 1
+                    out_ws.append(self._styled_row(out_ws, (product_name, price), DATA_FONT))
+                    result.added.append((product_name, row_number))
+
+                with METRICS.timer('save'):
+                    out.save(tmp_path)
+                METRICS.add('rows_scanned', max(row_number - FIRST_DATA_ROW + 1, 0) - len(result.added))
+                METRICS.add('cells_written', len(result) + len(result.added))
+            finally:
+                # На Windows файл нельзя заменить, пока он открыт на чтение
+                src.close()
+            if result:
+                copy_mode(self.path, tmp_path)
+                os.replace(tmp_path, self.path)
+                # Книга в памяти после записи устарела
+                self.invalidate()
+            else:
+                os.remove(tmp_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return result
+
+    @staticmethod
+    def _styled_row(ws, values, font):
+        """Строка для write_only листа: столбцы A и B получают общий шрифт (HEADER_FONT / DATA_FONT)"""
+        from openpyxl.cell import WriteOnlyCell
+        font = shared_font(font)
+        row = []
+        for column, value in enumerate(values, 1):
+            if column <= 2 and value is not None:
+                cell = WriteOnlyCell(ws, value=value)
+                cell.font = font
+                row.append(cell)
+            else:
+                row.append(value)
+        return row
@@ -0,0 +1,126 @@
+"""Отложенная запись в таблицу из единственного потока-писателя
+
+Подтвержденные товары не записываются в prices.xlsx по одному: они копятся
+в памяти (повтор названия заменяет цену) и уходят в таблицу одной пачкой,
+когда их набралось max_pending или самому старому исполнилось max_delay
+секунд. Файл пишет только поток писателя, поэтому рабочие потоки не
+соревнуются за него, а число сохранений зависит от числа пачек, а не нажатий.
+"""
+import threading
+import time
+
+
+class WriteBehindWriter:
+    """Очередь (название, цена) с пакетной записью в отдельном потоке
+
+    commit(records) - блокирующая запись списка (название, цена), возвращает
+    True при успехе. Не записанная пачка возвращается в очередь (более новые
+    цены тех же товаров не затираются) и повторяется через max_delay.
+    on_flush(records, saved) вызывается в потоке писателя после каждой пачки.
+    """
+
+    def __init__(self, commit, max_pending=50, max_delay=5.0, on_flush=None):
+        self.commit = commit
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        self.on_flush = on_flush or (lambda records, saved: None)
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._first_at = None
+        self._flush_requested = False
+        self._writing = False
+        self._closed = False
+        # Число завершенных пачек и исход последней
+        self._flushed = 0
+        self._last_saved = True
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._pending)
+
+    def submit(self, product_name, price):
+        """Ставит товар в очередь записи"""
+        self.submit_many([(product_name, price)])
+
+    def submit_many(self, records):
+        """Ставит пачку (название, цена) в очередь записи"""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Очередь записи закрыта")
+            for product_name, price in records:
+                self._pending[product_name] = price
+            if self._pending and self._first_at is None:
+                # Писатель начинает отсчет max_delay
+                self._first_at = time.monotonic()
+                self._cond.notify_all()
+            elif len(self._pending) >= self.max_pending:
+                self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Записывает очередь немедленно и ждет результата; возвращает True, если таблица записана"""
+        with self._cond:
+            ticket = self._flushed + self._writing + bool(self._pending)
+            if ticket == self._flushed:
+                return self._last_saved
+            self._flush_requested = True
+            self._cond.notify_all()
+            if not self._cond.wait_for(lambda: self._flushed >= ticket or not self._thread.is_alive(), timeout):
+                return False
+            return self._flushed >= ticket and self._last_saved
+
+    def write(self, records, timeout=None):
+        """Ставит пачку в очередь и ждет ее записи (вместе со всем, что уже накоплено)"""
+        self.submit_many(records)
+        return self.flush(timeout)
+
+    def close(self, timeout=None):
+        """Останавливает писателя; возвращает список (название, цена), оставшихся незаписанными"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        with self._cond:
+            records = list(self._pending.items())
+            self._pending.clear()
+            return records
+
+    def _due(self):
+        if self._flush_requested or len(self._pending) >= self.max_pending:
+            return True
+        return time.monotonic() - self._first_at >= self.max_delay
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and not (self._pending and self._due()):
+                    timeout = None
+                    if self._pending:
+                        timeout = max(self.max_delay - (time.monotonic() - self._first_at), 0)
+                    self._cond.wait(timeout)
+                if self._closed:
+                    # Остаток забирает close()
+                    return
+                records = list(self._pending.items())
+                self._pending.clear()
+                self._first_at = None
+                self._flush_requested = False
+                self._writing = True
+
+            try:
+                saved = bool(self.commit(records))
+            except Exception:
+                saved = False
+
+            with self._cond:
+                if not saved:
+                    # Новые цены, пришедшие во время записи, важнее старых
+                    for product_name, price in records:
+                        self._pending.setdefault(product_name, price)
+                    self._first_at = time.monotonic()
+                self._writing = False
+                self._flushed += 1
+                self._last_saved = saved
+                self._cond.notify_all()
+            self.on_flush(records, saved)
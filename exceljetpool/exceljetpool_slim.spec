@@ -0,0 +1,89 @@
+# -*- mode: python ; coding: utf-8 -*-
+# Облегченная сборка с быстрым запуском: pyinstaller exceljetpool_slim.spec
+#
+# В отличие от exceljetpool.spec (один EXE) программа собирается папкой
+# dist/exceljetpool: onefile при каждом запуске распаковывает весь архив во
+# временную папку, а onedir сразу запускает интерпретатор. UPX отключен -
+# сжатые библиотеки распаковываются в память при каждой загрузке.
+#
+# В папке два EXE с общими библиотеками:
+#     exceljetpool.exe     - окно (console=False); у оконного EXE нет stdout и
+#                            stderr, поэтому консольный режим в нем ничего не
+#                            выводит и для него не поддерживается;
+#     exceljetpool_cli.exe - консольный режим для командной строки и
+#                            планировщика: exceljetpool_cli.exe refresh urls.txt
+#
+# Исключены только пакеты, которые программа не импортирует: необязательные
+# зависимости openpyxl/bs4 (они подключаются в try/except) и инструменты
+# разработки. Проверено без сборки: после refresh (с кэшем, историей,
+# журналом и пулом процессов), refresh в CSV с движком soup, export, правил
+# css/regex и команды changes ни один из них не оказался в sys.modules.
+# Путь win32com в этой проверке не участвовал. Время запуска проверяется так:
+#     python bench/bench_startup.py --exe dist/exceljetpool/exceljetpool_cli.exe
+
+EXCLUDES = [
+    # необязательные зависимости openpyxl и bs4
+    'numpy', 'PIL', 'pandas', 'matplotlib', 'scipy', 'IPython', 'html5lib',
+    # инструменты разработки и замеров
+    'pytest', 'psutil', 'test', 'tkinter.test', 'idlelib', 'lib2to3',
+]
+
+a = Analysis(
+    ['exceljetpool.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    hiddenimports=[],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=EXCLUDES,
+    noarchive=False,
+    optimize=0,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='exceljetpool',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=False,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+exe_cli = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='exceljetpool_cli',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=True,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+coll = COLLECT(
+    exe,
+    exe_cli,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='exceljetpool',
+)
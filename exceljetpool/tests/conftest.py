@@ -0,0 +1,5 @@
+"""Общее для тестов: пакет exceljetpool импортируется из папки приложения"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,43 @@
+"""Разбор цен в копейки (records.parse_price)"""
+from decimal import Decimal
+
+import pytest
+
+from exceljetpool.records import parse_price, price_value
+
+
+@pytest.mark.parametrize('text, kopecks', [
+    ('32 990', 3299000),
+    ('32\xa0990 ₽', 3299000),
+    ('1234,50 руб.', 123450),
+    ('$1,299', 129900),
+    ('1,299.00', 129900),
+    ('1.299,00', 129900),
+    ('1.299', 129900),
+    ('12.345.678', 1234567800),
+    ('150,5', 15050),
+    ('0.125', 12),
+])
+def test_parse_price_text(text, kopecks):
+    assert parse_price(text) == kopecks
+
+
+@pytest.mark.parametrize('value, kopecks', [
+    (5, 500),
+    (1.5, 150),
+    (Decimal('19.99'), 1999),
+])
+def test_parse_price_number(value, kopecks):
+    assert parse_price(value) == kopecks
+
+
+@pytest.mark.parametrize('value', [None, True, '', 'нет в наличии', '1,2,3'])
+def test_parse_price_not_a_price(value):
+    assert parse_price(value) is None
+
+
+def test_price_value():
+    assert price_value(3299000) == 32990
+    assert isinstance(price_value(3299000), int)
+    assert price_value(123450) == Decimal('1234.50')
+    assert price_value(None) is None
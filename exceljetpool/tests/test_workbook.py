@@ -0,0 +1,88 @@
+"""Индекс товаров и пакетная запись в prices.xlsx (обычная и потоковая)"""
+import openpyxl
+import pytest
+
+from exceljetpool.workbook import ADDED, CHANGED, UNCHANGED, HEADERS, PriceWorkbook, ProductIndex
+
+
+def make_workbook(path, rows):
+    """prices.xlsx с заголовками и строками rows (None - пустая строка)"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(HEADERS)
+    for row in rows:
+        ws.append(row if row is not None else (None, None))
+    wb.save(path)
+
+
+def read_rows(path):
+    wb = openpyxl.load_workbook(path, read_only=True)
+    try:
+        return [tuple(row[:2]) for row in wb.active.iter_rows(min_row=2, max_col=2, values_only=True)]
+    finally:
+        wb.close()
+
+
+def test_index_stops_at_first_empty_name():
+    index = ProductIndex.from_rows([('Чайник', 100), ('Утюг', 200), (None, None), ('После пропуска', 300)])
+    assert len(index) == 2
+    assert index.find('Утюг') == 3
+    assert 'После пропуска' not in index
+    assert index.next_row == 4
+
+
+def test_index_keeps_first_row_of_duplicate():
+    index = ProductIndex.from_rows([('Чайник', 100), ('Чайник', 150)])
+    assert index.find('Чайник') == 2
+    assert index.prices['Чайник'] == 100
+
+
+def test_index_upsert():
+    index = ProductIndex.from_rows([('Чайник', 100), ('Утюг', '200')])
+    assert index.upsert('Чайник', 100) == (2, UNCHANGED)
+    assert index.upsert('Чайник', 120) == (2, CHANGED)
+    # Цена, записанная текстом, переписывается числом
+    assert index.upsert('Утюг', 200) == (3, CHANGED)
+    assert index.upsert('Фен', 300) == (4, ADDED)
+    assert index.upsert('Миксер', 400) == (5, ADDED)
+    assert index.upsert('Фен', 300) == (4, UNCHANGED)
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_upsert_many_statuses(tmp_path, streaming):
+    path = str(tmp_path / 'prices.xlsx')
+    make_workbook(path, [('Чайник', 100), ('Утюг', 200)])
+    result = PriceWorkbook(path, streaming=streaming).upsert_many(
+        [('Чайник', 100), ('Утюг', 250), ('Фен', 300), ('Фен', 350)])
+    assert result.unchanged == [('Чайник', 2)]
+    assert result.changed == [('Утюг', 3)]
+    assert result.added == [('Фен', 4)]
+    assert read_rows(path) == [('Чайник', 100), ('Утюг', 250), ('Фен', 350)]
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+def test_upsert_many_unchanged_does_not_save(tmp_path, streaming):
+    path = tmp_path / 'prices.xlsx'
+    make_workbook(str(path), [('Чайник', 100)])
+    before = path.stat().st_mtime_ns, path.read_bytes()
+    result = PriceWorkbook(str(path), streaming=streaming).upsert_many([('Чайник', 100)])
+    assert len(result) == 0
+    assert result.counts() == {'added': 0, 'changed': 0, 'unchanged': 1, 'deferred': 0}
+    assert (path.stat().st_mtime_ns, path.read_bytes()) == before
+
+
+def test_streaming_matches_in_memory(tmp_path):
+    """Потоковая запись размещает строки так же, как запись через индекс (пропуск в столбце A)"""
+    rows = [('Чайник', 100), ('Утюг', '200'), None, ('После пропуска', 300), ('Чайник', 999)]
+    records = [('Утюг', 200), ('После пропуска', 310), ('Фен', 400), ('Миксер', 500), ('Чайник', 100)]
+    results = {}
+    for streaming in (False, True):
+        path = str(tmp_path / f'prices-{streaming}.xlsx')
+        make_workbook(path, rows)
+        result = PriceWorkbook(path, streaming=streaming).upsert_many(records)
+        results[streaming] = result.counts(), result.added, result.changed, read_rows(path)
+    assert results[True] == results[False]
+    counts, added, changed, sheet = results[False]
+    assert added == [('После пропуска', 4), ('Фен', 5), ('Миксер', 6)]
+    assert changed == [('Утюг', 3)]
+    assert sheet == [('Чайник', 100), ('Утюг', 200), ('После пропуска', 310), ('Фен', 400), ('Миксер', 500)]